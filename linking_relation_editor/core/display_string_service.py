@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+#
+# QGIS Linking Relation Editor
+# Copyright (C) 2024 OPENGIS.ch
+#
+# licensed under the terms of GNU GPL 2
+#
+# -----------------------------------------------------------
+
+from collections import OrderedDict
+
+from qgis.core import (
+    QgsExpression,
+    QgsExpressionContext,
+    QgsExpressionContextUtils,
+    QgsFeature,
+    QgsVectorLayer,
+)
+from qgis.PyQt.QtCore import QDate, QDateTime, QObject, Qt, QTime
+
+from linking_relation_editor.core.relation_utils import RelationUtils
+
+
+class DisplayStringService(QObject):
+    """
+    Evaluates the display expression of a layer, like QgsVectorLayerUtils.getFeatureDisplayString,
+    with an expression prepared once per layer. Display strings are cached by feature id and
+    invalidated through the layer edit signals.
+    """
+
+    # Services by layer id, a service is deleted with its layer
+    _services = dict()
+
+    # Maximum number of display strings cached per layer, the least recently used are dropped
+    DISPLAY_STRING_CACHE_SIZE = 10000
+
+    def __init__(self, layer: QgsVectorLayer):
+        super().__init__(layer)
+
+        self._layer = layer
+        self._layerId = layer.id()
+        self._expression = None
+        self._context = None
+        self._displayStrings = OrderedDict()
+
+        self._layer.attributeValueChanged.connect(self._featureChanged)
+        self._layer.geometryChanged.connect(self._featureChanged)
+        self._layer.featureDeleted.connect(self._featureChanged)
+        self._layer.displayExpressionChanged.connect(self.invalidate)
+        self._layer.afterRollBack.connect(self.invalidate)
+        self._layer.afterCommitChanges.connect(self.invalidate)
+        self._layer.dataChanged.connect(self.invalidate)
+
+        layerId = self._layerId
+        self.destroyed.connect(lambda: DisplayStringService._services.pop(layerId, None))
+
+    @staticmethod
+    def instance(layer: QgsVectorLayer):
+        """
+        Returns the display string service shared by all the users of the layer
+        """
+        service = DisplayStringService._services.get(layer.id())
+        if service is None:
+            service = DisplayStringService(layer)
+            DisplayStringService._services[layer.id()] = service
+
+        return service
+
+    def displayString(self, feature: QgsFeature, useCache: bool = True) -> str:
+        """
+        Returns the display string of the feature, useCache is False when the feature
+        may hold values which are not the ones of the layer, the cache is then bypassed.
+        """
+        if useCache:
+            displayString = self._displayStrings.get(feature.id())
+            if displayString is not None:
+                self._displayStrings.move_to_end(feature.id())
+                return displayString
+
+        if self._expression is None:
+            self._context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(self._layer))
+            self._expression = QgsExpression(self._layer.displayExpression())
+            self._expression.prepare(self._context)
+
+        self._context.setFeature(feature)
+        displayString = DisplayStringService._toString(self._expression.evaluate(self._context))
+        if not displayString:
+            displayString = str(feature.id())
+
+        # Features which are not in the layer have no id to be cached by
+        if useCache and feature.isValid():
+            self._displayStrings[feature.id()] = displayString
+            if len(self._displayStrings) > DisplayStringService.DISPLAY_STRING_CACHE_SIZE:
+                self._displayStrings.popitem(last=False)
+
+        return displayString
+
+    def displayStrings(self, features) -> dict:
+        """
+        Returns the display strings of the features by feature id, features can be a feature iterator
+        """
+        return {feature.id(): self.displayString(feature) for feature in features}
+
+    def invalidate(self):
+        self._expression = None
+        self._context = None
+        self._displayStrings = OrderedDict()
+
+    def _featureChanged(self, fid, *args):
+        self._displayStrings.pop(fid, None)
+
+    @staticmethod
+    def _toString(value) -> str:
+        if RelationUtils.isNull(value):
+            return str()
+
+        # Same representation as QVariant.toString
+        if isinstance(value, bool):
+            return "true" if value else "false"
+
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+
+        if isinstance(value, (QDate, QDateTime, QTime)):
+            return value.toString(Qt.DateFormat.ISODate)
+
+        return str(value)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+#
+# QGIS Linking Relation Editor
+# Copyright (C) 2024 OPENGIS.ch
+#
+# licensed under the terms of GNU GPL 2
+#
+# -----------------------------------------------------------
+
+import re
+
+from qgis.core import QgsExpression, QgsFeatureRequest, QgsVectorLayer
+
+# Matches the expressions embedded in a map tip template: [% expression %]
+TEMPLATE_EXPRESSION_REGEX = re.compile(r"\[%(.*?)%\]", re.DOTALL)
+
+
+class FeatureRequestBuilder(object):
+    """
+    Builds feature requests fetching only the attributes and geometry needed by a use site,
+    so that providers do not send wide rows and heavy geometries nobody renders.
+    """
+
+    @staticmethod
+    def expressionRequirements(expressionString: str):
+        """
+        Returns the referenced columns and whether the geometry is needed to evaluate the expression.
+        Unparsable expressions require all attributes and the geometry.
+        """
+        if not expressionString:
+            return set(), False
+
+        expression = QgsExpression(expressionString)
+        if expression.hasParserError():
+            return {QgsFeatureRequest.ALL_ATTRIBUTES}, True
+
+        return set(expression.referencedColumns()), expression.needsGeometry()
+
+    @staticmethod
+    def templateRequirements(template: str):
+        """
+        Returns the referenced columns and whether the geometry is needed to render a template
+        with embedded [% expressions %] like the map tip template.
+        """
+        columns = set()
+        needsGeometry = False
+        for match in TEMPLATE_EXPRESSION_REGEX.finditer(template or str()):
+            expressionColumns, expressionNeedsGeometry = FeatureRequestBuilder.expressionRequirements(match.group(1))
+            columns |= expressionColumns
+            needsGeometry |= expressionNeedsGeometry
+
+        return columns, needsGeometry
+
+    @staticmethod
+    def attributesRequest(
+        layer: QgsVectorLayer, attributeNames, request: QgsFeatureRequest = None, needsGeometry: bool = False
+    ):
+        if request is None:
+            request = QgsFeatureRequest()
+
+        attributeNames = set(attributeNames)
+        if QgsFeatureRequest.ALL_ATTRIBUTES not in attributeNames:
+            request.setSubsetOfAttributes(list(attributeNames), layer.fields())
+
+        if not needsGeometry:
+            request.setFlags(request.flags() | QgsFeatureRequest.Flag.NoGeometry)
+
+        return request
+
+    @staticmethod
+    def displayStringRequest(
+        layer: QgsVectorLayer, request: QgsFeatureRequest = None, extraAttributes=(), needsGeometry: bool = False
+    ):
+        """
+        Request for features of which only the display string (and the extra attributes) is used
+        """
+        columns, displayNeedsGeometry = FeatureRequestBuilder.expressionRequirements(layer.displayExpression())
+        columns |= set(extraAttributes)
+
+        return FeatureRequestBuilder.attributesRequest(layer, columns, request, needsGeometry or displayNeedsGeometry)
+
+    @staticmethod
+    def mapTipRequest(layer: QgsVectorLayer, request: QgsFeatureRequest = None):
+        """
+        Request for features of which only the map tip is rendered
+        """
+        columns, needsGeometry = FeatureRequestBuilder.templateRequirements(layer.mapTipTemplate())
+
+        return FeatureRequestBuilder.attributesRequest(layer, columns, request, needsGeometry)
+
+    @staticmethod
+    def filterExpressionRequest(layer: QgsVectorLayer, expressionString: str, request: QgsFeatureRequest = None):
+        """
+        Request fetching only what is needed to evaluate a filter expression, used when only feature ids are collected
+        """
+        columns, needsGeometry = FeatureRequestBuilder.expressionRequirements(expressionString)
+
+        return FeatureRequestBuilder.attributesRequest(layer, columns, request, needsGeometry)
+
+    @staticmethod
+    def featureIdsRequest(request: QgsFeatureRequest = None):
+        """
+        Request fetching neither attributes nor geometry, used when only feature ids are collected
+        """
+        if request is None:
+            request = QgsFeatureRequest()
+
+        request.setNoAttributes()
+        request.setFlags(request.flags() | QgsFeatureRequest.Flag.NoGeometry)
+
+        return request
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+#
+# QGIS Linking Relation Editor
+# Copyright (C) 2024 OPENGIS.ch
+#
+# licensed under the terms of GNU GPL 2
+#
+# -----------------------------------------------------------
+
+from enum import IntEnum
+
+from qgis.core import (
+    QgsAbstractFeatureIterator,
+    QgsExpression,
+    QgsExpressionContext,
+    QgsFeature,
+    QgsTask,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+)
+from qgis.PyQt.QtCore import QCoreApplication, pyqtSignal
+
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+from linking_relation_editor.core.relation_utils import RelationUtils
+
+
+class FeatureFilterTask(QgsTask):
+    """
+    Collects the ids of the features matching a filter expression in a background thread.
+    Matching ids are sent back in chunks through featureIdsFound while the task runs.
+
+    The expression is handed to the data provider, which runs it as SQL when it can compile it.
+    Expressions using the geometry are evaluated by the task itself so that the project
+    ellipsoid and distance/area units apply.
+    """
+
+    class Evaluation(IntEnum):
+        ProviderCompiled = (1,)  # Compiled to SQL and run by the data provider
+        ProviderUncompiled = (2,)  # Passed to the provider but evaluated by QGIS
+        Local = 3  # Evaluated by the task with the expression geometry calculator
+
+    # Number of matching feature ids sent back at once
+    CHUNK_SIZE = 1000
+
+    featureIdsFound = pyqtSignal(list)
+
+    def __init__(self, layer: QgsVectorLayer, expression: QgsExpression, context: QgsExpressionContext):
+        super().__init__(
+            QCoreApplication.translate("FeatureFilterTask", "Filtering '{0}'").format(layer.name()),
+            QgsTask.Flag.CanCancel,
+        )
+
+        # The feature source is a snapshot of the layer which can be iterated from another thread
+        self._source = QgsVectorLayerFeatureSource(layer)
+        self._featureCount = layer.featureCount()
+        self._expression = QgsExpression(expression)
+        self._context = QgsExpressionContext(context)
+        self._providerCompilesExpressions = RelationUtils.providerCompilesExpressions(layer)
+
+        # First evaluation error
+        self.error = str()
+
+        if self._expression.hasParserError():
+            self.error = self._expression.parserErrorString()
+
+        if self._expression.needsGeometry():
+            self.evaluation = FeatureFilterTask.Evaluation.Local
+            self._request = FeatureRequestBuilder.filterExpressionRequest(layer, expression.expression())
+        else:
+            # Only the ids of the matching features are collected
+            self.evaluation = FeatureFilterTask.Evaluation.ProviderCompiled
+            self._request = FeatureRequestBuilder.featureIdsRequest()
+            self._request.setFilterExpression(expression.expression())
+            self._request.setExpressionContext(self._context)
+
+            # The provider drops the features it fails to evaluate, errors such as
+            # unknown fields or functions are reported when preparing the expression
+            if not self.error and not self._expression.prepare(self._context) and self._expression.hasEvalError():
+                self.error = self._expression.evalErrorString()
+
+    def run(self):
+        if self.error:
+            return False
+
+        if self.evaluation == FeatureFilterTask.Evaluation.Local:
+            return self._runLocal()
+
+        return self._runProvider()
+
+    def _runProvider(self):
+        iterator = self._source.getFeatures(self._request)
+        if not iterator.isValid():
+            self.error = QCoreApplication.translate("FeatureFilterTask", "The features could not be requested")
+            return False
+
+        featureIds = []
+        count = 0
+        feature = QgsFeature()
+        while iterator.nextFeature(feature):
+            if self.isCanceled():
+                iterator.close()
+                return False
+
+            count += 1
+            self._setProgressCount(count)
+            featureIds = self._addFeatureId(featureIds, feature.id())
+
+        if not self._providerCompilesExpressions or not FeatureFilterTask._compiled(iterator):
+            self.evaluation = FeatureFilterTask.Evaluation.ProviderUncompiled
+
+        if featureIds:
+            self.featureIdsFound.emit(featureIds)
+
+        return True
+
+    @staticmethod
+    def _compiled(iterator) -> bool:
+        """
+        Returns True if the provider ran the whole filter expression as SQL. compileFailed() only
+        reports compiled SQL which failed, not expressions the provider could not translate at all
+        (e.g. using regexp_match or represent_value) and evaluated in QGIS instead.
+        """
+        if hasattr(iterator, "compileStatus"):
+            return iterator.compileStatus() == QgsAbstractFeatureIterator.CompileStatus.Compiled
+
+        return not iterator.compileFailed()
+
+    def _runLocal(self):
+        featureIds = []
+        for count, feature in enumerate(self._source.getFeatures(self._request), 1):
+            if self.isCanceled():
+                return False
+
+            self._setProgressCount(count)
+
+            self._context.setFeature(feature)
+            value = self._expression.evaluate(self._context)
+            if value and not RelationUtils.isNull(value):
+                featureIds = self._addFeatureId(featureIds, feature.id())
+
+            if self._expression.hasEvalError() and not self.error:
+                self.error = self._expression.evalErrorString()
+
+        if featureIds:
+            self.featureIdsFound.emit(featureIds)
+
+        return True
+
+    def _setProgressCount(self, count: int):
+        if self._featureCount > 0 and count % 100 == 0:
+            self.setProgress(100.0 * count / self._featureCount)
+
+    def _addFeatureId(self, featureIds: list, featureId: int) -> list:
+        """
+        Adds a matching feature id to the current chunk, returns the chunk to fill next
+        """
+        featureIds.append(featureId)
+
+        if len(featureIds) < FeatureFilterTask.CHUNK_SIZE:
+            return featureIds
+
+        self.featureIdsFound.emit(featureIds)
+        return []
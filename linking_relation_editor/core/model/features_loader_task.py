@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+#
+# QGIS Linking Relation Editor
+# Copyright (C) 2024 OPENGIS.ch
+#
+# licensed under the terms of GNU GPL 2
+#
+# -----------------------------------------------------------
+
+from enum import IntEnum
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsLogger,
+    QgsRelation,
+    QgsTask,
+    QgsVectorLayerFeatureSource,
+)
+from qgis.PyQt.QtCore import QCoreApplication
+
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+from linking_relation_editor.core.relation_key_index import RelationKeyIndex
+from linking_relation_editor.core.relation_utils import RelationUtils
+
+
+class FeaturesLoaderTask(QgsTask):
+    """
+    Collects the features linked to a parent feature and prepares the request for the unlinked ones.
+
+    Everything depending on the layers state is read when the task is created, in the main thread,
+    the features are then read from feature sources which can be iterated from another thread.
+    """
+
+    class UnlinkedFeaturesStrategy(IntEnum):
+        ProviderAntiJoin = (1,)
+        LocalFiltering = 2
+
+    # Above this number of linked keys the anti-join expression gets too big to be sent to the provider
+    ANTI_JOIN_MAX_KEYS = 10000
+
+    def __init__(self, relation: QgsRelation, nmRelation: QgsRelation, parentFeature: QgsFeature):
+        self._relation = relation
+        self._nmRelation = nmRelation
+        self._parentFeature = QgsFeature(parentFeature)
+
+        # The validity of a relation depends on its layers, it is not checked from the worker thread
+        self._nmRelationValid = self._nmRelation.isValid()
+
+        referencingLayer = self._relation.referencingLayer()
+        childLayer = self._nmRelation.referencedLayer() if self._nmRelationValid else referencingLayer
+
+        super().__init__(
+            QCoreApplication.translate("FeaturesLoaderTask", "Loading features of '{0}'").format(childLayer.name()),
+            QgsTask.Flag.CanCancel,
+        )
+
+        # Attributes of the child features needed to handle join features
+        self._nmReferencedAttributes = list(self._nmRelation.fieldPairs().values()) if self._nmRelationValid else []
+
+        # The ids of the linked features are looked up in the shared key index when it is already built,
+        # building it would scan the join and child layers in the main thread
+        self._linkedByIds = RelationKeyIndex.relationIndexesBuilt(self._relation, self._nmRelation)
+        if self._linkedByIds:
+            if self._nmRelationValid:
+                linkedFeatureIds = RelationKeyIndex.nmRelatedFeatureIds(
+                    self._relation, self._nmRelation, self._parentFeature
+                )
+            else:
+                linkedFeatureIds = RelationKeyIndex.relatedFeatureIds(self._relation, self._parentFeature)
+
+            self._linkedSource = QgsVectorLayerFeatureSource(childLayer)
+            self._linkedRequest = FeatureRequestBuilder.displayStringRequest(
+                childLayer, QgsFeatureRequest().setFilterFids(list(linkedFeatureIds)), self._nmReferencedAttributes
+            )
+        else:
+            self._linkedSource = QgsVectorLayerFeatureSource(referencingLayer)
+            self._linkedRequest = self._relation.getRelatedFeaturesRequest(self._parentFeature)
+            if self._nmRelationValid:
+                # Only the keys of the join features are needed
+                FeatureRequestBuilder.attributesRequest(
+                    referencingLayer, self._nmRelation.fieldPairs().keys(), self._linkedRequest
+                )
+
+                self._childSource = QgsVectorLayerFeatureSource(childLayer)
+                self._childRequest = FeatureRequestBuilder.displayStringRequest(
+                    childLayer, extraAttributes=self._nmReferencedAttributes
+                )
+                self._keysAreFeatureIds = RelationUtils.keysAreFeatureIds(self._nmRelation)
+                self._referencedAttributes = self._nmRelation.referencedFields()
+            else:
+                FeatureRequestBuilder.displayStringRequest(referencingLayer, self._linkedRequest)
+
+        self._childLayerName = childLayer.name()
+        self._keyFields = self._linkedKeyFields()
+        self._unlinkedRequest = FeatureRequestBuilder.displayStringRequest(
+            childLayer, extraAttributes=self._nmReferencedAttributes + self._keyFields
+        )
+        self._providerCompilesExpressions = RelationUtils.providerCompilesExpressions(childLayer)
+
+        # Results
+        self.linkedFeatures = dict()
+        self.unlinkedFeaturesRequest = None
+        self.excludedFeatureIds = set()
+        self.unlinkedFeaturesStrategy = FeaturesLoaderTask.UnlinkedFeaturesStrategy.LocalFiltering
+
+    def run(self):
+        linkedFeatures = dict()
+        for feature in self._linkedSource.getFeatures(self._linkedRequest):
+            if self.isCanceled():
+                return False
+
+            linkedFeatures[feature.id()] = feature
+
+        self.setProgress(50)
+
+        if not self._linkedByIds and self._nmRelationValid:
+            joinFeatures = linkedFeatures.values()
+
+            linkedFeatures = dict()
+            for documentFeature in RelationUtils.referencedFeatures(
+                self._nmRelation,
+                joinFeatures,
+                self._childRequest,
+                self._childSource,
+                self._keysAreFeatureIds,
+                self._referencedAttributes,
+            ):
+                if self.isCanceled():
+                    return False
+
+                linkedFeatures[documentFeature.id()] = documentFeature
+
+        self.setProgress(90)
+
+        self.linkedFeatures = linkedFeatures
+        self._prepareUnlinkedFeaturesRequest()
+
+        return True
+
+    def _linkedKeyFields(self):
+        if self._nmRelationValid:
+            return list(self._nmRelation.fieldPairs().values())
+
+        return list(self._relation.fieldPairs().keys())
+
+    def _linkedKeys(self):
+        """
+        Returns the set of keys of the linked features,
+        None if the linked features cannot be identified by their key fields.
+        """
+        if self._nmRelationValid:
+            keys = set()
+            for linkedFeature in self.linkedFeatures.values():
+                key = tuple(linkedFeature.attribute(field) for field in self._keyFields)
+                if any(RelationUtils.isNull(value) for value in key):
+                    return None
+
+                keys.add(key)
+
+            return keys
+
+        # Polymorphic relations also filter on the parent layer
+        if self._relation.type() != QgsRelation.RelationType.Normal:
+            return None
+
+        key = tuple(self._parentFeature.attribute(field) for field in self._relation.fieldPairs().values())
+        if any(RelationUtils.isNull(value) for value in key):
+            return None
+
+        return {key}
+
+    def _prepareUnlinkedFeaturesRequest(self):
+        """
+        Prepares the request for the unlinked features and the ids of the linked features to exclude locally.
+        When the provider compiles expressions the linked features are excluded by the database (anti-join)
+        and never reach Python.
+        """
+        keys = self._linkedKeys()
+
+        self.unlinkedFeaturesRequest = self._unlinkedRequest
+
+        if (
+            keys is not None
+            and len(keys) <= FeaturesLoaderTask.ANTI_JOIN_MAX_KEYS
+            and self._providerCompilesExpressions
+        ):
+            if keys:
+                self.unlinkedFeaturesRequest.setFilterExpression(
+                    RelationUtils.notFieldValuesFilterExpression(self._keyFields, keys)
+                )
+
+            self.excludedFeatureIds = set()
+            self.unlinkedFeaturesStrategy = FeaturesLoaderTask.UnlinkedFeaturesStrategy.ProviderAntiJoin
+            QgsLogger.debug(
+                "Unlinked features of layer '{0}': provider anti-join excluding {1} linked key(s)".format(
+                    self._childLayerName, len(keys)
+                )
+            )
+            return
+
+        self.excludedFeatureIds = set(self.linkedFeatures.keys())
+        self.unlinkedFeaturesStrategy = FeaturesLoaderTask.UnlinkedFeaturesStrategy.LocalFiltering
+        QgsLogger.debug(
+            "Unlinked features of layer '{0}': local filtering of {1} linked feature(s)".format(
+                self._childLayerName, len(self.linkedFeatures)
+            )
+        )
@@ -8,7 +8,9 @@
 #
 # -----------------------------------------------------------
 
+import itertools
 import os
+from collections import OrderedDict
 from enum import IntEnum
 
 from qgis.core import (
@@ -16,17 +18,26 @@ from qgis.core import (
     QgsExpressionContext,
     QgsExpressionContextUtils,
     QgsFeature,
+    QgsFeatureRequest,
     QgsGeometry,
     QgsRelation,
     QgsVectorLayer,
     QgsVectorLayerUtils,
 )
 from qgis.gui import QgsAttributeEditorContext, QgsAttributeForm
-from qgis.PyQt.QtCore import QAbstractItemModel, QModelIndex, QObject, Qt
+from qgis.PyQt.QtCore import QAbstractItemModel, QModelIndex, QObject, QSize, Qt, QTimer
 from qgis.PyQt.QtGui import QIcon
+from qgis.PyQt.QtWidgets import QApplication, QStyle
+
+from linking_relation_editor.core.display_string_service import DisplayStringService
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+from linking_relation_editor.core.relation_key_index import RelationKeyIndex
 
 
 class FeaturesModel(QAbstractItemModel):
+    # Number of features fetched from the provider at once in lazy mode
+    FETCH_PAGE_SIZE = 500
+
     class UserRole(IntEnum):
         FeatureId = int(Qt.ItemDataRole.UserRole) + 1
 
@@ -36,55 +47,62 @@ class FeaturesModel(QAbstractItemModel):
         ToBeLinked = (3,)
         ToBeUnlinked = 4
 
+    # Maximum number of rendered tool tips kept per model
+    TOOL_TIP_CACHE_SIZE = 1000
+
+    # Process wide cache of the pre-rasterised state icons by (state, width, height)
+    _stateIcons = dict()
+
+    # Process wide revisions of the items, so that no two item features share a revision
+    _itemRevisions = itertools.count()
+
+    STATE_ICON_FILES = {
+        FeatureState.Linked: "mNoAction.svg",
+        FeatureState.Unlinked: "mNoAction.svg",
+        FeatureState.ToBeLinked: "mActionToBeLinked.svg",
+        FeatureState.ToBeUnlinked: "mActionToBeUnlinked.svg",
+    }
+
     class FeaturesModelItem(object):
-        def __init__(self, feature: QgsFeature, featureState, model):
+        def __init__(self, feature: QgsFeature, featureState, model, featureComplete: bool = True):
             self._feature = feature
+            self._featureId = feature.id()
+            self._featureComplete = featureComplete
             self._featureState = featureState
             self._model = model
 
-            self._displayString = QgsVectorLayerUtils.getFeatureDisplayString(self._model.layer, feature)
+            self._displayString = DisplayStringService.instance(self._model.layer).displayString(feature)
+            self._revision = next(FeaturesModel._itemRevisions)
             self._childItem = None
 
-            if self._model.handleJoinFeatures:
-                joinLayer = self._model.nmRelation.referencingLayer()
-                joinFeature = QgsFeature()
-
-                if self._featureState == FeaturesModel.FeatureState.Linked:
-                    request = self._model.nmRelation.getRelatedFeaturesRequest(self._feature)
-                    for jfeature in joinLayer.getFeatures(request):
-                        joinFeature = jfeature
-                        break
-                else:
-                    # Expression context for the linking table
-                    context = joinLayer.createExpressionContext()
-                    joinFeature = QgsVectorLayerUtils.createFeature(joinLayer, QgsGeometry(), {}, context)
-
-                    # Fields of the linking table
-                    fields = joinLayer.fields()
-
-                    if self._model.relation.type() == QgsRelation.RelationType.Generated:
-                        polyRel = self._model.relation.polymorphicRelation()
-                        assert polyRel.isValid()
-
-                        joinFeature[fields.indexFromName(polyRel.referencedLayerField())] = polyRel.layerRepresentation(
-                            self.relation().referencedLayer()
-                        )
-
-                    for referencingField, referencedField in self._model.relation.fieldPairs().items():
-                        index = fields.indexOf(referencingField)
-                        joinFeature[index] = self._model.parentFeature.attribute(referencedField)
-
-                    for referencingField, referencedField in self._model.nmRelation.fieldPairs().items():
-                        index = fields.indexOf(referencingField)
-                        joinFeature[index] = self._feature.attribute(referencedField)
-
-                self._childItem = FeaturesModel.JoinFeaturesModelItem(joinFeature, joinLayer, self)
+            # Join features templates of unlinked features are only created once they are to be linked
+            if self._model.handleJoinFeatures and self._featureState == FeaturesModel.FeatureState.Linked:
+                self.set_join_feature(self._model.linked_join_feature(self._feature))
 
         def feature(self):
+            # Lazily loaded items only hold the attributes needed for display, load the full feature on demand
+            if not self._featureComplete:
+                self._feature = self._model.layer.getFeature(self._featureId)
+                self._featureComplete = True
+
             return self._feature
 
         def feature_id(self):
-            return self._feature.id()
+            return self._featureId
+
+        def update_feature(self, feature: QgsFeature, featureComplete: bool = False):
+            self._feature = feature
+            self._featureComplete = featureComplete
+            self._revision = next(FeaturesModel._itemRevisions)
+            self._displayString = DisplayStringService.instance(self._model.layer).displayString(
+                feature, useCache=False
+            )
+
+        def revision(self) -> int:
+            """
+            Changes whenever the feature of the item is replaced, tool tips are cached by revision
+            """
+            return self._revision
 
         def feature_state(self):
             return self._featureState
@@ -92,28 +110,54 @@ class FeaturesModel(QAbstractItemModel):
         def set_feature_state(self, featureState):
             self._featureState = featureState
 
+            if featureState == FeaturesModel.FeatureState.ToBeLinked:
+                self._model.create_join_features([self])
+
+        def set_join_feature(self, joinFeature: QgsFeature):
+            self._childItem = FeaturesModel.JoinFeaturesModelItem(
+                joinFeature, self._model.nmRelation.referencingLayer(), self
+            )
+
+        def join_feature_attributes(self):
+            """
+            Attributes of the join feature linking this feature to the parent feature, by field index
+            """
+            joinLayer = self._model.nmRelation.referencingLayer()
+            fields = joinLayer.fields()
+
+            attributes = dict()
+            if self._model.relation.type() == QgsRelation.RelationType.Generated:
+                polyRel = self._model.relation.polymorphicRelation()
+                assert polyRel.isValid()
+
+                attributes[fields.indexFromName(polyRel.referencedLayerField())] = polyRel.layerRepresentation(
+                    self._model.relation.referencedLayer()
+                )
+
+            for referencingField, referencedField in self._model.relation.fieldPairs().items():
+                attributes[fields.indexOf(referencingField)] = self._model.parentFeature.attribute(referencedField)
+
+            for referencingField, referencedField in self._model.nmRelation.fieldPairs().items():
+                attributes[fields.indexOf(referencingField)] = self._feature.attribute(referencedField)
+
+            return attributes
+
         def display_string(self):
             return self._displayString
 
         def display_icon(self):
-            if (
-                self._featureState == FeaturesModel.FeatureState.Unlinked
-                or self._featureState == FeaturesModel.FeatureState.Linked
-            ):
-                return QIcon(os.path.join(os.path.dirname(__file__), "../../images/mNoAction.svg"))
-            elif self._featureState == FeaturesModel.FeatureState.ToBeLinked:
-                return QIcon(os.path.join(os.path.dirname(__file__), "../../images/mActionToBeLinked.svg"))
-            elif self._featureState == FeaturesModel.FeatureState.ToBeUnlinked:
-                return QIcon(os.path.join(os.path.dirname(__file__), "../../images/mActionToBeUnlinked.svg"))
-
-            return QIcon()
+            return FeaturesModel.state_icon(self._featureState, self._model.icon_size())
 
         def tool_tip(self):
-            subContext = QgsExpressionContext()
-            subContext.appendScopes(QgsExpressionContextUtils.globalProjectLayerScopes(self._model.layer))
-            subContext.setFeature(self._feature)
+            return self._model.feature_tool_tip(self)
+
+        def tool_tip_feature(self):
+            if self._featureComplete:
+                return self._feature
 
-            return QgsExpression.replaceExpressionText(self._model.layer.mapTipTemplate(), subContext)
+            # Only fetch the attributes used by the map tip
+            request = FeatureRequestBuilder.mapTipRequest(self._model.layer, QgsFeatureRequest(self._featureId))
+            return next(self._model.layer.getFeatures(request), self._feature)
 
         def childItem(self):
             return self._childItem
@@ -175,12 +219,104 @@ class FeaturesModel(QAbstractItemModel):
         self.layer = layer
         self._modelFeatures = []
         self.handleJoinFeatures = handleJoinFeatures
+
+        # Feature id to row index, always holds the listed feature ids but the rows
+        # from _featureRowsDirtyRow on are stale after removals and reindexed on demand
+        self._featureRows = dict()
+        self._featureRowsDirtyRow = None
         self.parentFeature = parentFeature
         self.relation = relation
         self.nmRelation = nmRelation
 
+        # Rendered tool tips by (feature id, map tip template), least recently used first
+        self._toolTipCache = OrderedDict()
+        self._toolTipContext = None
+
+        # Size of the icons in the views, the style small icon size if not valid
+        self._iconSize = QSize()
+
+        # Join features of the parent indexed by the key of the child feature they link
+        self._linkedJoinFeatures = dict()
+
+        # Lazy mode
+        self._featureRequest = None
+        self._featureIterator = None
+        self._featuresState = featureState
+        self._excludedFeatureIds = set()
+
+        # Layer changes are collected and applied at once
+        self._pendingAddedFeatureIds = set()
+        self._pendingDeletedFeatureIds = set()
+        self._pendingChangedFeatureIds = set()
+        self._pendingLayerChangesTimer = QTimer(self)
+        self._pendingLayerChangesTimer.setSingleShot(True)
+        self._pendingLayerChangesTimer.setInterval(0)
+        self._pendingLayerChangesTimer.timeout.connect(self._apply_pending_layer_changes)
+
+        self.layer.featureAdded.connect(self._layer_feature_added)
+        self.layer.featureDeleted.connect(self._layer_feature_deleted)
+        self.layer.attributeValueChanged.connect(self._layer_attribute_value_changed)
+        self.layer.geometryChanged.connect(self._layer_geometry_changed)
+        self.layer.mapTipTemplateChanged.connect(self._layer_map_tip_template_changed)
+
         self.set_features(features, featureState)
 
+    @staticmethod
+    def state_icon(featureState, iconSize: QSize = QSize()):
+        """
+        Returns the icon of a feature state rasterised at the icon size, the SVG is only rendered once per size
+        """
+        if not iconSize.isValid():
+            iconSize = QSize(
+                QApplication.style().pixelMetric(QStyle.PixelMetric.PM_SmallIconSize),
+                QApplication.style().pixelMetric(QStyle.PixelMetric.PM_SmallIconSize),
+            )
+
+        key = (featureState, iconSize.width(), iconSize.height())
+        icon = FeaturesModel._stateIcons.get(key)
+        if icon is None:
+            iconFile = FeaturesModel.STATE_ICON_FILES.get(featureState)
+            if iconFile is None:
+                icon = QIcon()
+            else:
+                svgIcon = QIcon(os.path.join(os.path.dirname(__file__), "../../images", iconFile))
+                icon = QIcon(svgIcon.pixmap(iconSize))
+
+            FeaturesModel._stateIcons[key] = icon
+
+        return icon
+
+    def icon_size(self):
+        return self._iconSize
+
+    def set_icon_size(self, iconSize: QSize):
+        self._iconSize = iconSize
+
+    def feature_tool_tip(self, feature_item):
+        # Tool tips computed before a pending layer change is applied to the item
+        # are cached with the former revision and never served again
+        template = self.layer.mapTipTemplate()
+        key = (feature_item.feature_id(), template, feature_item.revision())
+
+        toolTip = self._toolTipCache.get(key)
+        if toolTip is not None:
+            self._toolTipCache.move_to_end(key)
+            return toolTip
+
+        # The global, project and layer scopes are only built once
+        if self._toolTipContext is None:
+            self._toolTipContext = QgsExpressionContext()
+            self._toolTipContext.appendScopes(QgsExpressionContextUtils.globalProjectLayerScopes(self.layer))
+
+        self._toolTipContext.setFeature(feature_item.tool_tip_feature())
+        toolTip = QgsExpression.replaceExpressionText(template, self._toolTipContext)
+
+        self._toolTipCache[key] = toolTip
+        if len(self._toolTipCache) > FeaturesModel.TOOL_TIP_CACHE_SIZE:
+            self._toolTipCache.popitem(last=False)
+
+        return toolTip
+
     def featureItems(self):
         return self._modelFeatures
 
@@ -253,81 +389,341 @@ class FeaturesModel(QAbstractItemModel):
         return Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsEditable
 
     def removeRows(self, row: int = ..., count: int = ..., index: QModelIndex = ...):
-        if row + count > self.rowCount():
+        if count <= 0 or row < 0 or row + count > self.rowCount():
             return False
 
-        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
-        self._modelFeatures[row : (row + count)] = []
-        self.endRemoveRows()
+        self._remove_rows(range(row, row + count))
         return True
 
     def supportedDropActions(self):
         return Qt.DropAction.MoveAction
 
-    def set_features(self, features, features_state):
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        if parent.isValid():
+            return False
+
+        return self._featureIterator is not None
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()):
+        if parent.isValid() or self._featureIterator is None:
+            return
+
+        featureItems = []
+        while len(featureItems) < FeaturesModel.FETCH_PAGE_SIZE:
+            feature = QgsFeature()
+            if not self._featureIterator.nextFeature(feature):
+                self._featureIterator.close()
+                self._featureIterator = None
+                break
+
+            if feature.id() in self._excludedFeatureIds:
+                continue
+
+            featureItems.append(
+                FeaturesModel.FeaturesModelItem(feature, self._featuresState, self, featureComplete=False)
+            )
+
+        if not featureItems:
+            return
+
+        self._append_items(featureItems)
+
+    def fetch_all(self):
+        while self.canFetchMore():
+            self.fetchMore()
+
+    def set_features(self, features, features_state, features_complete: bool = True):
+        """
+        Sets the model features, features_complete is False when the features only contain
+        the attributes needed for display, items will load the full feature on demand.
+        """
         self.beginResetModel()
 
+        self._featureRequest = None
+        self._featureIterator = None
+        self._featuresState = features_state
+        self._excludedFeatureIds = set()
+
+        features = list(features)
+
+        # No join features to look up for an empty model (e.g. at construction, before the features are loaded)
+        if self.handleJoinFeatures and features_state == FeaturesModel.FeatureState.Linked and features:
+            self._linkedJoinFeatures = self._fetch_linked_join_features()
+        else:
+            self._linkedJoinFeatures = dict()
+
         self._modelFeatures = []
         for feature in features:
-            featureItem = FeaturesModel.FeaturesModelItem(feature, features_state, self)
+            featureItem = FeaturesModel.FeaturesModelItem(
+                feature, features_state, self, featureComplete=features_complete
+            )
             self._modelFeatures.append(featureItem)
 
+        self._featureRows = {item.feature_id(): row for row, item in enumerate(self._modelFeatures)}
+        self._featureRowsDirtyRow = None
+
+        self.endResetModel()
+
+    def set_feature_request(self, request: QgsFeatureRequest, features_state, excluded_feature_ids=None):
+        """
+        Lazy mode: features are fetched page by page from the provider when the views ask for them.
+        The request should only fetch what is needed for the display string, items load the full
+        feature on demand.
+        """
+        self.beginResetModel()
+
+        self._featuresState = features_state
+        self._excludedFeatureIds = set(excluded_feature_ids) if excluded_feature_ids else set()
+        self._modelFeatures = []
+        self._featureRows = dict()
+        self._featureRowsDirtyRow = None
+        self._featureRequest = QgsFeatureRequest(request)
+        self._featureIterator = self.layer.getFeatures(request)
+
         self.endResetModel()
 
+        # Populate the first page right away
+        self.fetchMore()
+
+    def create_join_features(self, feature_items):
+        """
+        Creates the join feature templates of the items which do not have one yet,
+        default values are evaluated in one batch with a single expression context.
+        """
+        if not self.handleJoinFeatures:
+            return
+
+        feature_items = [featureItem for featureItem in feature_items if featureItem.childItem() is None]
+        if not feature_items:
+            return
+
+        joinLayer = self.nmRelation.referencingLayer()
+
+        # Expression context for the linking table
+        context = joinLayer.createExpressionContext()
+        featuresData = [
+            QgsVectorLayerUtils.QgsFeatureData(QgsGeometry(), featureItem.join_feature_attributes())
+            for featureItem in feature_items
+        ]
+
+        joinFeatures = QgsVectorLayerUtils.createFeatures(joinLayer, featuresData, context)
+        for featureItem, joinFeature in zip(feature_items, joinFeatures):
+            featureItem.set_join_feature(joinFeature)
+
+    def linked_join_feature(self, feature: QgsFeature):
+        """
+        Returns the join feature linking the feature to the parent feature
+        """
+        key = tuple(feature.attribute(field) for field in self.nmRelation.fieldPairs().values())
+        return self._linkedJoinFeatures.get(key, QgsFeature())
+
+    def _fetch_linked_join_features(self):
+        # All the join features of the parent in one request, by ids when the key index is built
+        joinLayer = self.nmRelation.referencingLayer()
+        joinKeyFields = list(self.nmRelation.fieldPairs().keys())
+        request = RelationKeyIndex.relatedFeaturesRequest(self.relation, self.parentFeature)
+
+        joinFeatures = dict()
+        for joinFeature in joinLayer.getFeatures(request):
+            key = tuple(joinFeature.attribute(field) for field in joinKeyFields)
+            joinFeatures.setdefault(key, joinFeature)
+
+        return joinFeatures
+
     def get_all_feature_items(self):
         return self._modelFeatures
 
     def add_features_model_items(self, feature_model_elements):
-        self.beginInsertRows(QModelIndex(), self.rowCount(), self.rowCount() + len(feature_model_elements))
-        self._modelFeatures.extend(feature_model_elements)
-        self.endInsertRows()
+        self._append_items(list(feature_model_elements))
 
     def take_all_items(self):
-        self.beginResetModel()
+        self.fetch_all()
+
         featureModelElements = self._modelFeatures
-        self._modelFeatures = []
-        self.endResetModel()
+        if featureModelElements:
+            self.beginRemoveRows(QModelIndex(), 0, len(featureModelElements) - 1)
+            self._modelFeatures = []
+            self._featureRows = dict()
+            self._featureRowsDirtyRow = None
+            self.endRemoveRows()
+
         return featureModelElements
 
     def take_item(self, index: QModelIndex):
         if not index.isValid():
             return None
 
-        self.beginRemoveRows(QModelIndex(), index.row(), index.row() + 1)
         feature = self._modelFeatures[index.row()]
-        del self._modelFeatures[index.row()]
-        self.endRemoveRows()
+        self._remove_rows([index.row()])
 
         return feature
 
     def take_items(self, indexes):
-        if not indexes:
+        # Only top level items can be taken, child items are the join features
+        rows = sorted({index.row() for index in indexes if index.isValid() and not index.parent().isValid()})
+        if not rows:
             return []
 
-        features = []
-        rows_to_remove = []
-        for index in indexes:
-            row = index.row()
-            features.append(self._modelFeatures[row])
-            rows_to_remove.append(row)
-
-        rows_to_remove.sort(reverse=True)
-        for row in rows_to_remove:
-            self.beginRemoveRows(QModelIndex(), row, row + 1)
-            del self._modelFeatures[row]
-            self.endRemoveRows()
+        features = [self._modelFeatures[row] for row in rows]
+        self._remove_rows(rows)
 
         return features
 
+    def apply_diff(self, added_features=(), deleted_feature_ids=(), changed_features=()):
+        """
+        Applies layer changes without rebuilding the list, contiguous rows are notified at once.
+        added_features and changed_features only need the attributes used for display.
+        """
+        deleted_feature_ids = set(deleted_feature_ids)
+        if deleted_feature_ids:
+            # Lazily loaded features not fetched yet must not show up anymore
+            self._excludedFeatureIds |= deleted_feature_ids
+            self._remove_rows(self.rows_for(deleted_feature_ids))
+
+        changed_features = {feature.id(): feature for feature in changed_features}
+        if changed_features:
+            changed_rows = self.rows_for(changed_features.keys())
+            for row in changed_rows:
+                item = self._modelFeatures[row]
+                item.update_feature(changed_features[item.feature_id()])
+
+            for first, last in FeaturesModel._contiguous_ranges(changed_rows):
+                self.dataChanged.emit(self.index(first, 0, QModelIndex()), self.index(last, 0, QModelIndex()))
+
+        self.add_features_model_items(
+            [
+                FeaturesModel.FeaturesModelItem(feature, self._featuresState, self, featureComplete=False)
+                for feature in added_features
+                if feature.id() not in self._feature_rows()
+            ]
+        )
+
+    def _append_items(self, items):
+        if not items:
+            return
+
+        first = len(self._modelFeatures)
+        self.beginInsertRows(QModelIndex(), first, first + len(items) - 1)
+        self._modelFeatures.extend(items)
+        # Appended rows are after any stale row, their row numbers are always valid
+        for row, item in enumerate(items, first):
+            self._featureRows[item.feature_id()] = row
+        self.endInsertRows()
+
+    def _remove_rows(self, rows):
+        # Remove from the bottom so that the row numbers of the remaining ranges stay valid
+        for first, last in reversed(FeaturesModel._contiguous_ranges(rows)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for item in self._modelFeatures[first : last + 1]:
+                self._featureRows.pop(item.feature_id(), None)
+            del self._modelFeatures[first : last + 1]
+
+            # Rows after the removed range have shifted, they are reindexed when next queried
+            if self._featureRowsDirtyRow is None or first < self._featureRowsDirtyRow:
+                self._featureRowsDirtyRow = first
+            self.endRemoveRows()
+
+    def _feature_rows(self):
+        if self._featureRowsDirtyRow is not None:
+            for row in range(self._featureRowsDirtyRow, len(self._modelFeatures)):
+                self._featureRows[self._modelFeatures[row].feature_id()] = row
+            self._featureRowsDirtyRow = None
+
+        return self._featureRows
+
+    @staticmethod
+    def _contiguous_ranges(rows):
+        """
+        Coalesces rows into sorted (first, last) ranges of contiguous rows
+        """
+        ranges = []
+        for row in sorted(set(rows)):
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+
+        return [(first, last) for first, last in ranges]
+
+    def _layer_feature_added(self, fid):
+        self._pendingAddedFeatureIds.add(fid)
+        self._pendingLayerChangesTimer.start()
+
+    def _layer_feature_deleted(self, fid):
+        self._pendingAddedFeatureIds.discard(fid)
+        self._pendingChangedFeatureIds.discard(fid)
+        self._pendingDeletedFeatureIds.add(fid)
+        self._pendingLayerChangesTimer.start()
+
+    def _layer_attribute_value_changed(self, fid, idx, value):
+        self._pendingChangedFeatureIds.add(fid)
+        self._pendingLayerChangesTimer.start()
+
+    def _layer_geometry_changed(self, fid, geometry):
+        # Map tips may use the geometry, the item is updated like for attribute changes
+        self._pendingChangedFeatureIds.add(fid)
+        self._pendingLayerChangesTimer.start()
+
+    def _layer_map_tip_template_changed(self):
+        self._toolTipCache.clear()
+
+    def _apply_pending_layer_changes(self):
+        addedFeatureIds = self._pendingAddedFeatureIds
+        deletedFeatureIds = self._pendingDeletedFeatureIds
+        changedFeatureIds = self._pendingChangedFeatureIds - addedFeatureIds
+        self._pendingAddedFeatureIds = set()
+        self._pendingDeletedFeatureIds = set()
+        self._pendingChangedFeatureIds = set()
+
+        # Only models listing the features of a request (unlinked features) take over new features
+        addedFeatures = []
+        if addedFeatureIds and self._featureRequest is not None:
+            request = QgsFeatureRequest(self._featureRequest)
+            request.setFilterFids(list(addedFeatureIds))
+            addedFeatures = [
+                feature
+                for feature in self.layer.getFeatures(request)
+                if feature.id() not in self._excludedFeatureIds and self._featureRequest.acceptFeature(feature)
+            ]
+
+        # Only features listed in the model need to be refreshed
+        changedFeatureIds = self.contains_many(changedFeatureIds)
+        changedFeatures = []
+        if changedFeatureIds:
+            # Join features are created from the nm referenced fields of the items
+            extraAttributes = list(self.nmRelation.fieldPairs().values()) if self.handleJoinFeatures else []
+            request = FeatureRequestBuilder.displayStringRequest(self.layer, extraAttributes=extraAttributes)
+            request.setFilterFids(list(changedFeatureIds))
+            changedFeatures = list(self.layer.getFeatures(request))
+
+        self.apply_diff(addedFeatures, deletedFeatureIds, changedFeatures)
+
     def contains(self, feature_id: int):
-        for feature in self._modelFeatures:
-            if feature.feature_id() == feature_id:
-                return True
-        return False
+        return feature_id in self._feature_rows()
+
+    def contains_many(self, feature_ids) -> set:
+        """
+        Returns the subset of feature_ids listed in the model
+        """
+        featureRows = self._feature_rows()
+        return {feature_id for feature_id in feature_ids if feature_id in featureRows}
 
     def get_feature_index(self, feature_id: int):
-        for index in range(len(self._modelFeatures)):
-            if self._modelFeatures[index].feature_id() == feature_id:
-                return self.index(index, 0, QModelIndex())
+        row = self._feature_rows().get(feature_id)
+        if row is None:
+            return QModelIndex()
+
+        return self.index(row, 0, QModelIndex())
+
+    def rows_for(self, feature_ids) -> list:
+        """
+        Returns the sorted rows of the feature_ids listed in the model
+        """
+        featureRows = self._feature_rows()
+        return sorted(featureRows[feature_id] for feature_id in set(feature_ids) if feature_id in featureRows)
 
-        return QModelIndex()
+    def indexes_for(self, feature_ids) -> list:
+        """
+        Returns the indexes, in row order, of the feature_ids listed in the model
+        """
+        return [self.index(row, 0, QModelIndex()) for row in self.rows_for(feature_ids)]
@@ -1,21 +1,27 @@
 from enum import IntEnum
+from functools import partial
 
 from qgis.core import (
+    QgsApplication,
     QgsDistanceArea,
     QgsExpression,
     QgsExpressionContext,
-    QgsFeatureRequest,
+    QgsLogger,
     QgsProject,
     QgsVectorLayer,
 )
 from qgis.gui import QgsMapCanvas
-from qgis.PyQt.QtCore import QModelIndex, QObject, QSortFilterProxyModel, Qt
-from qgis.PyQt.QtWidgets import QApplication
+from qgis.PyQt.QtCore import QModelIndex, QObject, QSortFilterProxyModel, Qt, QTimer
 
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+from linking_relation_editor.core.model.feature_filter_task import FeatureFilterTask
 from linking_relation_editor.core.model.features_model import FeaturesModel
 
 
 class FeaturesModelFilter(QSortFilterProxyModel):
+    # Minimum delay between two refreshes while the filter expression results stream in
+    FILTER_TASK_REFRESH_INTERVAL = 100
+
     class FeatureFilter(IntEnum):
         ShowAll = (1,)
         ShowSelected = (2,)
@@ -29,22 +35,38 @@ class FeaturesModelFilter(QSortFilterProxyModel):
         self._layer = layer
         self._canvas = canvas
         self._quick_filter = str()
-        self._map_filter = list()
+        self._map_filter = frozenset()
         self._feature_filter = FeaturesModelFilter.FeatureFilter.ShowAll
         self._feature_filter_expression = QgsExpression()
         self._feature_filter_expression_context = QgsExpressionContext()
-        self._feature_filter_filtered_features = list()
+        self._feature_filter_filtered_features = frozenset()
+
+        # Result of the last filter expression evaluation which ran to the end
+        self._feature_filter_complete_features = frozenset()
+
+        # Snapshot of the layer selection, taken once per invalidation in ShowSelected mode
+        self._selected_features = frozenset()
+
+        # Background evaluation of the filter expression, only the latest task is listened to
+        self._filter_task = None
+        self._feature_filter_evaluation = None
+        self._filter_task_refresh_timer = QTimer(self)
+        self._filter_task_refresh_timer.setSingleShot(True)
+        self._filter_task_refresh_timer.setInterval(FeaturesModelFilter.FILTER_TASK_REFRESH_INTERVAL)
+        self._filter_task_refresh_timer.timeout.connect(self._refilter)
 
         if self._canvas:
             self._canvas.extentsChanged.connect(self._extent_changed)
 
+        self._layer.selectionChanged.connect(self._selection_changed)
+
     def set_quick_filter(self, filter: str):
         self._quick_filter = filter
-        self.invalidateFilter()
+        self._refilter()
 
     def clear_quick_filter(self):
         self._quick_filter = str()
-        self.invalidateFilter()
+        self._refilter()
 
     def quick_filter_active(self):
         return (
@@ -52,18 +74,19 @@ class FeaturesModelFilter(QSortFilterProxyModel):
         )
 
     def set_map_filter(self, map_filter: list):
-        self._map_filter = map_filter
-        self.invalidateFilter()
+        self._map_filter = frozenset(map_filter)
+        self._refilter()
 
     def clear_map_filter(self):
-        self._map_filter = list()
-        self.invalidateFilter()
+        self._map_filter = frozenset()
+        self._refilter()
 
     def map_filter_active(self):
         return len(self._map_filter) > 0
 
     def set_feature_filter(self, mode):
         self._feature_filter = mode
+        self._stop_feature_filter_task()
 
         if self._feature_filter == FeaturesModelFilter.FeatureFilter.ShowFilteredList:
             self._prepare_filtered_features()
@@ -71,7 +94,10 @@ class FeaturesModelFilter(QSortFilterProxyModel):
         elif self._feature_filter == FeaturesModelFilter.FeatureFilter.ShowVisible:
             self._prepare_filtered_by_visible_features()
 
-        self.invalidateFilter()
+        elif self._feature_filter == FeaturesModelFilter.FeatureFilter.ShowSelected:
+            self._prepare_selected_features()
+
+        self._refilter()
 
     def set_feature_filter_expression(self, expression, context):
         self._feature_filter_expression = expression
@@ -79,11 +105,61 @@ class FeaturesModelFilter(QSortFilterProxyModel):
 
         if self._feature_filter == FeaturesModelFilter.FeatureFilter.ShowFilteredList:
             self._prepare_filtered_features()
-            self.invalidateFilter()
+            self._refilter()
+
+    def feature_filter_task_running(self):
+        return self._filter_task is not None
+
+    def feature_filter_evaluation(self):
+        """
+        How the last filter expression was evaluated, a FeatureFilterTask.Evaluation
+        """
+        return self._feature_filter_evaluation
+
+    def cancel_feature_filter_task(self):
+        """
+        Cancels the running filter expression evaluation, the partial result it streamed
+        is replaced by the last complete one
+        """
+        if not self._stop_feature_filter_task():
+            return
+
+        if self._feature_filter == FeaturesModelFilter.FeatureFilter.ShowFilteredList:
+            self._feature_filter_filtered_features = self._feature_filter_complete_features
+            self._refilter()
+
+    def _stop_feature_filter_task(self) -> bool:
+        if self._filter_task is None:
+            return False
+
+        self._filter_task.cancel()
+        self._filter_task = None
+        self._filter_task_refresh_timer.stop()
+        return True
 
     def filter_active(self):
         return self.quick_filter_active() or self.map_filter_active()
 
+    def fetchMore(self, parent: QModelIndex = QModelIndex()):
+        rowCount = self.rowCount(parent)
+        super().fetchMore(parent)
+
+        # The matches of a filter may only be on later pages of a lazy source model, a page without
+        # accepted rows inserts no row here and the views would not ask for more
+        while (
+            self.filter_active()
+            and self._filter_task is None
+            and self.rowCount(parent) == rowCount
+            and self.canFetchMore(parent)
+        ):
+            super().fetchMore(parent)
+
+    def _refilter(self):
+        self.invalidateFilter()
+
+        if self.rowCount() == 0:
+            self.fetchMore(QModelIndex())
+
     def filterAcceptsRow(self, sourceRow: int, sourceParent: QModelIndex()):
         index = self.sourceModel().index(sourceRow, 0, sourceParent)
 
@@ -95,7 +171,7 @@ class FeaturesModelFilter(QSortFilterProxyModel):
             pass  # Nothing to do
 
         elif self._feature_filter == FeaturesModelFilter.FeatureFilter.ShowSelected:
-            if rowFeatureId not in self._layer.selectedFeatureIds():
+            if rowFeatureId not in self._selected_features:
                 return False
 
         elif self._feature_filter == FeaturesModelFilter.FeatureFilter.ShowVisible:
@@ -132,7 +208,8 @@ class FeaturesModelFilter(QSortFilterProxyModel):
         return all(word.lower() in rowDisplayRole.lower() for word in self._quick_filter.split())
 
     def _prepare_filtered_features(self):
-        self._feature_filter_filtered_features = list()
+        self._stop_feature_filter_task()
+        self._feature_filter_filtered_features = frozenset()
 
         if not self._feature_filter_expression.isValid():
             return
@@ -141,42 +218,75 @@ class FeaturesModelFilter(QSortFilterProxyModel):
         distanceArea.setSourceCrs(self._layer.crs(), QgsProject.instance().transformContext())
         distanceArea.setEllipsoid(QgsProject.instance().ellipsoid())
 
-        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
-
         self._feature_filter_expression.setGeomCalculator(distanceArea)
         self._feature_filter_expression.setDistanceUnits(QgsProject.instance().distanceUnits())
         self._feature_filter_expression.setAreaUnits(QgsProject.instance().areaUnits())
 
-        # Record the first evaluation error
-        error = str()
+        # Matching features are collected while the task streams them and frozen when it finishes
+        self._feature_filter_filtered_features = set()
 
-        for f in self._layer.getFeatures():
-            self._feature_filter_expression_context.setFeature(f)
-            if self._feature_filter_expression.evaluate(self._feature_filter_expression_context) != 0:
-                self._feature_filter_filtered_features.append(f.id())
+        task = FeatureFilterTask(self._layer, self._feature_filter_expression, self._feature_filter_expression_context)
+        task.featureIdsFound.connect(partial(self._filter_task_feature_ids_found, task))
+        task.taskCompleted.connect(partial(self._filter_task_finished, task))
+        task.taskTerminated.connect(partial(self._filter_task_finished, task))
 
-            # check if there were errors during evaluating
-            if self._feature_filter_expression.hasEvalError() and error.isEmpty():
-                error = self._feature_filter_expression.evalErrorString()
+        self._filter_task = task
+        QgsApplication.taskManager().addTask(task)
 
-        QApplication.restoreOverrideCursor()
+    def _filter_task_feature_ids_found(self, task, feature_ids):
+        # Results of a superseded or canceled filter
+        if task is not self._filter_task:
+            return
+
+        self._feature_filter_filtered_features.update(feature_ids)
+
+        if not self._filter_task_refresh_timer.isActive():
+            self._filter_task_refresh_timer.start()
+
+    def _filter_task_finished(self, task):
+        if task is not self._filter_task:
+            return
+
+        self._filter_task = None
+        self._filter_task_refresh_timer.stop()
+        self._feature_filter_filtered_features = frozenset(self._feature_filter_filtered_features)
+        self._feature_filter_complete_features = self._feature_filter_filtered_features
+
+        self._feature_filter_evaluation = task.evaluation
+        QgsLogger.debug(
+            "Filter expression '{0}' evaluation: {1}".format(
+                self._feature_filter_expression.expression(), FeatureFilterTask.Evaluation(task.evaluation).name
+            )
+        )
+
+        if task.error:
+            QgsLogger.debug("Filter expression evaluation error: {0}".format(task.error))
+
+        self._refilter()
 
     def _prepare_filtered_by_visible_features(self):
-        self._feature_filter_filtered_features = list()
+        self._feature_filter_filtered_features = frozenset()
 
         if not self._canvas:
             return
 
         rectangle = self._canvas.mapSettings().mapToLayerCoordinates(self._layer, self._canvas.extent())
 
-        request = QgsFeatureRequest()
+        request = FeatureRequestBuilder.featureIdsRequest()
         request.setFilterRect(rectangle)
 
-        for feature in self._layer.getFeatures(request):
-            self._feature_filter_filtered_features.append(feature.id())
+        self._feature_filter_filtered_features = frozenset(feature.id() for feature in self._layer.getFeatures(request))
+
+    def _prepare_selected_features(self):
+        self._selected_features = frozenset(self._layer.selectedFeatureIds())
 
     def _extent_changed(self):
         if self._feature_filter == FeaturesModelFilter.FeatureFilter.ShowVisible:
             self._prepare_filtered_by_visible_features()
 
-        self.invalidateFilter()
+        self._refilter()
+
+    def _selection_changed(self):
+        if self._feature_filter == FeaturesModelFilter.FeatureFilter.ShowSelected:
+            self._prepare_selected_features()
+            self._refilter()
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+#
+# QGIS Linking Relation Editor
+# Copyright (C) 2024 OPENGIS.ch
+#
+# licensed under the terms of GNU GPL 2
+#
+# -----------------------------------------------------------
+
+from collections import Counter
+from enum import IntEnum
+
+from qgis.core import QgsFeatureRequest, QgsIconUtils, QgsRelation
+from qgis.PyQt.QtCore import QAbstractItemModel, QModelIndex, QObject, Qt
+from qgis.PyQt.QtGui import QFont, QIcon
+
+from linking_relation_editor.core.display_string_service import DisplayStringService
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+from linking_relation_editor.core.relation_key_index import RelationKeyIndex
+from linking_relation_editor.core.relation_utils import RelationUtils
+
+
+class MultiEditModel(QAbstractItemModel):
+    """
+    Tree of the parent features edited at once and of their linked child features.
+
+    Only the ids of the children are collected when the parents are set, the child items
+    are created when a parent is expanded. The display strings of the children are
+    fetched once and shared by all the parents linking to the same child.
+    """
+
+    class FeatureType(IntEnum):
+        Parent = (1,)
+        Child = 2
+
+    class Role(IntEnum):
+        FeatureType = (Qt.ItemDataRole.UserRole + 1,)
+        FeatureId = Qt.ItemDataRole.UserRole + 2
+
+    class ParentItem(object):
+        def __init__(self, feature, row: int):
+            self.feature = feature
+            self.row = row
+            self.childFeatureIds = []
+            self.childItems = None
+
+        def childrenFetched(self):
+            return self.childItems is not None
+
+    class ChildItem(object):
+        def __init__(self, parentItem, featureId: int, row: int):
+            self.parentItem = parentItem
+            self.featureId = featureId
+            self.row = row
+
+    def __init__(self, parent: QObject = None):
+        super().__init__(parent)
+
+        self._relation = QgsRelation()
+        self._nmRelation = QgsRelation()
+        self._parentItems = []
+
+        # Display strings of the fetched children by feature id, shared by all parents
+        self._childDisplayStrings = dict()
+        self._mixedValueFeatureIds = set()
+
+        self._parentIcon = QIcon()
+        self._childIcon = QIcon()
+
+    def parentLayer(self):
+        return self._relation.referencedLayer()
+
+    def childLayer(self):
+        if self._nmRelation.isValid():
+            return self._nmRelation.referencedLayer()
+
+        return self._relation.referencingLayer()
+
+    def setFeatures(self, relation: QgsRelation, nmRelation: QgsRelation, parentFeatures):
+        """
+        Sets the edited parent features, the child items are fetched when a parent is expanded
+        """
+        self.beginResetModel()
+
+        self._relation = relation
+        self._nmRelation = nmRelation
+        self._childDisplayStrings = dict()
+        self._mixedValueFeatureIds = set()
+
+        self._parentItems = [
+            MultiEditModel.ParentItem(parentFeature, row) for row, parentFeature in enumerate(parentFeatures)
+        ]
+        self._fetchChildFeatureIds()
+
+        self._parentIcon = QgsIconUtils.iconForLayer(self.parentLayer())
+        self._childIcon = QgsIconUtils.iconForLayer(self.childLayer())
+
+        self.endResetModel()
+
+    def childFeatureIdsByParent(self) -> dict:
+        """
+        Returns the ids of the child features linked to each parent feature id
+        """
+        return {parentItem.feature.id(): parentItem.childFeatureIds for parentItem in self._parentItems}
+
+    @staticmethod
+    def mixedValueFeatureIds(childFeatureIdsByParent: dict) -> set:
+        """
+        Returns the ids of the child features which are not linked to all the parents,
+        the number of parents linking to each child is counted in a single pass
+        """
+        parentCounts = Counter()
+        for childFeatureIds in childFeatureIdsByParent.values():
+            parentCounts.update(set(childFeatureIds))
+
+        parentCount = len(childFeatureIdsByParent)
+        return {featureId for featureId, count in parentCounts.items() if count != parentCount}
+
+    def setMixedValueFeatureIds(self, featureIds):
+        """
+        Child features not linked to all the parents, they are shown in italic
+        """
+        self._mixedValueFeatureIds = set(featureIds)
+
+        for parentItem in self._parentItems:
+            if parentItem.childItems:
+                parentIndex = self.index(parentItem.row, 0)
+                self.dataChanged.emit(
+                    self.index(0, 0, parentIndex),
+                    self.index(len(parentItem.childItems) - 1, 0, parentIndex),
+                    [Qt.ItemDataRole.FontRole],
+                )
+
+    def childIndexes(self, featureIds) -> list:
+        """
+        Returns the indexes of the fetched child items of the given feature ids
+        """
+        featureIds = set(featureIds)
+
+        indexes = []
+        for parentItem in self._parentItems:
+            for childItem in parentItem.childItems or []:
+                if childItem.featureId in featureIds:
+                    indexes.append(self.createIndex(childItem.row, 0, childItem))
+
+        return indexes
+
+    def fetchAll(self):
+        for parentItem in self._parentItems:
+            parentIndex = self.index(parentItem.row, 0)
+            if self.canFetchMore(parentIndex):
+                self.fetchMore(parentIndex)
+
+    def _fetchChildFeatureIds(self):
+        """
+        Collects the ids of the children of all the parents from the shared key index,
+        with bulk requests while it is built in the background
+        """
+        if not RelationKeyIndex.relationIndexesBuilt(self._relation, self._nmRelation):
+            self._requestChildFeatureIds()
+            return
+
+        for parentItem in self._parentItems:
+            if self._nmRelation.isValid():
+                featureIds = RelationKeyIndex.nmRelatedFeatureIds(self._relation, self._nmRelation, parentItem.feature)
+            else:
+                featureIds = RelationKeyIndex.relatedFeatureIds(self._relation, parentItem.feature)
+
+            parentItem.childFeatureIds = sorted(featureIds)
+
+    def _requestChildFeatureIds(self):
+        """
+        Collects the ids of the children of all the parents at once while the key index is not built:
+        the referencing features of all the parent keys are fetched with one request and, for n:m
+        relations, the distinct children with a second one. They are then grouped by parent in memory.
+        """
+        referencedFields = list(self._relation.fieldPairs().values())
+        referencingFields = list(self._relation.fieldPairs().keys())
+
+        parentItemsByKey = dict()
+        for parentItem in self._parentItems:
+            parentItem.childFeatureIds = []
+
+            key = tuple(parentItem.feature.attribute(field) for field in referencedFields)
+            if any(RelationUtils.isNull(value) for value in key):
+                continue
+
+            parentItemsByKey.setdefault(key, []).append(parentItem)
+
+        if not parentItemsByKey:
+            return
+
+        referencingLayer = self._relation.referencingLayer()
+        nmReferencingFields = list(self._nmRelation.fieldPairs().keys()) if self._nmRelation.isValid() else []
+        request = FeatureRequestBuilder.attributesRequest(referencingLayer, referencingFields + nmReferencingFields)
+
+        joinFeatures = []
+        joinKeysByParent = dict()
+        for chunkRequest in RelationUtils.referencingFeaturesRequests(self._relation, parentItemsByKey.keys(), request):
+            for referencingFeature in referencingLayer.getFeatures(chunkRequest):
+                key = tuple(referencingFeature.attribute(field) for field in referencingFields)
+                for parentItem in parentItemsByKey.get(key, []):
+                    if not self._nmRelation.isValid():
+                        parentItem.childFeatureIds.append(referencingFeature.id())
+                        continue
+
+                    joinKey = tuple(referencingFeature.attribute(field) for field in nmReferencingFields)
+                    joinKeysByParent.setdefault(parentItem.row, []).append(joinKey)
+
+                if self._nmRelation.isValid():
+                    joinFeatures.append(referencingFeature)
+
+        if joinFeatures:
+            # Distinct children linked by the join features
+            nmReferencedFields = list(self._nmRelation.fieldPairs().values())
+            childLayer = self._nmRelation.referencedLayer()
+            childRequest = FeatureRequestBuilder.attributesRequest(childLayer, nmReferencedFields)
+
+            childFeatureIdsByKey = dict()
+            for childFeature in RelationUtils.referencedFeatures(self._nmRelation, joinFeatures, childRequest):
+                key = tuple(childFeature.attribute(field) for field in nmReferencedFields)
+                childFeatureIdsByKey.setdefault(key, []).append(childFeature.id())
+
+            for row, joinKeys in joinKeysByParent.items():
+                for joinKey in joinKeys:
+                    self._parentItems[row].childFeatureIds.extend(childFeatureIdsByKey.get(joinKey, []))
+
+        # Same order as the ids from the key index
+        for parentItem in self._parentItems:
+            parentItem.childFeatureIds = sorted(set(parentItem.childFeatureIds))
+
+    def _fetchChildDisplayStrings(self, featureIds):
+        featureIds = [featureId for featureId in set(featureIds) if featureId not in self._childDisplayStrings]
+        if not featureIds:
+            return
+
+        layer = self.childLayer()
+        displayStringService = DisplayStringService.instance(layer)
+
+        request = FeatureRequestBuilder.displayStringRequest(layer, QgsFeatureRequest().setFilterFids(featureIds))
+        for feature in layer.getFeatures(request):
+            self._childDisplayStrings[feature.id()] = displayStringService.displayString(feature)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if not parent.isValid():
+            return len(self._parentItems)
+
+        item = parent.internalPointer()
+        if isinstance(item, MultiEditModel.ParentItem) and item.childrenFetched():
+            return len(item.childItems)
+
+        return 0
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 1
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        if not parent.isValid():
+            return len(self._parentItems) > 0
+
+        item = parent.internalPointer()
+        if isinstance(item, MultiEditModel.ParentItem):
+            return len(item.childFeatureIds) > 0
+
+        return False
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        if not parent.isValid():
+            return False
+
+        item = parent.internalPointer()
+        return isinstance(item, MultiEditModel.ParentItem) and not item.childrenFetched()
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+
+        parentItem = parent.internalPointer()
+        self._fetchChildDisplayStrings(parentItem.childFeatureIds)
+
+        if not parentItem.childFeatureIds:
+            parentItem.childItems = []
+            return
+
+        self.beginInsertRows(parent, 0, len(parentItem.childFeatureIds) - 1)
+        parentItem.childItems = [
+            MultiEditModel.ChildItem(parentItem, featureId, row)
+            for row, featureId in enumerate(parentItem.childFeatureIds)
+        ]
+        self.endInsertRows()
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+
+        if not parent.isValid():
+            return self.createIndex(row, column, self._parentItems[row])
+
+        return self.createIndex(row, column, parent.internalPointer().childItems[row])
+
+    def parent(self, index: QModelIndex):
+        if not index.isValid():
+            return QModelIndex()
+
+        item = index.internalPointer()
+        if isinstance(item, MultiEditModel.ParentItem):
+            return QModelIndex()
+
+        return self.createIndex(item.parentItem.row, 0, item.parentItem)
+
+    def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+
+        # Parent feature items are not selectable
+        if isinstance(index.internalPointer(), MultiEditModel.ParentItem):
+            return Qt.ItemFlag.ItemIsEnabled
+
+        return Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        item = index.internalPointer()
+
+        if isinstance(item, MultiEditModel.ParentItem):
+            if role == Qt.ItemDataRole.DisplayRole:
+                return DisplayStringService.instance(self.parentLayer()).displayString(item.feature)
+
+            if role == Qt.ItemDataRole.DecorationRole:
+                return self._parentIcon
+
+            if role == MultiEditModel.Role.FeatureType:
+                return MultiEditModel.FeatureType.Parent
+
+            if role == MultiEditModel.Role.FeatureId:
+                return item.feature.id()
+
+            return None
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._childDisplayStrings.get(item.featureId, str(item.featureId))
+
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self._childIcon
+
+        if role == Qt.ItemDataRole.FontRole and item.featureId in self._mixedValueFeatureIds:
+            font = QFont()
+            font.setItalic(True)
+            return font
+
+        if role == MultiEditModel.Role.FeatureType:
+            return MultiEditModel.FeatureType.Child
+
+        if role == MultiEditModel.Role.FeatureId:
+            return item.featureId
+
+        return None
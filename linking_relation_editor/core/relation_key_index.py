@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+#
+# QGIS Linking Relation Editor
+# Copyright (C) 2024 OPENGIS.ch
+#
+# licensed under the terms of GNU GPL 2
+#
+# -----------------------------------------------------------
+
+from qgis.core import (
+    QgsApplication,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsLogger,
+    QgsRelation,
+    QgsVectorLayer,
+)
+from qgis.PyQt.QtCore import QObject, QTimer, pyqtSignal
+
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+from linking_relation_editor.core.relation_key_index_task import RelationKeyIndexTask
+from linking_relation_editor.core.relation_utils import RelationUtils
+
+
+class RelationKeyIndex(QObject):
+    """
+    In-memory index of the feature ids of a layer by the values of its key fields, shared by all
+    the users of the layer. It is built on the first lookup, or in the background for the users
+    which fall back to requests meanwhile. It is then kept current from the layer edit signals,
+    committed features get their new ids, and it is built again on rollback or reload.
+    """
+
+    # Emitted when the keys of the indexed features may have changed, once per batch of edits
+    keysChanged = pyqtSignal()
+
+    # Indexes by layer id and key fields, an index is deleted with its layer
+    _indexes = dict()
+
+    def __init__(self, layer: QgsVectorLayer, fields):
+        super().__init__(layer)
+
+        self._layer = layer
+        self._fields = tuple(fields)
+
+        # Attribute indexes of the key fields and position in the key by attribute index
+        self._keyAttributes = []
+        self._keyPositions = dict()
+        self._featureIdsByKey = None
+        self._keysByFeatureId = None
+
+        # Background build, the edits made meanwhile are replayed on its result
+        self._buildTask = None
+        self._buildEvents = []
+
+        # Added features are read at once from the edit buffer
+        self._addedFeatureIds = set()
+
+        # Features added during the edit session and keys of the features committed with a new id
+        self._editAddedFeatureIds = set()
+        self._committedKeys = dict()
+
+        self._keysChangedTimer = QTimer(self)
+        self._keysChangedTimer.setSingleShot(True)
+        self._keysChangedTimer.setInterval(0)
+        self._keysChangedTimer.timeout.connect(self._emitKeysChanged)
+
+        self._layer.featureAdded.connect(self._featureAdded)
+        self._layer.featureDeleted.connect(self._featureDeleted)
+        self._layer.attributeValueChanged.connect(self._attributeValueChanged)
+        self._layer.committedFeaturesAdded.connect(self._committedFeaturesAdded)
+        self._layer.afterCommitChanges.connect(self._afterCommitChanges)
+        self._layer.afterRollBack.connect(self.invalidate)
+        self._layer.subsetStringChanged.connect(self.invalidate)
+        self._layer.updatedFields.connect(self.invalidate)
+        self._layer.dataSourceChanged.connect(self._dataSourceChanged)
+        self._layer.willBeDeleted.connect(self._cancelBuild)
+        self._connectDataProvider()
+
+        indexId = (layer.id(), self._fields)
+        self.destroyed.connect(lambda: RelationKeyIndex._indexes.pop(indexId, None))
+
+    @staticmethod
+    def instance(layer: QgsVectorLayer, fields):
+        """
+        Returns the index of the layer by the given key fields shared by all the users of the layer
+        """
+        indexId = (layer.id(), tuple(fields))
+
+        index = RelationKeyIndex._indexes.get(indexId)
+        if index is None:
+            index = RelationKeyIndex(layer, fields)
+            RelationKeyIndex._indexes[indexId] = index
+
+        return index
+
+    @staticmethod
+    def relationIndexes(relation: QgsRelation, nmRelation: QgsRelation = QgsRelation()) -> list:
+        """
+        Returns the indexes looked up for the linked features of the relation
+        """
+        indexes = [
+            RelationKeyIndex.instance(relation.referencingLayer(), RelationKeyIndex._referencingFields(relation))
+        ]
+        if nmRelation.isValid():
+            indexes.append(RelationKeyIndex.instance(nmRelation.referencingLayer(), nmRelation.fieldPairs().keys()))
+            indexes.append(RelationKeyIndex.instance(nmRelation.referencedLayer(), nmRelation.fieldPairs().values()))
+
+        return indexes
+
+    @staticmethod
+    def relationIndexesBuilt(relation: QgsRelation, nmRelation: QgsRelation = QgsRelation()) -> bool:
+        """
+        Returns whether the indexes of the relation are built, so that lookups do not scan the layers.
+        The indexes which are not are built in the background meanwhile.
+        """
+        built = True
+        for index in RelationKeyIndex.relationIndexes(relation, nmRelation):
+            if not index.isBuilt():
+                index.buildInBackground()
+                built = False
+
+        return built
+
+    @staticmethod
+    def relatedFeatureIds(relation: QgsRelation, parentFeature: QgsFeature) -> set:
+        """
+        Returns the ids of the referencing features of the parent feature, like the features
+        of QgsRelation.getRelatedFeaturesRequest. Parents with a NULL key have no related features.
+        """
+        key = [parentFeature.attribute(field) for field in relation.fieldPairs().values()]
+        if any(RelationUtils.isNull(value) for value in key):
+            return set()
+
+        if relation.type() == QgsRelation.RelationType.Generated:
+            key.append(relation.polymorphicRelation().layerRepresentation(relation.referencedLayer()))
+
+        fields = RelationKeyIndex._referencingFields(relation)
+        return RelationKeyIndex.instance(relation.referencingLayer(), fields).featureIds(key)
+
+    @staticmethod
+    def relatedFeaturesRequest(relation: QgsRelation, parentFeature: QgsFeature) -> QgsFeatureRequest:
+        """
+        Returns the request of the referencing features of the parent feature, by feature ids when
+        the index is already built, by expression otherwise so the layer is not scanned to build it
+        """
+        if not RelationKeyIndex.relationIndexesBuilt(relation):
+            return relation.getRelatedFeaturesRequest(parentFeature)
+
+        return QgsFeatureRequest().setFilterFids(list(RelationKeyIndex.relatedFeatureIds(relation, parentFeature)))
+
+    @staticmethod
+    def nmRelatedFeatureIds(relation: QgsRelation, nmRelation: QgsRelation, parentFeature: QgsFeature) -> set:
+        """
+        Returns the ids of the child features linked to the parent feature through the join features
+        """
+        joinIndex = RelationKeyIndex.instance(nmRelation.referencingLayer(), nmRelation.fieldPairs().keys())
+        childIndex = RelationKeyIndex.instance(nmRelation.referencedLayer(), nmRelation.fieldPairs().values())
+
+        featureIds = set()
+        for joinFeatureId in RelationKeyIndex.relatedFeatureIds(relation, parentFeature):
+            featureIds |= childIndex.featureIds(joinIndex.key(joinFeatureId))
+
+        return featureIds
+
+    @staticmethod
+    def nmLinkedFeatureIds(relation: QgsRelation, nmRelation: QgsRelation, parentFeature: QgsFeature) -> set:
+        """
+        Returns the ids of the child features linked to the parent feature, from the indexes when
+        they are built, with a request of the join features and of the children otherwise
+        """
+        if RelationKeyIndex.relationIndexesBuilt(relation, nmRelation):
+            return RelationKeyIndex.nmRelatedFeatureIds(relation, nmRelation, parentFeature)
+
+        # Only the keys of the join features are needed
+        joinLayer = relation.referencingLayer()
+        request = FeatureRequestBuilder.attributesRequest(
+            joinLayer, nmRelation.fieldPairs().keys(), relation.getRelatedFeaturesRequest(parentFeature)
+        )
+
+        return RelationUtils.referencedFeatureIds(nmRelation, joinLayer.getFeatures(request))
+
+    def layer(self) -> QgsVectorLayer:
+        return self._layer
+
+    def featureIds(self, key) -> set:
+        """
+        Returns the ids of the features with the given key, the values are converted to the types
+        of the key fields as a filter expression would do
+        """
+        if key is None or any(RelationUtils.isNull(value) for value in key):
+            return set()
+
+        fields = self._layer.fields()
+
+        try:
+            key = tuple(
+                RelationKeyIndex._keyValue(fields.field(field).convertCompatible(value))
+                for field, value in zip(self._fields, key)
+            )
+        except ValueError:
+            return set()
+
+        self._update()
+
+        return set(self._featureIdsByKey.get(key, ()))
+
+    def key(self, featureId: int):
+        """
+        Returns the key of the feature, None if the feature is not in the layer
+        """
+        self._update()
+
+        return self._keysByFeatureId.get(featureId)
+
+    def isBuilt(self) -> bool:
+        """
+        Returns whether the index is built, lookups on a built index do not request the layer
+        """
+        return self._featureIdsByKey is not None
+
+    def buildInBackground(self):
+        """
+        Builds the index in a background task, keysChanged is emitted once it is built
+        """
+        if self.isBuilt() or self._buildTask is not None:
+            return
+
+        self._buildTask = RelationKeyIndexTask(self._layer, self._fields)
+        self._buildEvents = []
+        self._buildTask.taskCompleted.connect(self._buildTaskCompleted)
+        self._buildTask.taskTerminated.connect(self._buildTaskTerminated)
+
+        QgsApplication.taskManager().addTask(self._buildTask)
+
+    def invalidate(self):
+        self._cancelBuild()
+
+        self._keyAttributes = []
+        self._keyPositions = dict()
+        self._featureIdsByKey = None
+        self._keysByFeatureId = None
+        self._addedFeatureIds = set()
+        self._editAddedFeatureIds = set()
+        self._committedKeys = dict()
+
+        self._keysChangedLater()
+
+    @staticmethod
+    def _referencingFields(relation: QgsRelation) -> list:
+        fields = list(relation.fieldPairs().keys())
+        if relation.type() == QgsRelation.RelationType.Generated:
+            polyRel = relation.polymorphicRelation()
+            assert polyRel.isValid()
+
+            fields.append(polyRel.referencedLayerField())
+
+        return fields
+
+    def _connectDataProvider(self):
+        # Only reloads of the provider data invalidate the index, the layer dataChanged signal is
+        # not used as it may also be emitted for edits, which are followed incrementally
+        if self._layer.dataProvider():
+            self._layer.dataProvider().dataChanged.connect(self.invalidate)
+
+    def _dataSourceChanged(self):
+        self.invalidate()
+        self._connectDataProvider()
+
+    def _cancelBuild(self):
+        if self._buildTask is None:
+            return
+
+        try:
+            self._buildTask.cancel()
+        except RuntimeError:
+            # The finished task is already deleted by the task manager
+            pass
+
+        self._buildTask = None
+        self._buildEvents = []
+
+    def _setKeys(self, keysByFeatureId: dict):
+        fields = self._layer.fields()
+        self._keyAttributes = [fields.indexOf(field) for field in self._fields]
+        self._keyPositions = {attribute: position for position, attribute in enumerate(self._keyAttributes)}
+
+        self._keysByFeatureId = dict()
+        self._featureIdsByKey = dict()
+        for featureId, key in keysByFeatureId.items():
+            self._insert(featureId, key)
+
+        # Features of the edit buffer get a new id on commit
+        editBuffer = self._layer.editBuffer()
+        self._editAddedFeatureIds = set(editBuffer.addedFeatures().keys()) if editBuffer else set()
+
+        QgsLogger.debug(
+            "Key index of layer '{0}' on {1} built with {2} feature(s)".format(
+                self._layer.name(), ", ".join(self._fields), len(self._keysByFeatureId)
+            )
+        )
+
+    def _build(self):
+        if self.isBuilt():
+            return
+
+        # The layer is read as it is now, the edits the background build would replay are part of it
+        self._cancelBuild()
+
+        keyAttributes = [self._layer.fields().indexOf(field) for field in self._fields]
+        request = FeatureRequestBuilder.attributesRequest(self._layer, self._fields)
+        self._setKeys(
+            {
+                feature.id(): RelationKeyIndexTask.featureKey(feature, keyAttributes)
+                for feature in self._layer.getFeatures(request)
+            }
+        )
+
+    def _buildTaskCompleted(self):
+        task = self.sender()
+        if task is not self._buildTask:
+            return
+
+        buildEvents = self._buildEvents
+        self._buildTask = None
+        self._buildEvents = []
+
+        self._setKeys(task.keysByFeatureId)
+
+        # Edits made while the task was reading the layer
+        for handler, arguments in buildEvents:
+            handler(*arguments)
+
+        self._keysChangedLater()
+
+    def _buildTaskTerminated(self):
+        if self.sender() is not self._buildTask:
+            return
+
+        self._buildTask = None
+        self._buildEvents = []
+
+    def _update(self):
+        self._build()
+        self._applyAddedFeatures()
+
+    def _keysChangedLater(self):
+        self._keysChangedTimer.start()
+
+    def _emitKeysChanged(self):
+        if self.isBuilt():
+            self._applyAddedFeatures()
+
+        self.keysChanged.emit()
+
+    @staticmethod
+    def _keyValue(value):
+        return None if RelationUtils.isNull(value) else value
+
+    def _insert(self, featureId: int, key: tuple):
+        self._keysByFeatureId[featureId] = key
+        self._featureIdsByKey.setdefault(key, set()).add(featureId)
+
+    def _remove(self, featureId: int):
+        key = self._keysByFeatureId.pop(featureId, None)
+        if key is None:
+            return
+
+        featureIds = self._featureIdsByKey.get(key)
+        featureIds.discard(featureId)
+        if not featureIds:
+            del self._featureIdsByKey[key]
+
+    def _fetchKey(self, featureId: int):
+        request = FeatureRequestBuilder.attributesRequest(self._layer, self._fields, QgsFeatureRequest(featureId))
+        for feature in self._layer.getFeatures(request):
+            return RelationKeyIndexTask.featureKey(feature, self._keyAttributes)
+
+        return None
+
+    def _applyAddedFeatures(self):
+        """
+        Indexes the features added since the last lookup, the edit buffer is read once for all of them
+        """
+        if not self._addedFeatureIds:
+            return
+
+        editBuffer = self._layer.editBuffer()
+        addedFeatures = editBuffer.addedFeatures() if editBuffer else dict()
+
+        for featureId in self._addedFeatureIds:
+            key = self._addedFeatureKey(addedFeatures.get(featureId))
+            if key is None:
+                key = self._committedKeys.get(featureId)
+            if key is None:
+                key = self._fetchKey(featureId)
+
+            self._remove(featureId)
+            if key is not None:
+                self._insert(featureId, key)
+
+        self._addedFeatureIds = set()
+
+    def _addedFeatureKey(self, feature: QgsFeature):
+        # Features added to the edit buffer may lack the attributes of fields added afterwards
+        if feature is None or len(feature.attributes()) <= max(self._keyAttributes, default=-1):
+            return None
+
+        return RelationKeyIndexTask.featureKey(feature, self._keyAttributes)
+
+    def _building(self, handler, *arguments) -> bool:
+        """
+        Records the edit for the running background build, returns False if the index is built
+        """
+        if self._buildTask is None:
+            return False
+
+        self._buildEvents.append((handler, arguments))
+        return True
+
+    def _featureAdded(self, featureId: int):
+        if self._building(self._featureAdded, featureId):
+            return
+
+        # Nothing to update before the first lookup
+        if not self.isBuilt():
+            return
+
+        self._addedFeatureIds.add(featureId)
+        self._editAddedFeatureIds.add(featureId)
+        self._keysChangedLater()
+
+    def _featureDeleted(self, featureId: int):
+        if self._building(self._featureDeleted, featureId) or not self.isBuilt():
+            return
+
+        self._addedFeatureIds.discard(featureId)
+        if featureId in self._keysByFeatureId:
+            self._remove(featureId)
+            self._keysChangedLater()
+
+    def _attributeValueChanged(self, featureId: int, attributeIndex: int, value):
+        if self._building(self._attributeValueChanged, featureId, attributeIndex, value):
+            return
+
+        if not self.isBuilt() or attributeIndex not in self._keyPositions:
+            return
+
+        # Added features are read from the edit buffer with their latest values
+        if featureId in self._addedFeatureIds:
+            return
+
+        key = self._keysByFeatureId.get(featureId)
+        if key is None:
+            self._featureAdded(featureId)
+            return
+
+        # Values set by edits may not have the type of the field yet
+        try:
+            value = self._layer.fields().at(attributeIndex).convertCompatible(value)
+        except ValueError:
+            pass
+
+        key = list(key)
+        key[self._keyPositions[attributeIndex]] = RelationKeyIndex._keyValue(value)
+
+        self._remove(featureId)
+        self._insert(featureId, tuple(key))
+        self._keysChangedLater()
+
+    def _committedFeaturesAdded(self, layerId: str, features):
+        # The committed features get their provider ids, their keys are known
+        if not self.isBuilt() or self._buildTask is not None:
+            return
+
+        for feature in features:
+            key = self._addedFeatureKey(feature)
+            if key is None:
+                continue
+
+            self._committedKeys[feature.id()] = key
+
+            self._addedFeatureIds.discard(feature.id())
+            self._remove(feature.id())
+            self._insert(feature.id(), key)
+
+        self._keysChangedLater()
+
+    def _afterCommitChanges(self):
+        # The edits read by a running build were made with the former ids
+        if self._buildTask is not None:
+            self.invalidate()
+            return
+
+        if not self.isBuilt():
+            return
+
+        # Only the ids of the added features change, the temporary ids still indexed are dropped
+        editBuffer = self._layer.editBuffer()
+        for featureId in self._editAddedFeatureIds:
+            if featureId in self._committedKeys:
+                continue
+
+            if editBuffer and editBuffer.isFeatureAdded(featureId):
+                continue
+
+            self._addedFeatureIds.discard(featureId)
+            self._remove(featureId)
+
+        self._applyAddedFeatures()
+
+        self._editAddedFeatureIds = set()
+        self._committedKeys = dict()
+        self._keysChangedLater()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+#
+# QGIS Linking Relation Editor
+# Copyright (C) 2024 OPENGIS.ch
+#
+# licensed under the terms of GNU GPL 2
+#
+# -----------------------------------------------------------
+
+from qgis.core import QgsFeature, QgsTask, QgsVectorLayer, QgsVectorLayerFeatureSource
+from qgis.PyQt.QtCore import QCoreApplication
+
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+from linking_relation_editor.core.relation_utils import RelationUtils
+
+
+class RelationKeyIndexTask(QgsTask):
+    """
+    Reads the keys of all the features of a layer in a background thread, the result is the content
+    of a RelationKeyIndex. The layer is read through a feature source taken when the task is created.
+    """
+
+    # Progress is reported every PROGRESS_INTERVAL features
+    PROGRESS_INTERVAL = 10000
+
+    def __init__(self, layer: QgsVectorLayer, fields):
+        super().__init__(
+            QCoreApplication.translate("RelationKeyIndexTask", "Indexing '{0}'").format(layer.name()),
+            QgsTask.Flag.CanCancel,
+        )
+
+        self._source = QgsVectorLayerFeatureSource(layer)
+        self._request = FeatureRequestBuilder.attributesRequest(layer, fields)
+        self._keyAttributes = [layer.fields().indexOf(field) for field in fields]
+        self._featureCount = layer.featureCount()
+
+        # Results
+        self.keysByFeatureId = dict()
+
+    @staticmethod
+    def featureKey(feature: QgsFeature, keyAttributes) -> tuple:
+        """
+        Returns the key of the feature, NULL values are None
+        """
+        return tuple(
+            None if RelationUtils.isNull(value) else value
+            for value in (feature.attribute(attribute) for attribute in keyAttributes)
+        )
+
+    def run(self):
+        keysByFeatureId = dict()
+        for feature in self._source.getFeatures(self._request):
+            if self.isCanceled():
+                return False
+
+            keysByFeatureId[feature.id()] = RelationKeyIndexTask.featureKey(feature, self._keyAttributes)
+
+            if self._featureCount > 0 and len(keysByFeatureId) % RelationKeyIndexTask.PROGRESS_INTERVAL == 0:
+                self.setProgress(100.0 * len(keysByFeatureId) / self._featureCount)
+
+        self.keysByFeatureId = keysByFeatureId
+        return True
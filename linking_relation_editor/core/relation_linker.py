@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+#
+# QGIS Linking Relation Editor
+# Copyright (C) 2024 OPENGIS.ch
+#
+# licensed under the terms of GNU GPL 2
+#
+# -----------------------------------------------------------
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsLogger,
+    QgsRelation,
+    QgsVectorLayer,
+    QgsVectorLayerUtils,
+)
+from qgis.PyQt.QtCore import QCoreApplication
+
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+from linking_relation_editor.core.relation_key_index import RelationKeyIndex
+from linking_relation_editor.core.relation_utils import RelationUtils
+
+
+class RelationLinker(object):
+    """
+    Links and unlinks child features in bulk. All the changes of a call are written to the
+    edit buffer within a single edit command, so they are undone in one step.
+    """
+
+    # Number of join features created and added at once
+    LINK_CHUNK_SIZE = 10000
+
+    @staticmethod
+    def linkFeatures(relation: QgsRelation, parentFeature: QgsFeature, featureIds) -> bool:
+        """
+        1:n relations: points the referencing fields of the child features to the parent feature
+        """
+        layer = relation.referencingLayer()
+
+        attributes = dict()
+        for referencingField, referencedField in relation.fieldPairs().items():
+            attributes[layer.fields().indexOf(referencingField)] = parentFeature.attribute(referencedField)
+
+        if relation.type() == QgsRelation.RelationType.Generated:
+            polyRel = relation.polymorphicRelation()
+            assert polyRel.isValid()
+
+            attributes[layer.fields().indexOf(polyRel.referencedLayerField())] = polyRel.layerRepresentation(
+                relation.referencedLayer()
+            )
+
+        return RelationLinker._changeAttributeValues(
+            layer,
+            featureIds,
+            attributes,
+            QCoreApplication.translate("RelationLinker", "Link {0} feature(s)").format(len(featureIds)),
+        )
+
+    @staticmethod
+    def unlinkFeatures(relation: QgsRelation, featureIds) -> bool:
+        """
+        1:n relations: sets the referencing fields of the child features to NULL
+        """
+        layer = relation.referencingLayer()
+
+        attributes = {layer.fields().indexOf(referencingField): None for referencingField in relation.fieldPairs()}
+
+        if relation.type() == QgsRelation.RelationType.Generated:
+            polyRel = relation.polymorphicRelation()
+            assert polyRel.isValid()
+
+            attributes[layer.fields().indexOf(polyRel.referencedLayerField())] = None
+
+        return RelationLinker._changeAttributeValues(
+            layer,
+            featureIds,
+            attributes,
+            QCoreApplication.translate("RelationLinker", "Unlink {0} feature(s)").format(len(featureIds)),
+        )
+
+    @staticmethod
+    def linkFeaturesNM(relation: QgsRelation, nmRelation: QgsRelation, parentFeatures, featureIds) -> list:
+        """
+        n:m relations: adds a join feature for each parent and child feature pair,
+        returns the ids of the added join features
+        """
+        # only normal relations support m:n relation
+        assert nmRelation.type() == QgsRelation.RelationType.Normal
+
+        joinLayer = relation.referencingLayer()
+
+        # Fields of the linking table
+        fields = joinLayer.fields()
+
+        # Attribute indexes of the linking table by field of the parent and of the child layers
+        parentIndexes = {
+            referencedField: fields.indexOf(referencingField)
+            for referencingField, referencedField in relation.fieldPairs().items()
+        }
+        childIndexes = {
+            referencedField: fields.indexOf(referencingField)
+            for referencingField, referencedField in nmRelation.fieldPairs().items()
+        }
+
+        layerAttributes = dict()
+        if relation.type() == QgsRelation.RelationType.Generated:
+            polyRel = relation.polymorphicRelation()
+            assert polyRel.isValid()
+
+            layerAttributes[fields.indexFromName(polyRel.referencedLayerField())] = polyRel.layerRepresentation(
+                relation.referencedLayer()
+            )
+
+        parentAttributesList = []
+        for parentFeature in parentFeatures:
+            parentAttributes = dict(layerAttributes)
+            for referencedField, index in parentIndexes.items():
+                parentAttributes[index] = parentFeature.attribute(referencedField)
+            parentAttributesList.append(parentAttributes)
+
+        if not featureIds or not parentAttributesList:
+            return []
+
+        def linkFeatureDataList():
+            for relatedFeature in nmRelation.referencedLayer().getFeatures(
+                QgsFeatureRequest().setFilterFids(list(featureIds)).setSubsetOfAttributes(nmRelation.referencedFields())
+            ):
+                childAttributes = {
+                    index: relatedFeature.attribute(referencedField) for referencedField, index in childIndexes.items()
+                }
+                for parentAttributes in parentAttributesList:
+                    linkAttributes = dict(parentAttributes)
+                    linkAttributes.update(childAttributes)
+                    yield QgsVectorLayerUtils.QgsFeatureData(QgsGeometry(), linkAttributes)
+
+        # Expression context for the linking table
+        context = joinLayer.createExpressionContext()
+
+        # The features are copied when added, their ids are collected from the layer
+        addedFeatureIds = []
+
+        def featureAdded(featureId):
+            addedFeatureIds.append(featureId)
+
+        joinLayer.beginEditCommand(
+            QCoreApplication.translate("RelationLinker", "Link {0} feature(s)").format(len(featureIds))
+        )
+        joinLayer.featureAdded.connect(featureAdded)
+        try:
+            # Join features are created and added in chunks so that memory stays bounded
+            success = True
+            for chunk in RelationLinker._chunks(linkFeatureDataList(), RelationLinker.LINK_CHUNK_SIZE):
+                linkFeaturesList = QgsVectorLayerUtils.createFeatures(joinLayer, chunk, context)
+                if not joinLayer.addFeatures(linkFeaturesList):
+                    success = False
+                    break
+        finally:
+            joinLayer.featureAdded.disconnect(featureAdded)
+
+        if not success:
+            joinLayer.destroyEditCommand()
+            QgsLogger.warning(
+                QCoreApplication.translate("RelationLinker", "Join features could not be added to layer '{0}'").format(
+                    joinLayer.name()
+                )
+            )
+            return []
+
+        joinLayer.endEditCommand()
+
+        return addedFeatureIds
+
+    @staticmethod
+    def _chunks(iterable, size: int):
+        chunk = []
+        for item in iterable:
+            chunk.append(item)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def unlinkFeaturesNM(relation: QgsRelation, nmRelation: QgsRelation, parentFeatures, featureIds) -> bool:
+        """
+        n:m relations: deletes the join features between the parent features and the child features
+        """
+        joinLayer = relation.referencingLayer()
+        featureIds = set(featureIds)
+
+        if RelationKeyIndex.relationIndexesBuilt(relation, nmRelation):
+            # Join features of the parents, those linking other children are skipped
+            joinIndex = RelationKeyIndex.instance(joinLayer, nmRelation.fieldPairs().keys())
+            childIndex = RelationKeyIndex.instance(nmRelation.referencedLayer(), nmRelation.fieldPairs().values())
+
+            joinFeatureIds = set()
+            for parentFeature in parentFeatures:
+                for joinFeatureId in RelationKeyIndex.relatedFeatureIds(relation, parentFeature):
+                    if childIndex.featureIds(joinIndex.key(joinFeatureId)) & featureIds:
+                        joinFeatureIds.add(joinFeatureId)
+        else:
+            joinFeatureIds = RelationLinker._requestJoinFeatureIds(relation, nmRelation, parentFeatures, featureIds)
+
+        if not joinFeatureIds:
+            return True
+
+        joinLayer.beginEditCommand(
+            QCoreApplication.translate("RelationLinker", "Unlink {0} feature(s)").format(len(featureIds))
+        )
+        if not joinLayer.deleteFeatures(list(joinFeatureIds)):
+            joinLayer.destroyEditCommand()
+            return False
+
+        joinLayer.endEditCommand()
+        return True
+
+    @staticmethod
+    def _requestJoinFeatureIds(relation: QgsRelation, nmRelation: QgsRelation, parentFeatures, featureIds) -> set:
+        """
+        Returns the ids of the join features between the parent features and the child features
+        with bulk requests, while the key indexes are not built
+        """
+        joinLayer = relation.referencingLayer()
+        childLayer = nmRelation.referencedLayer()
+
+        nmReferencedFields = list(nmRelation.fieldPairs().values())
+        childRequest = FeatureRequestBuilder.attributesRequest(childLayer, nmReferencedFields)
+        childRequest.setFilterFids(list(featureIds))
+
+        childKeys = set()
+        for childFeature in childLayer.getFeatures(childRequest):
+            key = tuple(childFeature.attribute(field) for field in nmReferencedFields)
+            if not any(RelationUtils.isNull(value) for value in key):
+                childKeys.add(key)
+
+        parentKeys = set()
+        for parentFeature in parentFeatures:
+            key = tuple(parentFeature.attribute(field) for field in relation.fieldPairs().values())
+            if not any(RelationUtils.isNull(value) for value in key):
+                parentKeys.add(key)
+
+        if not childKeys or not parentKeys:
+            return set()
+
+        # Join features linking the children, those of other parents are skipped in memory
+        referencingFields = list(relation.fieldPairs().keys())
+        attributes = list(referencingFields)
+
+        layerRepresentation = None
+        if relation.type() == QgsRelation.RelationType.Generated:
+            polyRel = relation.polymorphicRelation()
+            layerRepresentation = (
+                polyRel.referencedLayerField(),
+                polyRel.layerRepresentation(relation.referencedLayer()),
+            )
+            attributes.append(polyRel.referencedLayerField())
+
+        request = FeatureRequestBuilder.attributesRequest(joinLayer, attributes)
+
+        joinFeatureIds = set()
+        for chunkRequest in RelationUtils.referencingFeaturesRequests(nmRelation, childKeys, request):
+            for joinFeature in joinLayer.getFeatures(chunkRequest):
+                if tuple(joinFeature.attribute(field) for field in referencingFields) not in parentKeys:
+                    continue
+
+                if layerRepresentation and joinFeature.attribute(layerRepresentation[0]) != layerRepresentation[1]:
+                    continue
+
+                joinFeatureIds.add(joinFeature.id())
+
+        return joinFeatureIds
+
+    @staticmethod
+    def _changeAttributeValues(layer: QgsVectorLayer, featureIds, attributes: dict, text: str) -> bool:
+        """
+        Sets the same attribute values on all the features. The old values are read with a single
+        request so that the edit buffer does not look them up feature by feature.
+        """
+        featureIds = list(featureIds)
+        if not featureIds:
+            return True
+
+        request = QgsFeatureRequest().setFilterFids(featureIds)
+        request.setSubsetOfAttributes(list(attributes.keys()))
+        request.setFlags(request.flags() | QgsFeatureRequest.Flag.NoGeometry)
+
+        layer.beginEditCommand(text)
+        for feature in layer.getFeatures(request):
+            oldAttributes = {index: feature.attribute(index) for index in attributes}
+            if not layer.changeAttributeValues(feature.id(), attributes, oldAttributes):
+                layer.destroyEditCommand()
+                QgsLogger.warning(
+                    QCoreApplication.translate(
+                        "RelationLinker", "Attributes of feature {0} of layer '{1}' could not be changed"
+                    ).format(feature.id(), layer.name())
+                )
+                return False
+
+        layer.endEditCommand()
+        return True
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+#
+# QGIS Linking Relation Editor
+# Copyright (C) 2024 OPENGIS.ch
+#
+# licensed under the terms of GNU GPL 2
+#
+# -----------------------------------------------------------
+
+from qgis.core import (
+    QgsAbstractFeatureSource,
+    QgsExpression,
+    QgsFeatureRequest,
+    QgsRelation,
+    QgsSettings,
+    QgsVectorLayer,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+
+
+class RelationUtils(object):
+    # Maximum number of keys in a single IN (...) filter or fid request
+    KEY_LOOKUP_CHUNK_SIZE = 1000
+
+    @staticmethod
+    def isNull(value) -> bool:
+        return value is None or (isinstance(value, QVariant) and value.isNull())
+
+    @staticmethod
+    def referencingKeys(relation: QgsRelation, referencingFeatures) -> set:
+        """
+        Collects the keys (tuples of the referencing field values) pointed to by the referencing features.
+        Features with a NULL key component do not reference anything and are skipped.
+        """
+        referencingFields = list(relation.fieldPairs().keys())
+
+        keys = set()
+        for referencingFeature in referencingFeatures:
+            key = tuple(referencingFeature.attribute(field) for field in referencingFields)
+            if any(RelationUtils.isNull(value) for value in key):
+                continue
+
+            keys.add(key)
+
+        return keys
+
+    @staticmethod
+    def keysAreFeatureIds(relation: QgsRelation) -> bool:
+        """
+        Returns True if the referenced key is the feature id of the referenced layer,
+        as for the fid primary key of GeoPackages.
+        """
+        fieldPairs = relation.fieldPairs()
+        if len(fieldPairs) != 1:
+            return False
+
+        layer = relation.referencedLayer()
+        if layer.providerType() != "ogr":
+            return False
+
+        # Features not yet committed get a temporary negative id
+        editBuffer = layer.editBuffer()
+        if editBuffer and editBuffer.addedFeatures():
+            return False
+
+        provider = layer.dataProvider()
+        referencedField = list(fieldPairs.values())[0]
+        return provider.fields().indexOf(referencedField) in provider.pkAttributeIndexes()
+
+    @staticmethod
+    def keysFilterExpression(relation: QgsRelation, keys) -> str:
+        """
+        Filter expression matching the referenced features with the given keys
+        """
+        return RelationUtils.fieldValuesFilterExpression(list(relation.fieldPairs().values()), keys)
+
+    @staticmethod
+    def fieldValuesFilterExpression(fields, keys) -> str:
+        """
+        Filter expression matching the features whose fields values are one of the keys
+        """
+        if len(fields) == 1:
+            return "{0} IN ({1})".format(
+                QgsExpression.quotedColumnRef(fields[0]),
+                ", ".join(QgsExpression.quotedValue(key[0]) for key in keys),
+            )
+
+        filters = []
+        for key in keys:
+            conditions = [
+                QgsExpression.createFieldEqualityExpression(field, value) for field, value in zip(fields, key)
+            ]
+            filters.append("(" + " AND ".join(conditions) + ")")
+
+        return " OR ".join(filters)
+
+    @staticmethod
+    def notFieldValuesFilterExpression(fields, keys) -> str:
+        """
+        Anti-join filter expression matching the features whose fields values are none of the keys.
+        It only uses operators the PostgreSQL and GeoPackage expression compilers translate to SQL.
+        """
+        conditions = ["{0} IS NULL".format(QgsExpression.quotedColumnRef(field)) for field in fields]
+        conditions.append("NOT ({0})".format(RelationUtils.fieldValuesFilterExpression(fields, keys)))
+
+        return " OR ".join(conditions)
+
+    @staticmethod
+    def providerCompilesExpressions(layer: QgsVectorLayer) -> bool:
+        """
+        Returns True if filter expressions on the layer are compiled to SQL and run by the database
+        """
+        if not QgsSettings().value("/qgis/compileExpressions", True, bool):
+            return False
+
+        if layer.providerType() in ("postgres", "spatialite"):
+            return True
+
+        return layer.providerType() == "ogr" and layer.dataProvider().storageType() == "GPKG"
+
+    @staticmethod
+    def referencedFeaturesRequests(
+        relation: QgsRelation,
+        keys,
+        request: QgsFeatureRequest = None,
+        keysAreFeatureIds: bool = None,
+        referencedAttributes: list = None,
+    ) -> list:
+        """
+        Requests for the referenced features with the given keys, in chunks of KEY_LOOKUP_CHUNK_SIZE keys.
+        The flags and attributes of the template request are kept.
+        keysAreFeatureIds and referencedAttributes read the referenced layer,
+        they must be given when called outside of the main thread.
+        """
+        if request is None:
+            request = QgsFeatureRequest()
+
+        keys = list(keys)
+        if keysAreFeatureIds is None:
+            keysAreFeatureIds = RelationUtils.keysAreFeatureIds(relation)
+        if referencedAttributes is None:
+            referencedAttributes = relation.referencedFields()
+
+        requests = []
+        for start in range(0, len(keys), RelationUtils.KEY_LOOKUP_CHUNK_SIZE):
+            chunk = keys[start : start + RelationUtils.KEY_LOOKUP_CHUNK_SIZE]
+
+            chunkRequest = QgsFeatureRequest(request)
+            if keysAreFeatureIds:
+                chunkRequest.setFilterFids([key[0] for key in chunk])
+            else:
+                chunkRequest.setFilterExpression(RelationUtils.keysFilterExpression(relation, chunk))
+
+                # The key fields are needed if the expression is evaluated locally
+                if chunkRequest.flags() & QgsFeatureRequest.Flag.SubsetOfAttributes:
+                    attributes = set(chunkRequest.subsetOfAttributes()) | set(referencedAttributes)
+                    chunkRequest.setSubsetOfAttributes(list(attributes))
+
+            requests.append(chunkRequest)
+
+        return requests
+
+    @staticmethod
+    def referencingFeaturesRequests(relation: QgsRelation, keys, request: QgsFeatureRequest = None) -> list:
+        """
+        Requests for the referencing features pointing to the given keys (tuples of the referenced field values),
+        in chunks of KEY_LOOKUP_CHUNK_SIZE keys. The flags and attributes of the template request are kept.
+        """
+        if request is None:
+            request = QgsFeatureRequest()
+
+        keys = list(keys)
+        referencingLayer = relation.referencingLayer()
+        referencingFields = list(relation.fieldPairs().keys())
+
+        # Polymorphic relations also filter on the referenced layer
+        layerFilter = None
+        filterFields = list(referencingFields)
+        if relation.type() == QgsRelation.RelationType.Generated:
+            polyRel = relation.polymorphicRelation()
+            layerFilter = QgsExpression.createFieldEqualityExpression(
+                polyRel.referencedLayerField(), polyRel.layerRepresentation(relation.referencedLayer())
+            )
+            filterFields.append(polyRel.referencedLayerField())
+
+        requests = []
+        for start in range(0, len(keys), RelationUtils.KEY_LOOKUP_CHUNK_SIZE):
+            chunk = keys[start : start + RelationUtils.KEY_LOOKUP_CHUNK_SIZE]
+
+            expression = RelationUtils.fieldValuesFilterExpression(referencingFields, chunk)
+            if layerFilter:
+                expression = "({0}) AND ({1})".format(layerFilter, expression)
+
+            chunkRequest = QgsFeatureRequest(request)
+            chunkRequest.setFilterExpression(expression)
+
+            # The filter fields are needed if the expression is evaluated locally
+            if chunkRequest.flags() & QgsFeatureRequest.Flag.SubsetOfAttributes:
+                fields = referencingLayer.fields()
+                attributes = set(chunkRequest.subsetOfAttributes()) | {fields.indexOf(field) for field in filterFields}
+                chunkRequest.setSubsetOfAttributes(list(attributes))
+
+            requests.append(chunkRequest)
+
+        return requests
+
+    @staticmethod
+    def referencedFeatures(
+        relation: QgsRelation,
+        referencingFeatures,
+        request: QgsFeatureRequest = None,
+        source: QgsAbstractFeatureSource = None,
+        keysAreFeatureIds: bool = None,
+        referencedAttributes: list = None,
+    ):
+        """
+        Yields the features referenced by the referencing features with batched key lookups.
+        Background tasks pass a feature source of the referenced layer, keysAreFeatureIds and referencedAttributes.
+        """
+        keys = RelationUtils.referencingKeys(relation, referencingFeatures)
+
+        if source is None:
+            source = relation.referencedLayer()
+
+        for chunkRequest in RelationUtils.referencedFeaturesRequests(
+            relation, keys, request, keysAreFeatureIds, referencedAttributes
+        ):
+            for feature in source.getFeatures(chunkRequest):
+                yield feature
+
+    @staticmethod
+    def referencedFeatureIds(relation: QgsRelation, referencingFeatures) -> set:
+        """
+        Returns the ids of the features referenced by the referencing features
+        """
+        request = FeatureRequestBuilder.featureIdsRequest()
+
+        return {feature.id() for feature in RelationUtils.referencedFeatures(relation, referencingFeatures, request)}
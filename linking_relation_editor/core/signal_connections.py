@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+#
+# QGIS Linking Relation Editor
+# Copyright (C) 2024 OPENGIS.ch
+#
+# licensed under the terms of GNU GPL 2
+#
+# -----------------------------------------------------------
+
+from collections import Counter
+
+from qgis.core import QgsMapLayer
+
+
+class SignalConnections(object):
+    """
+    Layer signal connections owned by an object and released together when the object is torn down.
+    The number of live connections is counted per layer for diagnostics.
+    """
+
+    # Live connections by layer id
+    _liveConnections = Counter()
+
+    def __init__(self):
+        self._connections = []
+
+    def connect(self, layer: QgsMapLayer, signal, slot):
+        signal.connect(slot)
+
+        self._connections.append((layer.id(), signal, slot))
+        SignalConnections._liveConnections[layer.id()] += 1
+
+    def disconnectAll(self):
+        for layerId, signal, slot in self._connections:
+            try:
+                signal.disconnect(slot)
+            except (RuntimeError, TypeError):
+                # The layer or the receiver is already deleted, the connection is gone with it
+                pass
+
+            SignalConnections._liveConnections[layerId] -= 1
+            if SignalConnections._liveConnections[layerId] <= 0:
+                del SignalConnections._liveConnections[layerId]
+
+        self._connections = []
+
+    def count(self) -> int:
+        return len(self._connections)
+
+    @staticmethod
+    def liveConnectionCount(layer: QgsMapLayer) -> int:
+        """
+        Returns the number of live connections to the signals of the layer
+        """
+        return SignalConnections._liveConnections.get(layer.id(), 0)
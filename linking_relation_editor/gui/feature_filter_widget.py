@@ -439,4 +439,8 @@ class FeatureFilterWidget(QWidget, WidgetUi):
         neww.setFocus()
 
     def onFilterQueryTextChanged(self, value: str):
+        # The running evaluation is outdated as soon as the filter is edited
+        if self._features_model_filter:
+            self._features_model_filter.cancel_feature_filter_task()
+
         self.mFilterQueryTimer.start(300)
@@ -8,6 +8,9 @@
 #
 # -----------------------------------------------------------
 
+from qgis.core import QgsFeatureRequest
+
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
 from linking_relation_editor.gui.vector_layer_selection_manager import (
     VectorLayerSelectionManager,
 )
@@ -19,16 +22,13 @@ class FilteredSelectionManager(VectorLayerSelectionManager):
         super().__init__(layer, parent)
 
         self.mRequest = request
-        self.mSelectedFeatureIds = []
+        self.mSelectedFeatureIds = set()
 
         if not layer:
             return
 
-        for fid in layer.selectedFeatureIds():
-            if self.mRequest.acceptFeature(layer.getFeature(fid)):
-                self.mSelectedFeatureIds.append(fid)
-
-        layer.selectionChanged.connect(self.onSelectionChanged)
+        # The layer selectionChanged signal is connected by the base class
+        self.mSelectedFeatureIds = self._acceptedFeatureIds(layer.selectedFeatureIds())
 
     def selectedFeatureIds(self):
         return self.mSelectedFeatureIds
@@ -36,18 +36,50 @@ class FilteredSelectionManager(VectorLayerSelectionManager):
     def selectedFeatureCount(self):
         return len(self.mSelectedFeatureIds)
 
+    def setRequest(self, request):
+        """
+        Replaces the request filtering the selection, the layer selection is filtered again
+        """
+        self.mRequest = request
+        self.mSelectedFeatureIds = self._acceptedFeatureIds(self.layer().selectedFeatureIds())
+
+        self.selectionChanged.emit(list(self.mSelectedFeatureIds), [], True)
+
     def onSelectionChanged(self, selected, deselected, clearAndSelect):
-        lselected = selected
         if clearAndSelect:
-            self.mSelectedFeatureIds.clear()
+            self.mSelectedFeatureIds = set()
         else:
-            for fid in deselected:
-                self.mSelectedFeatureIds.remove(fid)
+            self.mSelectedFeatureIds -= set(deselected)
 
-        for fid in selected:
-            if self.mRequest.acceptFeature(self.layer().getFeature(fid)):
-                self.mSelectedFeatureIds.append(fid)
-            else:
-                lselected.remove(fid)
+        acceptedFeatureIds = self._acceptedFeatureIds(selected)
+        self.mSelectedFeatureIds |= acceptedFeatureIds
 
+        lselected = [fid for fid in selected if fid in acceptedFeatureIds]
         self.selectionChanged.emit(lselected, deselected, clearAndSelect)
+
+    def _acceptedFeatureIds(self, featureIds) -> set:
+        """
+        Returns the feature ids accepted by the request, features are fetched at once when
+        the request filters with an expression
+        """
+        featureIds = set(featureIds)
+        if not featureIds:
+            return set()
+
+        filterType = self.mRequest.filterType()
+        if filterType == QgsFeatureRequest.FilterType.FilterNone:
+            return featureIds
+
+        if filterType == QgsFeatureRequest.FilterType.FilterFid:
+            return featureIds & {self.mRequest.filterFid()}
+
+        if filterType == QgsFeatureRequest.FilterType.FilterFids:
+            return featureIds & set(self.mRequest.filterFids())
+
+        # Only the attributes needed by the filter expression are fetched
+        request = FeatureRequestBuilder.filterExpressionRequest(
+            self.layer(), self.mRequest.filterExpression().expression()
+        )
+        request.setFilterFids(list(featureIds))
+
+        return {feature.id() for feature in self.layer().getFeatures(request) if self.mRequest.acceptFeature(feature)}
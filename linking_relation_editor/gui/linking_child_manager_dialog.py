@@ -13,7 +13,6 @@ import os
 from qgis.core import (
     QgsApplication,
     QgsFeature,
-    QgsFeatureRequest,
     QgsRelation,
     QgsVectorLayer,
     QgsVectorLayerUtils,
@@ -26,14 +25,17 @@ from qgis.gui import (
     QgsAttributeForm
 )
 from qgis.PyQt.QtCore import QModelIndex, Qt, QTimer
-from qgis.PyQt.QtWidgets import QAction, QDialog, QMessageBox
+from qgis.PyQt.QtGui import QStandardItem, QStandardItemModel
+from qgis.PyQt.QtWidgets import QAction, QDialog, QMessageBox, QProgressBar, QPushButton
 from qgis.PyQt.uic import loadUiType
 from qgis.utils import iface
 from unittest.mock import MagicMock
 
+from linking_relation_editor.core.display_string_service import DisplayStringService
 from linking_relation_editor.core.model.attribute_form_delegate import (
     AttributeFormDelegate,
 )
+from linking_relation_editor.core.model.features_loader_task import FeaturesLoaderTask
 from linking_relation_editor.core.model.features_model import FeaturesModel
 from linking_relation_editor.core.model.features_model_filter import FeaturesModelFilter
 from linking_relation_editor.gui.feature_filter_widget import FeatureFilterWidget
@@ -45,6 +47,11 @@ CONFIG_SHOW_AND_EDIT_JOIN_TABLE_ATTRIBUTES = "show_and_edit_join_table_attribute
 
 
 class LinkingChildManagerDialog(QDialog, WidgetUi):
+    # Above this number of features in the referencing layer the features are loaded in a background task
+    BACKGROUND_LOADING_THRESHOLD = 10000
+
+    UnlinkedFeaturesStrategy = FeaturesLoaderTask.UnlinkedFeaturesStrategy
+
     def __init__(
         self,
         layer: QgsVectorLayer,
@@ -76,6 +83,9 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
 
         self._highlight = []
 
+        self._unlinkedFeaturesStrategy = LinkingChildManagerDialog.UnlinkedFeaturesStrategy.LocalFiltering
+        self._featuresLoaderTask = None
+
         # Ui setup
         self.setupUi(self)
 
@@ -146,11 +156,9 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
 
         self.mLayerNameLabel.setText(self._layer.name())
 
-        linkedFeatures, unlinkedFeatures, request = self._getAllFeatures()
-
         handleJoinFeature = self._linkingChildManagerDialogConfig.get(CONFIG_SHOW_AND_EDIT_JOIN_TABLE_ATTRIBUTES, False)
         self._featuresModelLeft = FeaturesModel(
-            unlinkedFeatures,
+            [],
             FeaturesModel.FeatureState.Unlinked,
             self._layer,
             handleJoinFeatures=handleJoinFeature,
@@ -162,9 +170,10 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
         self._featuresModelFilterLeft = FeaturesModelFilter(self._layer, self._canvas(), self)
         self._featuresModelFilterLeft.setSourceModel(self._featuresModelLeft)
         self.mFeaturesListViewLeft.setModel(self._featuresModelFilterLeft)
+        self._featuresModelLeft.set_icon_size(self.mFeaturesListViewLeft.iconSize())
 
         self._featuresModelRight = FeaturesModel(
-            linkedFeatures,
+            [],
             FeaturesModel.FeatureState.Linked,
             self._layer,
             handleJoinFeatures=handleJoinFeature,
@@ -174,6 +183,7 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
             parent=self,
         )
         self.mFeaturesTreeViewRight.setModel(self._featuresModelRight)
+        self._featuresModelRight.set_icon_size(self.mFeaturesTreeViewRight.iconSize())
         self.mFeaturesTreeViewRight.setItemDelegate(AttributeFormDelegate(self._featuresModelRight, self))
         self.mFeaturesTreeViewRight.expanded.connect(self._treeViewItemExpanded)
 
@@ -181,6 +191,16 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
 
         self._feature_filter_widget = FeatureFilterWidget(self)
         self.mFooterHBoxLayout.insertWidget(0, self._feature_filter_widget)
+
+        # Shown while the features are loaded in the background
+        self._featuresLoadingPlaceholderModel = QStandardItemModel(self)
+        self._featuresLoadingProgressBar = QProgressBar(self)
+        self._featuresLoadingProgressBar.setRange(0, 100)
+        self._featuresLoadingProgressBar.setVisible(False)
+        self.mFooterHBoxLayout.insertWidget(1, self._featuresLoadingProgressBar)
+        self._featuresLoadingCancelButton = QPushButton(self.tr("Cancel loading"), self)
+        self._featuresLoadingCancelButton.setVisible(False)
+        self.mFooterHBoxLayout.insertWidget(2, self._featuresLoadingCancelButton)
         
         # used for untittest
         if not iface:
@@ -215,12 +235,15 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
             self._mapToolSelect.deactivated.connect(self._mapToolDeactivated)
 
         self.mQuickFilterLineEdit.valueChanged.connect(self._quick_filter_value_changed)
+        self._featuresLoadingCancelButton.clicked.connect(self._cancelFeaturesLoading)
+
+        self._loadFeatures()
 
     def get_feature_ids_to_unlink(self):
         featureIdsToUnlink = []
         for featureModelItem in self._featuresModelLeft.get_all_feature_items():
             if featureModelItem.feature_state() == FeaturesModel.FeatureState.ToBeUnlinked:
-                featureIdsToUnlink.append(featureModelItem.feature().id())
+                featureIdsToUnlink.append(featureModelItem.feature_id())
 
         return featureIdsToUnlink
 
@@ -228,41 +251,95 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
         featureIdsToLink = []
         for featureModelItem in self._featuresModelRight.get_all_feature_items():
             if featureModelItem.feature_state() == FeaturesModel.FeatureState.ToBeLinked:
-                featureIdsToLink.append(featureModelItem.feature().id())
+                featureIdsToLink.append(featureModelItem.feature_id())
 
         return featureIdsToLink
 
-    def _getAllFeatures(self):
+    def _loadFeatures(self):
         if not self._relation.isValid() or not self._parentFeature.isValid():
-            return [], [], QgsFeatureRequest()
-
-        linkedFeatures = dict()
-        layer = self._relation.referencingLayer()
-        request = self._relation.getRelatedFeaturesRequest(self._parentFeature)
-        for feature in layer.getFeatures(request):
-            linkedFeatures[feature.id()] = feature
-
-        if self._nmRelation.isValid():
-            filters = []
-            for joinTableFeatureId, joinTableFeature in linkedFeatures.items():
-                referencedFeatureRequest = self._nmRelation.getReferencedFeatureRequest(joinTableFeature)
-                filterExpression = referencedFeatureRequest.filterExpression()
-                filters.append("(" + filterExpression.expression() + ")")
-
-            request = QgsFeatureRequest()
-            request.setFilterExpression(" OR ".join(filters))
-
-            linkedFeatures = dict()
-            layer = self._nmRelation.referencedLayer()
-            for documentFeature in layer.getFeatures(request):
-                linkedFeatures[documentFeature.id()] = documentFeature
-
-        unlinkedFeatures = list(layer.getFeatures())
-        unlinkedFeatures = [
-            unlinkedFeature for unlinkedFeature in unlinkedFeatures if unlinkedFeature.id() not in linkedFeatures
-        ]
+            return
+
+        task = FeaturesLoaderTask(self._relation, self._nmRelation, self._parentFeature)
+        self._featuresLoaderTask = task
+
+        featureCount = self._relation.referencingLayer().featureCount()
+        if 0 <= featureCount < LinkingChildManagerDialog.BACKGROUND_LOADING_THRESHOLD:
+            task.run()
+            self._featuresLoaded(task)
+            return
+
+        self._setFeaturesLoading(True, self.tr("Loading features…"))
 
-        return linkedFeatures.values(), unlinkedFeatures, request
+        task.progressChanged.connect(lambda progress: self._featuresLoadingProgress(task, progress))
+        task.taskCompleted.connect(lambda: self._featuresLoaded(task))
+        task.taskTerminated.connect(lambda: self._featuresLoadingTerminated(task))
+
+        QgsApplication.taskManager().addTask(task)
+
+    def _featuresLoadingProgress(self, task: FeaturesLoaderTask, progress: float):
+        if task is not self._featuresLoaderTask:
+            return
+
+        self._featuresLoadingProgressBar.setValue(int(progress))
+
+    def _featuresLoaded(self, task: FeaturesLoaderTask):
+        if task is not self._featuresLoaderTask:
+            return
+
+        self._featuresLoaderTask = None
+        self._unlinkedFeaturesStrategy = task.unlinkedFeaturesStrategy
+
+        self._featuresModelRight.set_features(
+            task.linkedFeatures.values(), FeaturesModel.FeatureState.Linked, features_complete=False
+        )
+        if task.unlinkedFeaturesRequest is not None:
+            self._featuresModelLeft.set_feature_request(
+                task.unlinkedFeaturesRequest, FeaturesModel.FeatureState.Unlinked, task.excludedFeatureIds
+            )
+
+        self._setFeaturesLoading(False)
+
+    def _featuresLoadingTerminated(self, task: FeaturesLoaderTask):
+        if task is not self._featuresLoaderTask:
+            return
+
+        self._featuresLoaderTask = None
+
+        # Without the linked features nothing can be linked or unlinked, the dialog stays open to be closed
+        self._setFeaturesLoading(True, self.tr("Loading canceled"))
+        self._featuresLoadingProgressBar.setVisible(False)
+        self._featuresLoadingCancelButton.setVisible(False)
+
+    def _cancelFeaturesLoading(self):
+        if self._featuresLoaderTask is not None:
+            self._featuresLoaderTask.cancel()
+
+    def _setFeaturesLoading(self, loading: bool, placeholderText: str = str()):
+        self._featuresLoadingPlaceholderModel.clear()
+
+        if loading:
+            placeholderItem = QStandardItem(placeholderText)
+            placeholderItem.setFlags(Qt.ItemFlag.NoItemFlags)
+            self._featuresLoadingPlaceholderModel.appendRow(placeholderItem)
+
+            self.mFeaturesListViewLeft.setModel(self._featuresLoadingPlaceholderModel)
+            self.mFeaturesTreeViewRight.setModel(self._featuresLoadingPlaceholderModel)
+        else:
+            self.mFeaturesListViewLeft.setModel(self._featuresModelFilterLeft)
+            self.mFeaturesTreeViewRight.setModel(self._featuresModelRight)
+
+        self._featuresLoadingProgressBar.setValue(0)
+        self._featuresLoadingProgressBar.setVisible(loading)
+        self._featuresLoadingCancelButton.setVisible(loading)
+
+        for action in [
+            self._actionLinkSelected,
+            self._actionUnlinkSelected,
+            self._actionLinkAll,
+            self._actionUnlinkAll,
+            self._actionMapFilter,
+        ]:
+            action.setEnabled(not loading)
 
     def _linkSelected(self):
         selected_indexes = self.mFeaturesListViewLeft.selectedIndexes()[:]
@@ -288,6 +365,21 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
 
         self._featuresModelFilterLeft.invalidate()
 
+        self._linkItems(featuresModelElements)
+
+    def _linkItems(self, featuresModelElements):
+        """
+        Moves the items taken from the left model to the linked ones
+        """
+        # Join features of the features to be linked are created at once
+        self._featuresModelRight.create_join_features(
+            [
+                featuresModelElement
+                for featuresModelElement in featuresModelElements
+                if featuresModelElement.feature_state() != FeaturesModel.FeatureState.ToBeUnlinked
+            ]
+        )
+
         for featuresModelElement in featuresModelElements:
             if featuresModelElement.feature_state() == FeaturesModel.FeatureState.ToBeUnlinked:
                 featuresModelElement.set_feature_state(FeaturesModel.FeatureState.Linked)
@@ -325,6 +417,8 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
 
         featuresModelElements = []
         if self._featuresModelFilterLeft.filter_active():
+            # Features not fetched yet have to be considered too
+            self._featuresModelLeft.fetch_all()
             source_model_indexes = [
                 self._featuresModelFilterLeft.mapToSource(self._featuresModelFilterLeft.index(row, 0))
                 for row in range(self._featuresModelFilterLeft.rowCount())
@@ -337,13 +431,7 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
         if not featuresModelElements:
             return
 
-        for featuresModelElement in featuresModelElements:
-            if featuresModelElement.feature_state() == FeaturesModel.FeatureState.ToBeUnlinked:
-                featuresModelElement.set_feature_state(FeaturesModel.FeatureState.Linked)
-            else:
-                featuresModelElement.set_feature_state(FeaturesModel.FeatureState.ToBeLinked)
-
-        self._featuresModelRight.add_features_model_items(featuresModelElements)
+        self._linkItems(featuresModelElements)
 
     def _unlinkAll(self):
         featuresModelElements = self._featuresModelRight.take_all_items()
@@ -417,15 +505,16 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
     def _map_tool_select_finished(self, features: list):
         self.mFeaturesListViewLeft.selectionModel().reset()
 
+        features = [feature for feature in features if feature.isValid()]
+        linkedFeatureIds = self._featuresModelRight.contains_many(feature.id() for feature in features)
+
+        displayStringService = DisplayStringService.instance(self._layer)
+
         already_linked_features = list()
         map_filter_features = list()
         for feature in features:
-            # select this feature
-            if not feature.isValid():
-                continue
-
-            if self._featuresModelRight.contains(feature.id()):
-                already_linked_features.append(QgsVectorLayerUtils.getFeatureDisplayString(self._layer, feature))
+            if feature.id() in linkedFeatureIds:
+                already_linked_features.append(displayStringService.displayString(feature))
                 continue
 
             map_filter_features.append(feature.id())
@@ -505,6 +594,12 @@ class LinkingChildManagerDialog(QDialog, WidgetUi):
         self._closing()
 
     def _closing(self):
+        # The canceled task finishes after the dialog is deleted, it must not update the dialog anymore
+        task = self._featuresLoaderTask
+        self._featuresLoaderTask = None
+        if task is not None:
+            task.cancel()
+
         self._deleteHighlight()
         self._unsetMapTool()
 
@@ -9,16 +9,14 @@
 # -----------------------------------------------------------
 
 import os
-from enum import IntEnum
 import copy
 
 from qgis.core import (
     Qgis,
     QgsApplication,
+    QgsExpressionContextUtils,
     QgsFeature,
     QgsFeatureRequest,
-    QgsGeometry,
-    QgsIconUtils,
     QgsLogger,
     QgsProject,
     QgsRelation,
@@ -29,17 +27,22 @@ from qgis.core import (
 )
 from qgis.gui import (
     QgsAbstractRelationEditorWidget,
+    QgsAttributeForm,
     QgsDualView,
     QgsMapToolDigitizeFeature,
     QgsMessageBar,
     QgsRelationEditorWidget,
 )
-from qgis.PyQt.QtCore import QT_VERSION_STR, Qt, QTimer
+from qgis.PyQt.QtCore import QT_VERSION_STR, QItemSelection, QItemSelectionModel, QTimer
 from qgis.PyQt.QtGui import QIcon
-from qgis.PyQt.QtWidgets import QButtonGroup, QSplitter, QTreeWidgetItem
+from qgis.PyQt.QtWidgets import QButtonGroup, QSplitter
 from qgis.PyQt.uic import loadUiType
 
+from linking_relation_editor.core.model.multi_edit_model import MultiEditModel
 from linking_relation_editor.core.plugin_helper import PluginHelper
+from linking_relation_editor.core.relation_key_index import RelationKeyIndex
+from linking_relation_editor.core.relation_linker import RelationLinker
+from linking_relation_editor.core.signal_connections import SignalConnections
 from linking_relation_editor.gui.filtered_selection_manager import (
     FilteredSelectionManager,
 )
@@ -55,13 +58,11 @@ CONFIG_LINKING_CHILD_MANAGER_DIALOG = "linking_child_manager_dialog"
 
 
 class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
-    class MultiEditFeatureType(IntEnum):
-        Parent = (1,)
-        Child = 2
+    MultiEditFeatureType = MultiEditModel.FeatureType
+    MultiEditTreeWidgetRole = MultiEditModel.Role
 
-    class MultiEditTreeWidgetRole(IntEnum):
-        FeatureType = (Qt.ItemDataRole.UserRole + 1,)
-        FeatureId = Qt.ItemDataRole.UserRole + 2
+    # Up to this number of edited features the children of all the parents are shown right away
+    MULTI_EDIT_EXPANDED_PARENTS_MAX = 20
 
     def __init__(self, config, parent):
         super().__init__(config, parent)
@@ -78,7 +79,15 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
         self._updateUiTimer.setSingleShot(True)
         self._updateUiTimer.timeout.connect(self.updateUiTimeout)
 
+        # Set when an update is requested while the widget is hidden, it is run once shown
+        self._updateUiPending = False
+
         self.mMultiEdit1NJustAddedIds = []
+        self._multiEditSelectionUpdating = False
+
+        # Connections to the layers of the relations, replaced when the relations change
+        self._layerConnections = SignalConnections()
+        self.destroyed.connect(self._layerConnections.disconnectAll)
 
         # Ui setup
         self.setupUi(self)
@@ -168,7 +177,10 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
         self.mLinkFeatureButton.clicked.connect(self._execLinkFeatureDialog)
         self.mUnlinkFeatureButton.clicked.connect(self.unlinkSelectedFeatures)
         self.mZoomToFeatureButton.clicked.connect(self.zoomToSelectedFeatures)
-        self.mMultiEditTreeWidget.itemSelectionChanged.connect(self.multiEditItemSelectionChanged)
+
+        self.mMultiEditModel = MultiEditModel(self)
+        self.mMultiEditTreeView.setModel(self.mMultiEditModel)
+        self.mMultiEditTreeView.selectionModel().selectionChanged.connect(self.multiEditItemSelectionChanged)
 
         self.mOneToOne = False
         self.mLinkingChildManagerDialogConfig = {}
@@ -176,7 +188,7 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
         self.mMapToolDigitize = None
         self.mMessageBarItem = None
 
-        self.mMultiEditPreviousSelectedItems = list()
+        self.mMultiEditPreviousSelectedIndexes = list()
 
         # Set initial state for add / remove etc.buttons
         self.updateButtons()
@@ -206,26 +218,30 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
             QgsLogger.warning(self.tr("Dual view should not be used in multiple edit mode"))
             return
 
-        ctx = self.editorContext()
-        ctx.setParentFormFeature(self.feature())
-
-        # showFirstFeature available since QGIS 3.24
-        if Qgis.QGIS_VERSION_INT < 32400:
-            self.mDualView.init(layer, self.editorContext().mapCanvas(), request, ctx, True)
+        if self._dualViewLayer() == layer:
+            # The dual view of the layer is reused, only its request changes
+            self._setDualViewRequest(request)
         else:
-            showFirstFeature = self.mShowFirstFeature
+            ctx = self.editorContext()
+            ctx.setParentFormFeature(self.feature())
 
-            # For one to one always show the first feature
-            if self.mOneToOne:
-                showFirstFeature = True
+            # showFirstFeature available since QGIS 3.24
+            if Qgis.QGIS_VERSION_INT < 32400:
+                self.mDualView.init(layer, self.editorContext().mapCanvas(), request, ctx, True)
+            else:
+                self.mDualView.init(
+                    layer, self.editorContext().mapCanvas(), request, ctx, True, self._dualViewShowFirstFeature()
+                )
 
-            self.mDualView.init(layer, self.editorContext().mapCanvas(), request, ctx, True, showFirstFeature)
+            # The previous manager is deleted by the dual view, it must not handle selection changes meanwhile
+            if self.mFeatureSelectionMgr:
+                self.mFeatureSelectionMgr.release()
 
-        self.mFeatureSelectionMgr = FilteredSelectionManager(layer, request, self.mDualView)
-        self.mDualView.setFeatureSelectionManager(self.mFeatureSelectionMgr)
-        self.mDualViewInitialized = True
+            self.mFeatureSelectionMgr = FilteredSelectionManager(layer, request, self.mDualView)
+            self.mDualView.setFeatureSelectionManager(self.mFeatureSelectionMgr)
+            self.mDualViewInitialized = True
 
-        self.mFeatureSelectionMgr.selectionChanged.connect(self.updateButtons)
+            self.mFeatureSelectionMgr.selectionChanged.connect(self.updateButtons)
 
         icon = QIcon()
         text = str()
@@ -245,6 +261,64 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
 
         self.updateButtons()
 
+    def _dualViewLayer(self):
+        if not self.mDualViewInitialized or self.mDualView.masterModel() is None:
+            return None
+
+        return self.mDualView.masterModel().layer()
+
+    def _dualViewShowFirstFeature(self):
+        # For one to one always show the first feature
+        return self.mShowFirstFeature or self.mOneToOne
+
+    def _setDualViewRequest(self, request: QgsFeatureRequest):
+        """
+        Swaps the request of the initialized dual view, its layer cache, models and form are kept
+        and only the related features are loaded again
+        """
+        self.mDualView.setRequest(request)
+        self.mDualView.masterModel().loadLayer()
+        self.mFeatureSelectionMgr.setRequest(request)
+
+        # The table editors and the child forms evaluate the current_parent_* expressions with the new parent
+        ctx = self.editorContext()
+        ctx.setParentFormFeature(self.feature())
+        self.mDualView.masterModel().setEditorContext(ctx)
+        for attributeForm in self.mDualView.findChildren(QgsAttributeForm):
+            attributeForm.setExtraContextScope(QgsExpressionContextUtils.parentFormScope(self.feature()))
+
+        filteredFeatures = self.mDualView.filteredFeatures()
+
+        # The form must not keep showing a child of the previous parent
+        for attributeForm in self._dualViewAttributeForms():
+            attributeForm.setEnabled(bool(filteredFeatures))
+
+        if not filteredFeatures:
+            self.mDualView.setCurrentEditSelection([])
+            for attributeForm in self._dualViewAttributeForms():
+                attributeForm.setFeature(QgsFeature(self.mDualView.masterModel().layer().fields()))
+
+        elif Qgis.QGIS_VERSION_INT < 32400 or self._dualViewShowFirstFeature():
+            # The filtered features are a set, the first feature is the one of the first row of the view
+            filterModel = self.mDualView.tableView().model()
+            self.mDualView.setCurrentEditSelection([filterModel.rowToId(filterModel.index(0, 0))])
+
+    def _dualViewAttributeForms(self):
+        """
+        Returns the attribute forms of the dual view, without the forms nested in them
+        """
+        attributeForms = []
+        for attributeForm in self.mDualView.findChildren(QgsAttributeForm):
+            parentWidget = attributeForm.parentWidget()
+            while parentWidget is not None and parentWidget is not self.mDualView:
+                if isinstance(parentWidget, QgsAttributeForm):
+                    break
+                parentWidget = parentWidget.parentWidget()
+            else:
+                attributeForms.append(attributeForm)
+
+        return attributeForms
+
     def updateButtons(self):
         toggleEditingButtonEnabled = False
         canAdd = False
@@ -353,13 +427,21 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
             QgsLogger.warning(self.tr("QSplitter with object name '{}' not found".format(splitter_name)))
 
     def updateUi(self):
+        if not self.isVisible():
+            self._updateUiTimer.stop()
+            self._updateUiPending = True
+            return
+
         self._updateUiTimer.start(200)
 
     def updateUiTimeout(self):
-        if not self.relation().isValid() or not self.feature().isValid():
+        if not self.isVisible():
+            self._updateUiPending = True
             return
 
-        if not self.isVisible():
+        self._updateUiPending = False
+
+        if not self.relation().isValid() or not self.feature().isValid():
             return
 
         if self._multiEditModeActive():
@@ -367,6 +449,12 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
         else:
             self.updateUiSingleEdit()
 
+    def showEvent(self, event):
+        super().showEvent(event)
+
+        if self._updateUiPending:
+            self.updateUiTimeout()
+
     def parentFormValueChanged(self, attribute, newValue):
         pass
 
@@ -377,20 +465,20 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
 
         self.mStackedWidget.setCurrentWidget(self.mDualView)
 
-        request = self.relation().getRelatedFeaturesRequest(self.feature())
         if self.nmRelation().isValid():
-            filters = []
-            for feature in self.relation().referencingLayer().getFeatures(request):
-                referenced_request = self.nmRelation().getReferencedFeatureRequest(feature)
-                filter = referenced_request.filterExpression().expression()
-                filters.append("(" + filter + ")")
+            # The linked features are looked up in the shared key index once it is built, the request
+            # is refreshed when the keys change (see afterSetRelations)
+            featureIds = RelationKeyIndex.nmLinkedFeatureIds(self.relation(), self.nmRelation(), self.feature())
 
-            nmRequest = QgsFeatureRequest()
-            nmRequest.setFilterExpression(" OR ".join(filters))
+            request = QgsFeatureRequest()
+            request.setFilterFids(sorted(featureIds))
 
-            self.initDualView(self.nmRelation().referencedLayer(), nmRequest)
+            self.initDualView(self.nmRelation().referencedLayer(), request)
 
         elif self.relation().referencingLayer():
+            # The expression request lets the dual view follow added and committed features
+            request = self.relation().getRelatedFeaturesRequest(self.feature())
+
             self.initDualView(self.relation().referencingLayer(), request)
 
         if self.mOneToOne:
@@ -406,66 +494,24 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
         self.mTableViewButton.setVisible(False)
         self.mMultiEditInfoLabel.setVisible(True)
         self.mStackedWidget.setCurrentWidget(self.mMultiEditStackedWidgetPage)
-        parentTreeWidgetItems = []
-        featureIdsMixedValues = set()
-        multimapChildFeatures = dict()
-        self.mMultiEditTreeWidget.clear()
-        for featureParent in self._featureList():
-            treeWidgetItem = self.createMultiEditTreeWidgetItem(
-                featureParent, self.relation().referencedLayer(), self.MultiEditFeatureType.Parent
-            )
-            # Parent feature items are not selectable
-            treeWidgetItem.setFlags(Qt.ItemFlag.ItemIsEnabled)
-            parentTreeWidgetItems.append(treeWidgetItem)
-            # Get child features
-            request = self.relation().getRelatedFeaturesRequest(featureParent)
-            for featureChild in self.relation().referencingLayer().getFeatures(request):
-                if self.nmRelation().isValid():
-                    requestFinalChild = self.nmRelation().getReferencedFeatureRequest(featureChild)
-                    for featureChildChild in self.nmRelation().referencedLayer().getFeatures(requestFinalChild):
-                        treeWidgetItemChild = self.createMultiEditTreeWidgetItem(
-                            featureChildChild, self.nmRelation().referencedLayer(), self.MultiEditFeatureType.Child
-                        )
-                        treeWidgetItem.addChild(treeWidgetItemChild)
-                        featureIdsMixedValues.add(featureChildChild.id())
-
-                        if id(treeWidgetItem) in multimapChildFeatures:
-                            multimapChildFeatures[id(treeWidgetItem)].append(featureChildChild.id())
-                        else:
-                            multimapChildFeatures[id(treeWidgetItem)] = [featureChildChild.id()]
-
-                else:
-                    treeWidgetItemChild = self.createMultiEditTreeWidgetItem(
-                        featureChild, self.relation().referencingLayer(), self.MultiEditFeatureType.Child
-                    )
-                    treeWidgetItem.addChild(treeWidgetItemChild)
-                    featureIdsMixedValues.add(featureChild.id())
 
-            self.mMultiEditTreeWidget.addTopLevelItem(treeWidgetItem)
-            treeWidgetItem.setExpanded(True)
+        self.mMultiEditPreviousSelectedIndexes = list()
+        self.mMultiEditModel.setFeatures(self.relation(), self.nmRelation(), self._featureList())
+        if self.mMultiEditModel.rowCount() <= self.MULTI_EDIT_EXPANDED_PARENTS_MAX:
+            self.mMultiEditTreeView.expandAll()
 
         # Set mixed values indicator (Green or Orange)
         #
         # Green:
         #     n:m and 1:n: 0 child features available
-        #     n:m with no mixed values
+        #     n:m and 1:n: all child features are linked to all the parents
         # Orange:
-        #     n:m with mixed values
-        #     1:n always, including when we pseudo know that feature are related (just added feature)
+        #     n:m and 1:n: some child features are not linked to all the parents, for 1:n relations
+        #     this is always the case with several parents, including for just added features
         #
         # See https://github.com/qgis/QGIS/pull/45703
         #
-        if self.nmRelation().isValid():
-            for featureIdMixedValue in set(featureIdsMixedValues):
-                mixedValues = True
-                for parentTreeWidgetItem in parentTreeWidgetItems:
-                    if featureIdMixedValue in multimapChildFeatures[id(parentTreeWidgetItem)]:
-                        mixedValues = True
-                        break
-
-                if not mixedValues:
-                    featureIdsMixedValues.remove(featureIdMixedValue)
-                    continue
+        featureIdsMixedValues = MultiEditModel.mixedValueFeatureIds(self.mMultiEditModel.childFeatureIdsByParent())
 
         # Set multiedit info label
         if not featureIdsMixedValues:
@@ -481,38 +527,19 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
                 icon.pixmap(self.mMultiEditInfoLabel.height(), self.mMultiEditInfoLabel.height())
             )
             self.mMultiEditInfoLabel.setToolTip(self.tr("Some features in selection have different relations"))
-            # Set italic font for mixed values
-            fontItalic = self.mMultiEditTreeWidget.font()
-            fontItalic.setItalic(True)
-            for parentTreeWidgetItem in parentTreeWidgetItems:
-                for childIndex in range(parentTreeWidgetItem.childCount()):
-                    childItem = parentTreeWidgetItem.child(childIndex)
-                    featureIdCurrentItem = childItem.data(0, self.MultiEditTreeWidgetRole.FeatureId)
-                    if featureIdCurrentItem in featureIdsMixedValues:
-                        childItem.setFont(0, fontItalic)
+
+        # Mixed values are shown in italic
+        self.mMultiEditModel.setMixedValueFeatureIds(featureIdsMixedValues)
 
     def addFeatureClicked(self):
         addedFeatures = self.addFeature()
 
         if not self._multiEditModeActive():
             return
-      
-        self.mMultiEditTreeWidget.blockSignals(True)
-        self.mMultiEdit1NJustAddedIds = addedFeatures
-
-
-        for indexTopLevelItem in range(self.mMultiEditTreeWidget.topLevelItemCount()):
-            treeWidgetTopLevelItem = self.mMultiEditTreeWidget.topLevelItem(indexTopLevelItem)
 
-            for indexItem in range(treeWidgetTopLevelItem.childCount()):
-                treeWidgetItem = treeWidgetTopLevelItem.child(indexItem)
-      
-                if treeWidgetItem.data(0, (self.MultiEditTreeWidgetRole.FeatureId)) in addedFeatures:
-                    treeWidgetItem.setSelected(True)
-      
+        self.mMultiEdit1NJustAddedIds = addedFeatures
+        self._selectMultiEditChildFeatures(addedFeatures)
 
-        self.mMultiEditTreeWidget.blockSignals(False)
-      
         self.updateUi()
         self.updateButtons()
 
@@ -596,6 +623,7 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
             self,
         )
         relationEditorLinkChildManagerDialog.accepted.connect(self._relationEditorLinkChildManagerDialogAccepted)
+        relationEditorLinkChildManagerDialog.rejected.connect(relationEditorLinkChildManagerDialog.deleteLater)
         relationEditorLinkChildManagerDialog.show()
 
     def _linkFeatures(self, featureIds):
@@ -603,81 +631,29 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
             return
 
         if self.nmRelation().isValid():
-            # only normal relations support m:n relation
-            assert self.nmRelation().type() == QgsRelation.RelationType.Normal
-
-            # Fields of the linking table
-            fields = self.relation().referencingLayer().fields()
-
-            linkAttributes = dict()
-
-            if self.relation().type() == QgsRelation.RelationType.Generated:
-                polyRel = self.relation().polymorphicRelation()
-                assert polyRel.isValid()
-
-                linkAttributes[fields.indexFromName(polyRel.referencedLayerField())] = polyRel.layerRepresentation(
-                    self.relation().referencedLayer()
-                )
-
-            linkFeatureDataList = []
-            for relatedFeature in (
-                self.nmRelation()
-                .referencedLayer()
-                .getFeatures(
-                    QgsFeatureRequest()
-                    .setFilterFids(featureIds)
-                    .setSubsetOfAttributes(self.nmRelation().referencedFields())
-                )
-            ):
-                for editFeature in self._featureList():
-                    for referencingField, referencedField in self.relation().fieldPairs().items():
-                        index = fields.indexOf(referencingField)
-                        linkAttributes[index] = editFeature.attribute(referencedField)
-
-                    for referencingField, referencedField in self.nmRelation().fieldPairs().items():
-                        index = fields.indexOf(referencingField)
-                        linkAttributes[index] = relatedFeature.attribute(referencedField)
-
-                    linkFeatureDataList.append(QgsVectorLayerUtils.QgsFeatureData(QgsGeometry(), linkAttributes))
-
-            # Expression context for the linking table
-            context = self.relation().referencingLayer().createExpressionContext()
-
-            linkFeaturesList = QgsVectorLayerUtils.createFeatures(
-                self.relation().referencingLayer(), linkFeatureDataList, context
-            )
-
-            self.relation().referencingLayer().addFeatures(linkFeaturesList)
-            ids = []
-            for f in linkFeaturesList:
-                ids.append(f.id())
+            ids = RelationLinker.linkFeaturesNM(self.relation(), self.nmRelation(), self._featureList(), featureIds)
             self.relation().referencingLayer().selectByIds(ids)
         else:
             if self._multiEditModeActive():
                 QgsLogger.warning(self.tr("For 1:n relations is not possible to link to multiple features"))
                 return
 
-            keys = dict()
-            for referencingField, referencedField in self.relation().fieldPairs().items():
-                idx = self.relation().referencingLayer().fields().lookupField(referencingField)
-                val = self.feature().attribute(referencedField)
-                keys[idx] = val
+            RelationLinker.linkFeatures(self.relation(), self.feature(), featureIds)
 
-            for fid in featureIds:
-                referencingLayer = self.relation().referencingLayer()
-                if self.relation().type() == QgsRelation.RelationType.Generated:
-                    polyRel = self.relation().polymorphicRelation()
+        self.updateUi()
 
-                    assert polyRel.isValid()
+        # relatedFeaturesChanged available since QGIS 3.24
+        if Qgis.QGIS_VERSION_INT >= 32400:
+            self.relatedFeaturesChanged.emit()
 
-                    self.relation().referencingLayer().changeAttributeValue(
-                        fid,
-                        referencingLayer.fields().indexFromName(polyRel.referencedLayerField()),
-                        polyRel.layerRepresentation(self.relation().referencedLayer()),
-                    )
+    def _unlinkFeatures(self, featureIds):
+        if len(featureIds) == 0:
+            return
 
-                for key, value in keys.items():
-                    referencingLayer.changeAttributeValue(fid, key, value)
+        if self.nmRelation().isValid():
+            RelationLinker.unlinkFeaturesNM(self.relation(), self.nmRelation(), self._featureList(), featureIds)
+        else:
+            RelationLinker.unlinkFeatures(self.relation(), featureIds)
 
         self.updateUi()
 
@@ -686,54 +662,47 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
             self.relatedFeaturesChanged.emit()
 
     def multiEditItemSelectionChanged(self):
-        selectedItems = self.mMultiEditTreeWidget.selectedItems()
+        if self._multiEditSelectionUpdating:
+            return
+
+        selectedIndexes = self.mMultiEditTreeView.selectionModel().selectedIndexes()
 
         # Select all items pointing to the same feature
         # but only if we are not deselecting.
-        if len(selectedItems) == 1 and len(self.mMultiEditPreviousSelectedItems) <= 1:
-            selectedItem = selectedItems[0]
-            if selectedItem.data(0, self.MultiEditTreeWidgetRole.FeatureType) == self.MultiEditFeatureType.Child:
-                featureIdSelectedItem = selectedItem.data(0, self.MultiEditTreeWidgetRole.FeatureId)
+        if len(selectedIndexes) == 1 and len(self.mMultiEditPreviousSelectedIndexes) <= 1:
+            selectedIndex = selectedIndexes[0]
+            if selectedIndex.data(self.MultiEditTreeWidgetRole.FeatureType) == self.MultiEditFeatureType.Child:
+                featureIdSelectedItem = selectedIndex.data(self.MultiEditTreeWidgetRole.FeatureId)
 
                 if featureIdSelectedItem in self.mMultiEdit1NJustAddedIds:
-                    self.mMultiEditTreeWidget.blockSignals(True)
-                    for indexTopLevelItem in range(self.mMultiEditTreeWidget.topLevelItemCount()):
-                        treeWidgetTopLevelItem = self.mMultiEditTreeWidget.topLevelItem(indexTopLevelItem)
-    
-                        for indexItem in range(treeWidgetTopLevelItem.childCount()):
-                            treeWidgetItem = treeWidgetTopLevelItem.child(indexItem)
-    
-                            if (
-                                treeWidgetItem.data(0, self.MultiEditTreeWidgetRole.FeatureType)
-                                != self.MultiEditFeatureType.Child
-                            ):
-                                QgsLogger.warning(self.tr("Not a child item"))
-                                continue
-    
-                            featureIdCurrentItem = treeWidgetItem.data(0, self.MultiEditTreeWidgetRole.FeatureId)
-                            if self.nmRelation().isValid():
-                                if featureIdSelectedItem == featureIdCurrentItem:
-                                    treeWidgetItem.setSelected(True)
-                            else:
-                                if featureIdSelectedItem not in self.mMultiEdit1NJustAddedIds:
-                                    break
-        
-                                if featureIdCurrentItem in self.mMultiEdit1NJustAddedIds:
-                                    treeWidgetItem.setSelected(True)
-    
-                    self.mMultiEditTreeWidget.blockSignals(False)
-
-        self.mMultiEditPreviousSelectedItems = selectedItems
+                    if self.nmRelation().isValid():
+                        self._selectMultiEditChildFeatures([featureIdSelectedItem])
+                    else:
+                        self._selectMultiEditChildFeatures(self.mMultiEdit1NJustAddedIds)
+
+        self.mMultiEditPreviousSelectedIndexes = selectedIndexes
         self.updateButtons()
 
+    def _selectMultiEditChildFeatures(self, featureIds):
+        """
+        Adds the child items of the feature ids to the multiedit selection
+        """
+        selection = QItemSelection()
+        for index in self.mMultiEditModel.childIndexes(featureIds):
+            selection.select(index, index)
+
+        self._multiEditSelectionUpdating = True
+        self.mMultiEditTreeView.selectionModel().select(selection, QItemSelectionModel.SelectionFlag.Select)
+        self._multiEditSelectionUpdating = False
+
     def selectedChildFeatureIds(self):
         if self._multiEditModeActive():
             featureIds = set()
-            for treeWidgetItem in self.mMultiEditTreeWidget.selectedItems():
-                if treeWidgetItem.data(0, self.MultiEditTreeWidgetRole.FeatureType) != self.MultiEditFeatureType.Child:
+            for index in self.mMultiEditTreeView.selectionModel().selectedIndexes():
+                if index.data(self.MultiEditTreeWidgetRole.FeatureType) != self.MultiEditFeatureType.Child:
                     continue
 
-                featureIds.add(treeWidgetItem.data(0, self.MultiEditTreeWidgetRole.FeatureId))
+                featureIds.add(index.data(self.MultiEditTreeWidgetRole.FeatureId))
             return featureIds
         else:
             return self.mFeatureSelectionMgr.selectedFeatureIds()
@@ -761,7 +730,7 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
         qAction.triggered.connect(lambda state, fid=fid: self.unlinkFeature(fid))
 
     def unlinkSelectedFeatures(self):
-        self.unlinkFeatures(list(self.selectedChildFeatureIds()))
+        self._unlinkFeatures(list(self.selectedChildFeatureIds()))
 
     def zoomToSelectedFeatures(self):
         if self.editorContext().mapCanvas():
@@ -772,6 +741,8 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
             self.editorContext().mapCanvas().zoomToFeatureIds(layer, self.mFeatureSelectionMgr.selectedFeatureIds())
 
     def afterSetRelations(self):
+        self._layerConnections.disconnectAll()
+
         self._nmRelation = QgsProject.instance().relationManager().relation(str(self.nmRelationId()))
 
         if not self.relation().isValid():
@@ -781,12 +752,18 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
 
         self._checkTransactionGroup()
 
-        self.relation().referencingLayer().editingStopped.connect(self.updateButtons)
-        self.relation().referencingLayer().editingStarted.connect(self.updateButtons)
+        referencingLayer = self.relation().referencingLayer()
+        self._layerConnections.connect(referencingLayer, referencingLayer.editingStopped, self.updateButtons)
+        self._layerConnections.connect(referencingLayer, referencingLayer.editingStarted, self.updateButtons)
 
         if self.nmRelation().isValid():
-            self.nmRelation().referencedLayer().editingStarted.connect(self.updateButtons)
-            self.nmRelation().referencedLayer().editingStopped.connect(self.updateButtons)
+            nmReferencedLayer = self.nmRelation().referencedLayer()
+            self._layerConnections.connect(nmReferencedLayer, nmReferencedLayer.editingStarted, self.updateButtons)
+            self._layerConnections.connect(nmReferencedLayer, nmReferencedLayer.editingStopped, self.updateButtons)
+
+            # The n:m linked features are requested by ids, which change with the keys and on commit
+            for index in RelationKeyIndex.relationIndexes(self.relation(), self.nmRelation()):
+                self._layerConnections.connect(index.layer(), index.keysChanged, self.updateUi)
 
         self.updateButtons()
 
@@ -832,7 +809,7 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
         relationEditorLinkChildManagerDialog = self.sender()
 
         # Unlink features
-        self.unlinkFeatures(relationEditorLinkChildManagerDialog.get_feature_ids_to_unlink())
+        self._unlinkFeatures(relationEditorLinkChildManagerDialog.get_feature_ids_to_unlink())
 
         # If "show and edit join table attributes" is activated, the link is done in the linking child manager dialog
         if self.mLinkingChildManagerDialogConfig.get(CONFIG_SHOW_AND_EDIT_JOIN_TABLE_ATTRIBUTES, False):
@@ -878,11 +855,3 @@ class LinkingRelationEditorWidget(QgsAbstractRelationEditorWidget, WidgetUi):
         self.window().raise_()
         self.window().activateWindow()
         self.unsetMapTool()
-
-    def createMultiEditTreeWidgetItem(self, feature: QgsFeature, layer: QgsVectorLayer, type: MultiEditFeatureType):
-        treeWidgetItem = QTreeWidgetItem()
-        treeWidgetItem.setText(0, QgsVectorLayerUtils.getFeatureDisplayString(layer, feature))
-        treeWidgetItem.setIcon(0, QgsIconUtils.iconForLayer(layer))
-        treeWidgetItem.setData(0, self.MultiEditTreeWidgetRole.FeatureType, type)
-        treeWidgetItem.setData(0, self.MultiEditTreeWidgetRole.FeatureId, feature.id())
-        return treeWidgetItem
@@ -3,6 +3,8 @@ from qgis.gui import QgsMapCanvas, QgsMapToolEmitPoint, QgsRubberBand
 from qgis.PyQt.QtCore import Qt, pyqtSignal
 from qgis.PyQt.QtGui import QColor
 
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+
 
 class MapToolSelectRectangle(QgsMapToolEmitPoint):
 
@@ -46,9 +48,12 @@ class MapToolSelectRectangle(QgsMapToolEmitPoint):
             self.signal_selection_finished.emit(list())
             return
 
+        # Selected features are highlighted and listed by their display string
+        request = FeatureRequestBuilder.displayStringRequest(self._layer, needsGeometry=True)
+
         if isinstance(geometry, QgsRectangle):
             features = list()
-            for feature in self._layer.getFeatures(geometry):
+            for feature in self._layer.getFeatures(request.setFilterRect(geometry)):
                 features.append(feature)
 
             self.signal_selection_finished.emit(features)
@@ -64,7 +69,7 @@ class MapToolSelectRectangle(QgsMapToolEmitPoint):
                 geometry.y() + search_radius,
             )
 
-            for feature in self._layer.getFeatures(search_rectangle):
+            for feature in self._layer.getFeatures(request.setFilterRect(search_rectangle)):
                 self.signal_selection_finished.emit([feature])
                 return
 
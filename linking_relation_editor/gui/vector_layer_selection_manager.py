@@ -10,6 +10,8 @@
 
 from qgis.gui import QgsIFeatureSelectionManager
 
+from linking_relation_editor.core.signal_connections import SignalConnections
+
 
 class VectorLayerSelectionManager(QgsIFeatureSelectionManager):
     def __init__(self, layer, parent):
@@ -17,7 +19,15 @@ class VectorLayerSelectionManager(QgsIFeatureSelectionManager):
 
         self.mLayer = layer
 
-        self.mLayer.selectionChanged.connect(self.onSelectionChanged)
+        self.mConnections = SignalConnections()
+        self.mConnections.connect(self.mLayer, self.mLayer.selectionChanged, self.onSelectionChanged)
+        self.destroyed.connect(self.mConnections.disconnectAll)
+
+    def release(self):
+        """
+        Disconnects from the layer, the manager is not used anymore
+        """
+        self.mConnections.disconnectAll()
 
     def selectedFeatureCount(self):
         return self.mLayer.selectedFeatureCount()
@@ -0,0 +1,368 @@
+import os
+import tempfile
+import time
+
+from qgis.core import (
+    QgsCoordinateTransformContext,
+    QgsFeature,
+    QgsLogger,
+    QgsProject,
+    QgsRelation,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+)
+from qgis.PyQt.QtCore import QCoreApplication, QModelIndex, Qt
+from qgis.PyQt.QtGui import QIcon
+from qgis.PyQt.QtWidgets import QListView
+from qgis.testing import start_app, unittest
+
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+from linking_relation_editor.core.model.features_model import FeaturesModel
+from linking_relation_editor.core.model.features_model_filter import FeaturesModelFilter
+from linking_relation_editor.core.model.multi_edit_model import MultiEditModel
+from linking_relation_editor.core.relation_key_index import RelationKeyIndex
+from linking_relation_editor.core.relation_utils import RelationUtils
+
+start_app()
+
+# Benchmarks are slow, they only run when this environment variable is set
+BENCHMARKS_ENVIRONMENT_VARIABLE = "LINKING_RELATION_EDITOR_BENCHMARKS"
+
+
+def bestTime(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    return min(times), result
+
+
+def writeGeoPackageLayer(memoryLayer: QgsVectorLayer, path: str, layerName: str) -> QgsVectorLayer:
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = "GPKG"
+    options.layerName = layerName
+    if os.path.exists(path):
+        options.actionOnExistingFile = QgsVectorFileWriter.ActionOnExistingFile.CreateOrOverwriteLayer
+
+    error = QgsVectorFileWriter.writeAsVectorFormatV3(memoryLayer, path, QgsCoordinateTransformContext(), options)
+    assert error[0] == QgsVectorFileWriter.WriterError.NoError, error
+
+    layer = QgsVectorLayer("{0}|layername={1}".format(path, layerName), layerName, "ogr")
+    assert layer.isValid()
+    return layer
+
+
+class ListBasedFeaturesModelFilter(FeaturesModelFilter):
+    """
+    Reproduces the former per row lookups in lists and in a copy of the layer selection
+    """
+
+    def filterAcceptsRow(self, sourceRow: int, sourceParent: QModelIndex()):
+        index = self.sourceModel().index(sourceRow, 0, sourceParent)
+        rowFeatureId = self.sourceModel().data(index, FeaturesModel.UserRole.FeatureId)
+
+        if self._feature_filter == FeaturesModelFilter.FeatureFilter.ShowSelected:
+            if rowFeatureId not in self._layer.selectedFeatureIds():
+                return False
+
+        if self._map_filter:
+            if rowFeatureId not in list(self._map_filter):
+                return False
+
+        return True
+
+
+class UncachedIconsFeaturesModel(FeaturesModel):
+    """
+    Reproduces the former icons loaded from the SVG files on every paint
+    """
+
+    def data(self, index: QModelIndex, role: int = ...):
+        if role == Qt.ItemDataRole.DecorationRole and index.isValid():
+            iconFile = FeaturesModel.STATE_ICON_FILES[self._modelFeatures[index.row()].feature_state()]
+            return QIcon(os.path.join(os.path.dirname(__file__), "../images", iconFile))
+
+        return super().data(index, role)
+
+
+class PerParentMultiEditModel(MultiEditModel):
+    """
+    Reproduces the former related features request per parent and referenced feature request per join feature
+    """
+
+    def _fetchChildFeatureIds(self):
+        referencingLayer = self._relation.referencingLayer()
+        for parentItem in self._parentItems:
+            request = self._relation.getRelatedFeaturesRequest(parentItem.feature)
+            for joinFeature in referencingLayer.getFeatures(request):
+                childRequest = self._nmRelation.getReferencedFeatureRequest(joinFeature)
+                parentItem.childFeatureIds.extend(
+                    childFeature.id() for childFeature in self._nmRelation.referencedLayer().getFeatures(childRequest)
+                )
+
+
+@unittest.skipUnless(os.environ.get(BENCHMARKS_ENVIRONMENT_VARIABLE), "Benchmarks only run on demand")
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.mTemporaryDirectory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        QgsProject.instance().removeAllMapLayers()
+        self.mTemporaryDirectory.cleanup()
+
+    def _createNmLayers(self, linkCount: int):
+        path = os.path.join(self.mTemporaryDirectory.name, "benchmark_{}.gpkg".format(linkCount))
+
+        documents = QgsVectorLayer("None?field=pk:int&field=name:string", "documents", "memory")
+        features = []
+        for pk in range(linkCount * 2):
+            feature = QgsFeature(documents.fields())
+            feature.setAttributes([pk, "Document {}".format(pk)])
+            features.append(feature)
+        documents.dataProvider().addFeatures(features)
+
+        join = QgsVectorLayer("None?field=fk_parent:int&field=fk_document:int", "join", "memory")
+        features = []
+        for pk in range(linkCount):
+            feature = QgsFeature(join.fields())
+            feature.setAttributes([1, pk * 2])
+            features.append(feature)
+        join.dataProvider().addFeatures(features)
+
+        documents = writeGeoPackageLayer(documents, path, "documents")
+        join = writeGeoPackageLayer(join, path, "join")
+        QgsProject.instance().addMapLayers([documents, join], False)
+
+        relation = QgsRelation()
+        relation.setId("join.documents")
+        relation.setName("join.documents")
+        relation.setReferencingLayer(join.id())
+        relation.setReferencedLayer(documents.id())
+        relation.addFieldPair("fk_document", "pk")
+
+        return documents, join, relation
+
+    def test_referencedFeaturesLookup(self):
+        for linkCount in (10, 1000, 50000):
+            documents, join, relation = self._createNmLayers(linkCount)
+
+            joinFeatures = list(join.getFeatures())
+
+            def orChainedExpression():
+                filters = []
+                for joinFeature in joinFeatures:
+                    referencedFeatureRequest = relation.getReferencedFeatureRequest(joinFeature)
+                    filters.append("(" + referencedFeatureRequest.filterExpression().expression() + ")")
+
+                request = FeatureRequestBuilder.featureIdsRequest()
+                request.setFilterExpression(" OR ".join(filters))
+                return {feature.id() for feature in documents.getFeatures(request)}
+
+            def batchedKeyLookup():
+                keys = RelationUtils.referencingKeys(relation, joinFeatures)
+                request = FeatureRequestBuilder.featureIdsRequest()
+                featureIds = set()
+                for chunkRequest in RelationUtils.referencedFeaturesRequests(relation, keys, request):
+                    featureIds |= {feature.id() for feature in documents.getFeatures(chunkRequest)}
+                return featureIds
+
+            orTime, orFeatureIds = bestTime(orChainedExpression)
+            keyLookupTime, keyLookupFeatureIds = bestTime(batchedKeyLookup)
+
+            QgsLogger.debug(
+                "Referenced features lookup with {0} links: OR chained expression {1:.3f}s, "
+                "batched key lookup {2:.3f}s".format(linkCount, orTime, keyLookupTime)
+            )
+
+            self.assertEqual(orFeatureIds, keyLookupFeatureIds)
+            self.assertEqual(len(keyLookupFeatureIds), linkCount)
+
+    def test_featuresModelFilter(self):
+        featureCount = 100000
+        matchCount = 1000
+
+        layer = QgsVectorLayer("None?field=pk:int", "features", "memory")
+        features = []
+        for pk in range(featureCount):
+            feature = QgsFeature(layer.fields())
+            feature.setAttributes([pk])
+            features.append(feature)
+        layer.dataProvider().addFeatures(features)
+        QgsProject.instance().addMapLayer(layer, False)
+
+        model = FeaturesModel([], FeaturesModel.FeatureState.Unlinked, layer, False)
+        model.set_feature_request(
+            FeatureRequestBuilder.displayStringRequest(layer), FeaturesModel.FeatureState.Unlinked
+        )
+        model.fetch_all()
+
+        featureIds = [item.feature_id() for item in model.featureItems()]
+        layer.selectByIds(featureIds[: matchCount * 2])
+        mapFilter = featureIds[: matchCount * 4 : 2]
+
+        def filterRows(filterClass):
+            featuresModelFilter = filterClass(layer, None)
+            featuresModelFilter.setSourceModel(model)
+
+            def invalidate():
+                featuresModelFilter.set_feature_filter(FeaturesModelFilter.FeatureFilter.ShowSelected)
+                featuresModelFilter.set_map_filter(mapFilter)
+                return featuresModelFilter.rowCount()
+
+            return invalidate
+
+        listTime, listRowCount = bestTime(filterRows(ListBasedFeaturesModelFilter), repeat=1)
+        setTime, setRowCount = bestTime(filterRows(FeaturesModelFilter))
+
+        QgsLogger.debug(
+            "Filtering {0} rows on {1} selected and {2} map features: lists {3:.3f}s, sets {4:.3f}s".format(
+                featureCount, len(layer.selectedFeatureIds()), len(mapFilter), listTime, setTime
+            )
+        )
+
+        self.assertEqual(setRowCount, listRowCount)
+        self.assertEqual(setRowCount, matchCount)
+
+    def test_listViewPaint(self):
+        featureCount = 50000
+
+        layer = QgsVectorLayer("None?field=pk:int", "features", "memory")
+        layer.setDisplayExpression("'Feature ' || pk")
+        features = []
+        for pk in range(featureCount):
+            feature = QgsFeature(layer.fields())
+            feature.setAttributes([pk])
+            features.append(feature)
+        layer.dataProvider().addFeatures(features)
+        QgsProject.instance().addMapLayer(layer, False)
+
+        models = dict()
+
+        def scrollList(modelClass):
+            model = modelClass([], FeaturesModel.FeatureState.Unlinked, layer, False)
+            model.set_feature_request(
+                FeatureRequestBuilder.displayStringRequest(layer), FeaturesModel.FeatureState.Unlinked
+            )
+            model.fetch_all()
+            models[modelClass] = model
+
+            view = QListView()
+            view.resize(300, 800)
+            view.setModel(model)
+            view.show()
+            QCoreApplication.processEvents()
+
+            def paint():
+                for row in range(0, featureCount, 200):
+                    view.scrollTo(model.index(row, 0, QModelIndex()), QListView.ScrollHint.PositionAtTop)
+                    view.viewport().grab()
+
+            return paint
+
+        uncachedTime, _ = bestTime(scrollList(UncachedIconsFeaturesModel))
+        cachedTime, _ = bestTime(scrollList(FeaturesModel))
+
+        QgsLogger.debug(
+            "Scrolling through {0} rows: SVG icons {1:.3f}s, cached icons {2:.3f}s".format(
+                featureCount, uncachedTime, cachedTime
+            )
+        )
+
+        # Rows in the same state share the cached icon instead of loading it again
+        model = models[FeaturesModel]
+        self.assertEqual(model.rowCount(), featureCount)
+        firstIcon = model.data(model.index(0, 0, QModelIndex()), Qt.ItemDataRole.DecorationRole)
+        lastIcon = model.data(model.index(featureCount - 1, 0, QModelIndex()), Qt.ItemDataRole.DecorationRole)
+        self.assertEqual(firstIcon.cacheKey(), lastIcon.cacheKey())
+
+        self.assertLess(cachedTime, uncachedTime)
+
+    def test_multiEditChildren(self):
+        parcelCount = 500
+        ownerCount = 20000
+        path = os.path.join(self.mTemporaryDirectory.name, "multiedit.gpkg")
+
+        parcels = QgsVectorLayer("None?field=pk:int", "parcels", "memory")
+        features = []
+        for pk in range(parcelCount):
+            feature = QgsFeature(parcels.fields())
+            feature.setAttributes([pk])
+            features.append(feature)
+        parcels.dataProvider().addFeatures(features)
+
+        owners = QgsVectorLayer("None?field=pk:int&field=name:string", "owners", "memory")
+        features = []
+        for pk in range(ownerCount):
+            feature = QgsFeature(owners.fields())
+            feature.setAttributes([pk, "Owner {}".format(pk)])
+            features.append(feature)
+        owners.dataProvider().addFeatures(features)
+
+        # Two owners per parcel, one of them shared by all the parcels
+        join = QgsVectorLayer("None?field=fk_parcel:int&field=fk_owner:int", "join", "memory")
+        features = []
+        for pk in range(parcelCount):
+            for ownerPk in (0, pk + 1):
+                feature = QgsFeature(join.fields())
+                feature.setAttributes([pk, ownerPk])
+                features.append(feature)
+        join.dataProvider().addFeatures(features)
+
+        parcels = writeGeoPackageLayer(parcels, path, "parcels")
+        owners = writeGeoPackageLayer(owners, path, "owners")
+        join = writeGeoPackageLayer(join, path, "join")
+        QgsProject.instance().addMapLayers([parcels, owners, join], False)
+
+        relation = QgsRelation()
+        relation.setId("join.parcels")
+        relation.setName("join.parcels")
+        relation.setReferencingLayer(join.id())
+        relation.setReferencedLayer(parcels.id())
+        relation.addFieldPair("fk_parcel", "pk")
+
+        nmRelation = QgsRelation()
+        nmRelation.setId("join.owners")
+        nmRelation.setName("join.owners")
+        nmRelation.setReferencingLayer(join.id())
+        nmRelation.setReferencedLayer(owners.id())
+        nmRelation.addFieldPair("fk_owner", "pk")
+
+        parcelFeatures = list(parcels.getFeatures())
+
+        def setFeatures(modelClass):
+            def run():
+                model = modelClass()
+                model.setFeatures(relation, nmRelation, parcelFeatures)
+                return {parentId: sorted(childIds) for parentId, childIds in model.childFeatureIdsByParent().items()}
+
+            return run
+
+        relationIndexes = RelationKeyIndex.relationIndexes(relation, nmRelation)
+
+        perParentTime, perParentChildren = bestTime(setFeatures(PerParentMultiEditModel), repeat=1)
+
+        # Cold cache: the key indexes are not built, a single run with the bulk requests
+        for index in relationIndexes:
+            index.invalidate()
+        self.assertFalse(any(index.isBuilt() for index in relationIndexes))
+        bulkTime, bulkChildren = bestTime(setFeatures(MultiEditModel), repeat=1)
+
+        # Warm cache: lookups in the key indexes built in the background meanwhile
+        timeout = time.time() + 60
+        while not all(index.isBuilt() for index in relationIndexes) and time.time() < timeout:
+            QCoreApplication.processEvents()
+        self.assertTrue(RelationKeyIndex.relationIndexesBuilt(relation, nmRelation))
+        indexTime, indexChildren = bestTime(setFeatures(MultiEditModel))
+
+        QgsLogger.debug(
+            "Multiedit children of {0} parents: per parent requests {1:.3f}s, "
+            "bulk requests (cold) {2:.3f}s, key index lookups (warm) {3:.3f}s".format(
+                parcelCount, perParentTime, bulkTime, indexTime
+            )
+        )
+
+        self.assertEqual(bulkChildren, perParentChildren)
+        self.assertEqual(indexChildren, perParentChildren)
+        self.assertLess(bulkTime, 1.0)
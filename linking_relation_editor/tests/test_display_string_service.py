@@ -0,0 +1,88 @@
+from qgis.core import QgsFeature, QgsProject, QgsVectorLayer, QgsVectorLayerUtils
+from qgis.testing import start_app, unittest
+
+from linking_relation_editor.core.display_string_service import DisplayStringService
+
+start_app()
+
+
+class TestDisplayStringService(unittest.TestCase):
+    def setUp(self):
+        self.mLayer = QgsVectorLayer("None?field=pk:int&field=name:string&field=value:double", "vl", "memory")
+        self.mLayer.setDisplayExpression("name || ' (' || pk || ')'")
+        QgsProject.instance().addMapLayer(self.mLayer, False)
+
+        features = []
+        for pk in range(3):
+            feature = QgsFeature(self.mLayer.fields())
+            feature.setAttributes([pk, "Name {}".format(pk), pk * 1.5])
+            features.append(feature)
+        self.mLayer.dataProvider().addFeatures(features)
+
+    def tearDown(self):
+        QgsProject.instance().removeMapLayer(self.mLayer)
+
+    def test_instance(self):
+        service = DisplayStringService.instance(self.mLayer)
+        self.assertIs(DisplayStringService.instance(self.mLayer), service)
+
+        otherLayer = QgsVectorLayer("None?field=pk:int", "other", "memory")
+        self.assertIsNot(DisplayStringService.instance(otherLayer), service)
+
+    def test_displayStrings(self):
+        service = DisplayStringService.instance(self.mLayer)
+
+        displayStrings = service.displayStrings(self.mLayer.getFeatures())
+        self.assertEqual(sorted(displayStrings.values()), ["Name 0 (0)", "Name 1 (1)", "Name 2 (2)"])
+
+        # Same strings as the QGIS implementation
+        for feature in self.mLayer.getFeatures():
+            self.assertEqual(
+                service.displayString(feature), QgsVectorLayerUtils.getFeatureDisplayString(self.mLayer, feature)
+            )
+
+        self.mLayer.setDisplayExpression("value")
+        for feature in self.mLayer.getFeatures():
+            self.assertEqual(
+                service.displayString(feature), QgsVectorLayerUtils.getFeatureDisplayString(self.mLayer, feature)
+            )
+
+        # Fallback on the feature id
+        self.mLayer.setDisplayExpression("NULL")
+        feature = next(self.mLayer.getFeatures())
+        self.assertEqual(service.displayString(feature), str(feature.id()))
+
+    def test_invalidation(self):
+        service = DisplayStringService.instance(self.mLayer)
+
+        feature = next(self.mLayer.getFeatures())
+        self.assertEqual(service.displayString(feature), "Name 0 (0)")
+
+        # Edits invalidate the cached string
+        self.assertTrue(self.mLayer.startEditing())
+        self.assertTrue(self.mLayer.changeAttributeValue(feature.id(), self.mLayer.fields().indexOf("name"), "Changed"))
+        self.assertEqual(service.displayString(self.mLayer.getFeature(feature.id())), "Changed (0)")
+
+        self.mLayer.rollBack()
+        self.assertEqual(service.displayString(self.mLayer.getFeature(feature.id())), "Name 0 (0)")
+
+        # The cache is bypassed for features not matching the layer
+        feature.setAttribute("name", "Not saved")
+        self.assertEqual(service.displayString(feature, useCache=False), "Not saved (0)")
+        self.assertEqual(service.displayString(self.mLayer.getFeature(feature.id())), "Name 0 (0)")
+
+    def test_cacheSize(self):
+        service = DisplayStringService.instance(self.mLayer)
+        features = list(self.mLayer.getFeatures())
+
+        cacheSize = DisplayStringService.DISPLAY_STRING_CACHE_SIZE
+        DisplayStringService.DISPLAY_STRING_CACHE_SIZE = 2
+        try:
+            for feature in features:
+                service.displayString(feature)
+        finally:
+            DisplayStringService.DISPLAY_STRING_CACHE_SIZE = cacheSize
+
+        # The least recently used display strings are dropped
+        self.assertEqual(list(service._displayStrings.keys()), [features[1].id(), features[2].id()])
+        self.assertEqual(service.displayString(features[0]), "Name 0 (0)")
@@ -0,0 +1,65 @@
+from qgis.core import QgsFeatureRequest, QgsVectorLayer
+from qgis.testing import start_app, unittest
+
+from linking_relation_editor.core.feature_request_builder import FeatureRequestBuilder
+
+start_app()
+
+
+class TestFeatureRequestBuilder(unittest.TestCase):
+    def setUp(self):
+        self.mLayer = QgsVectorLayer(
+            "LineString?field=pk:int&field=name:string&field=description:string&field=notes:string", "vl", "memory"
+        )
+
+    def test_displayStringRequest(self):
+        self.mLayer.setDisplayExpression("'Layer-' || pk || ': ' || name")
+
+        request = FeatureRequestBuilder.displayStringRequest(self.mLayer)
+        self.assertTrue(request.flags() & QgsFeatureRequest.Flag.NoGeometry)
+        self.assertTrue(request.flags() & QgsFeatureRequest.Flag.SubsetOfAttributes)
+        self.assertEqual(
+            set(request.subsetOfAttributes()),
+            {self.mLayer.fields().indexOf("pk"), self.mLayer.fields().indexOf("name")},
+        )
+
+        request = FeatureRequestBuilder.displayStringRequest(self.mLayer, extraAttributes=["notes"])
+        self.assertEqual(
+            set(request.subsetOfAttributes()),
+            {
+                self.mLayer.fields().indexOf("pk"),
+                self.mLayer.fields().indexOf("name"),
+                self.mLayer.fields().indexOf("notes"),
+            },
+        )
+
+    def test_displayStringRequestGeometry(self):
+        self.mLayer.setDisplayExpression("name || ' ' || length($geometry)")
+
+        request = FeatureRequestBuilder.displayStringRequest(self.mLayer)
+        self.assertFalse(request.flags() & QgsFeatureRequest.Flag.NoGeometry)
+
+    def test_mapTipRequest(self):
+        self.mLayer.setMapTipTemplate('<b>[% "name" %]</b><p>[% upper(description) %]</p>')
+
+        request = FeatureRequestBuilder.mapTipRequest(self.mLayer)
+        self.assertTrue(request.flags() & QgsFeatureRequest.Flag.NoGeometry)
+        self.assertEqual(
+            set(request.subsetOfAttributes()),
+            {self.mLayer.fields().indexOf("name"), self.mLayer.fields().indexOf("description")},
+        )
+
+    def test_filterExpressionRequest(self):
+        request = FeatureRequestBuilder.filterExpressionRequest(self.mLayer, "notes LIKE '%a%'")
+        self.assertTrue(request.flags() & QgsFeatureRequest.Flag.NoGeometry)
+        self.assertEqual(set(request.subsetOfAttributes()), {self.mLayer.fields().indexOf("notes")})
+
+        # Unparsable expressions fetch everything
+        request = FeatureRequestBuilder.filterExpressionRequest(self.mLayer, "notes LIKE")
+        self.assertFalse(request.flags() & QgsFeatureRequest.Flag.NoGeometry)
+        self.assertFalse(request.flags() & QgsFeatureRequest.Flag.SubsetOfAttributes)
+
+    def test_featureIdsRequest(self):
+        request = FeatureRequestBuilder.featureIdsRequest()
+        self.assertTrue(request.flags() & QgsFeatureRequest.Flag.NoGeometry)
+        self.assertEqual(request.subsetOfAttributes(), [])
@@ -0,0 +1,285 @@
+from unittest import mock
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsProject,
+    QgsRelation,
+    QgsVectorLayer,
+)
+from qgis.PyQt.QtCore import QModelIndex, QSize, Qt
+from qgis.testing import start_app, unittest
+
+from linking_relation_editor.core.model.features_model import FeaturesModel
+
+start_app()
+
+
+class TestFeaturesModel(unittest.TestCase):
+    def setUp(self):
+        self.mLayer = QgsVectorLayer("None?field=pk:int&field=name:string", "vl", "memory")
+        self.mLayer.setDisplayExpression("'Feature-' || pk")
+        QgsProject.instance().addMapLayer(self.mLayer, False)
+
+        features = []
+        for pk in range(6):
+            feature = QgsFeature(self.mLayer.fields())
+            feature.setAttributes([pk, "Name {}".format(pk)])
+            features.append(feature)
+        self.mLayer.dataProvider().addFeatures(features)
+
+    def tearDown(self):
+        QgsProject.instance().removeMapLayer(self.mLayer)
+
+    def _createModel(self, features=None):
+        return FeaturesModel(
+            list(self.mLayer.getFeatures()) if features is None else features,
+            FeaturesModel.FeatureState.Unlinked,
+            self.mLayer,
+            False,
+            QgsFeature(),
+            QgsRelation(),
+            QgsRelation(),
+        )
+
+    def _displayStrings(self, model):
+        return [
+            model.data(model.index(row, 0, QModelIndex()), Qt.ItemDataRole.DisplayRole)
+            for row in range(model.rowCount())
+        ]
+
+    def test_takeItemsCoalescesRanges(self):
+        model = self._createModel()
+
+        removedRanges = []
+        model.rowsRemoved.connect(lambda parent, first, last: removedRanges.append((first, last)))
+
+        indexes = [model.index(row, 0, QModelIndex()) for row in [4, 0, 1, 2]]
+        items = model.take_items(indexes)
+
+        self.assertEqual(
+            [item.display_string() for item in items], ["Feature-0", "Feature-1", "Feature-2", "Feature-4"]
+        )
+        self.assertEqual(removedRanges, [(4, 4), (0, 2)])
+        self.assertEqual(self._displayStrings(model), ["Feature-3", "Feature-5"])
+
+        insertedRanges = []
+        model.rowsInserted.connect(lambda parent, first, last: insertedRanges.append((first, last)))
+        model.add_features_model_items(items)
+        self.assertEqual(insertedRanges, [(2, 5)])
+        self.assertEqual(model.rowCount(), 6)
+
+        takenItems = model.take_all_items()
+        self.assertEqual(len(takenItems), 6)
+        self.assertEqual(model.rowCount(), 0)
+        self.assertEqual(removedRanges[-1], (0, 5))
+
+    def test_applyDiff(self):
+        model = self._createModel()
+
+        featureIds = [item.feature_id() for item in model.featureItems()]
+
+        changedFeature = self.mLayer.getFeature(featureIds[3])
+        changedFeature.setAttribute("pk", 33)
+
+        newFeature = QgsFeature(self.mLayer.fields())
+        newFeature.setAttributes([6, "Name 6"])
+        self.mLayer.dataProvider().addFeatures([newFeature])
+        newFeature = [feature for feature in self.mLayer.getFeatures() if feature.attribute("pk") == 6][0]
+
+        model.apply_diff([newFeature], [featureIds[0], featureIds[1]], [changedFeature])
+
+        self.assertEqual(
+            self._displayStrings(model), ["Feature-2", "Feature-33", "Feature-4", "Feature-5", "Feature-6"]
+        )
+
+    def test_containsAfterRemovalAndAppend(self):
+        model = self._createModel()
+
+        featureIds = [item.feature_id() for item in model.featureItems()]
+
+        # Items appended right after a removal, without any row lookup in between
+        items = model.take_items([model.index(1, 0, QModelIndex()), model.index(2, 0, QModelIndex())])
+        model.add_features_model_items(items)
+
+        self.assertTrue(model.contains(featureIds[1]))
+        self.assertTrue(model.contains(featureIds[2]))
+        self.assertEqual(model.contains_many(featureIds), set(featureIds))
+
+        # Features already listed are not added twice
+        model.take_items([model.index(0, 0, QModelIndex())])
+        model.apply_diff([self.mLayer.getFeature(featureIds[2])])
+        self.assertEqual(model.rowCount(), 5)
+        self.assertEqual(model.get_feature_index(featureIds[2]).row(), 4)
+
+    def test_layerChanges(self):
+        model = self._createModel([])
+        model.set_feature_request(QgsFeatureRequest(), FeaturesModel.FeatureState.Unlinked)
+        self.assertEqual(model.rowCount(), 6)
+
+        self.assertTrue(self.mLayer.startEditing())
+
+        newFeature = QgsFeature(self.mLayer.fields())
+        newFeature.setAttributes([6, "Name 6"])
+        self.assertTrue(self.mLayer.addFeature(newFeature))
+
+        featureIds = [item.feature_id() for item in model.featureItems()]
+        self.assertTrue(self.mLayer.deleteFeature(featureIds[0]))
+        self.assertTrue(self.mLayer.changeAttributeValue(featureIds[1], self.mLayer.fields().indexOf("pk"), 11))
+
+        model._apply_pending_layer_changes()
+
+        self.assertEqual(
+            self._displayStrings(model), ["Feature-11", "Feature-2", "Feature-3", "Feature-4", "Feature-5", "Feature-6"]
+        )
+
+        self.mLayer.rollBack()
+
+    def test_layerChangesKeepJoinKeys(self):
+        # The nm key of the children is not used by the display expression
+        parentLayer = QgsVectorLayer("None?field=pk:int", "parent", "memory")
+        joinLayer = QgsVectorLayer("None?field=fk_parent:int&field=fk_child:string", "join", "memory")
+        QgsProject.instance().addMapLayers([parentLayer, joinLayer], False)
+
+        relation = QgsRelation()
+        relation.setId("join.parent")
+        relation.setReferencingLayer(joinLayer.id())
+        relation.setReferencedLayer(parentLayer.id())
+        relation.addFieldPair("fk_parent", "pk")
+
+        nmRelation = QgsRelation()
+        nmRelation.setId("join.vl")
+        nmRelation.setReferencingLayer(joinLayer.id())
+        nmRelation.setReferencedLayer(self.mLayer.id())
+        nmRelation.addFieldPair("fk_child", "name")
+
+        parentFeature = QgsFeature(parentLayer.fields())
+        parentFeature.setAttributes([1])
+
+        model = FeaturesModel(
+            list(self.mLayer.getFeatures()),
+            FeaturesModel.FeatureState.Unlinked,
+            self.mLayer,
+            True,
+            parentFeature,
+            relation,
+            nmRelation,
+        )
+
+        self.assertTrue(self.mLayer.startEditing())
+        featureItem = model.featureItems()[0]
+        self.assertTrue(
+            self.mLayer.changeAttributeValue(featureItem.feature_id(), self.mLayer.fields().indexOf("pk"), 10)
+        )
+        model._apply_pending_layer_changes()
+        self.assertEqual(featureItem.display_string(), "Feature-10")
+
+        featureItem.set_feature_state(FeaturesModel.FeatureState.ToBeLinked)
+        joinFeature = featureItem.childItem().feature()
+        self.assertEqual(joinFeature.attribute("fk_parent"), 1)
+        self.assertEqual(joinFeature.attribute("fk_child"), "Name 0")
+
+        self.mLayer.rollBack()
+        QgsProject.instance().removeMapLayers([parentLayer.id(), joinLayer.id()])
+
+    def test_linkedJoinFeaturesPrefetch(self):
+        with mock.patch.object(FeaturesModel, "_fetch_linked_join_features", return_value=dict()) as fetch:
+            # Nothing to look up before the linked features are loaded
+            model = FeaturesModel(
+                [], FeaturesModel.FeatureState.Linked, self.mLayer, True, QgsFeature(), QgsRelation(), QgsRelation()
+            )
+            fetch.assert_not_called()
+
+            model.set_features(list(self.mLayer.getFeatures()), FeaturesModel.FeatureState.Linked)
+            fetch.assert_called_once()
+
+    def test_featureIdIndex(self):
+        model = self._createModel()
+
+        featureIds = [item.feature_id() for item in model.featureItems()]
+        self.assertTrue(model.contains(featureIds[2]))
+        self.assertEqual(model.contains_many([featureIds[1], featureIds[4], -100]), {featureIds[1], featureIds[4]})
+
+        # Rows shift after removing items in the middle
+        items = model.take_items([model.index(1, 0, QModelIndex()), model.index(2, 0, QModelIndex())])
+        self.assertFalse(model.contains(featureIds[1]))
+        self.assertFalse(model.contains(featureIds[2]))
+        self.assertEqual(model.get_feature_index(featureIds[3]).row(), 1)
+        self.assertEqual([index.row() for index in model.indexes_for([featureIds[5], featureIds[0]])], [0, 3])
+
+        # Added items are appended
+        model.add_features_model_items(items)
+        self.assertEqual(model.get_feature_index(featureIds[2]).row(), 5)
+        self.assertEqual(model.contains_many(featureIds), set(featureIds))
+
+        model.removeRows(0, 2)
+        self.assertFalse(model.get_feature_index(featureIds[0]).isValid())
+        self.assertEqual(model.get_feature_index(featureIds[1]).row(), 2)
+        self.assertEqual(model.indexes_for([featureIds[0], featureIds[3]]), [])
+        self.assertEqual(
+            [model.data(index, FeaturesModel.UserRole.FeatureId) for index in model.indexes_for(featureIds)],
+            [featureIds[4], featureIds[5], featureIds[1], featureIds[2]],
+        )
+
+    def test_stateIcons(self):
+        model = self._createModel()
+
+        index = model.index(0, 0, QModelIndex())
+        icon = model.data(index, Qt.ItemDataRole.DecorationRole)
+        self.assertFalse(icon.isNull())
+
+        # The same pre-rasterised icon is shared by all the items and models in the same state
+        self.assertEqual(
+            model.data(model.index(1, 0, QModelIndex()), Qt.ItemDataRole.DecorationRole).cacheKey(), icon.cacheKey()
+        )
+        otherModel = self._createModel()
+        self.assertEqual(
+            otherModel.data(otherModel.index(0, 0, QModelIndex()), Qt.ItemDataRole.DecorationRole).cacheKey(),
+            icon.cacheKey(),
+        )
+
+        toBeLinkedIcon = FeaturesModel.state_icon(FeaturesModel.FeatureState.ToBeLinked)
+        self.assertNotEqual(toBeLinkedIcon.cacheKey(), icon.cacheKey())
+        self.assertEqual(
+            FeaturesModel.state_icon(FeaturesModel.FeatureState.ToBeLinked).cacheKey(), toBeLinkedIcon.cacheKey()
+        )
+
+        model.set_icon_size(QSize(32, 32))
+        self.assertEqual(model.data(index, Qt.ItemDataRole.DecorationRole).availableSizes(), [QSize(32, 32)])
+
+    def test_toolTipCache(self):
+        self.mLayer.setMapTipTemplate("[% name %]")
+        model = self._createModel()
+
+        index = model.index(0, 0, QModelIndex())
+        fid = model.data(index, FeaturesModel.UserRole.FeatureId)
+        self.assertEqual(model.data(index, Qt.ItemDataRole.ToolTipRole), "Name 0")
+
+        # Attribute edits invalidate the cached tool tip
+        self.assertTrue(self.mLayer.startEditing())
+        self.assertTrue(self.mLayer.changeAttributeValue(fid, self.mLayer.fields().indexOf("name"), "Changed"))
+
+        # A tool tip computed before the edit reaches the item is not served once it did
+        self.assertEqual(model.data(index, Qt.ItemDataRole.ToolTipRole), "Name 0")
+        model._apply_pending_layer_changes()
+        self.assertEqual(model.data(index, Qt.ItemDataRole.ToolTipRole), "Changed")
+
+        self.mLayer.rollBack()
+        model._apply_pending_layer_changes()
+
+        # Template changes too
+        self.mLayer.setMapTipTemplate("Tip [% pk %]")
+        model.featureItems()[0].update_feature(self.mLayer.getFeature(fid), True)
+        self.assertEqual(model.data(index, Qt.ItemDataRole.ToolTipRole), "Tip 0")
+
+        # The cache is bounded
+        cacheSize = FeaturesModel.TOOL_TIP_CACHE_SIZE
+        FeaturesModel.TOOL_TIP_CACHE_SIZE = 2
+        try:
+            for row in range(model.rowCount()):
+                model.data(model.index(row, 0, QModelIndex()), Qt.ItemDataRole.ToolTipRole)
+        finally:
+            FeaturesModel.TOOL_TIP_CACHE_SIZE = cacheSize
+
+        self.assertEqual(len(model._toolTipCache), 2)
+        self.assertEqual(model.data(model.index(5, 0, QModelIndex()), Qt.ItemDataRole.ToolTipRole), "Tip 5")
@@ -0,0 +1,215 @@
+import os
+import tempfile
+import time
+
+from qgis.core import (
+    QgsCoordinateTransformContext,
+    QgsExpression,
+    QgsExpressionContext,
+    QgsExpressionContextUtils,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsProject,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+)
+from qgis.PyQt.QtCore import QCoreApplication, QModelIndex, Qt
+from qgis.testing import start_app, unittest
+
+from linking_relation_editor.core.model.feature_filter_task import FeatureFilterTask
+from linking_relation_editor.core.model.features_model import FeaturesModel
+from linking_relation_editor.core.model.features_model_filter import FeaturesModelFilter
+
+start_app()
+
+
+class TestFeaturesModelFilter(unittest.TestCase):
+    def setUp(self):
+        self.mLayer = QgsVectorLayer("None?field=pk:int", "vl", "memory")
+        self.mLayer.setDisplayExpression("'Feature-' || pk")
+        QgsProject.instance().addMapLayer(self.mLayer, False)
+
+        features = []
+        for pk in range(6):
+            feature = QgsFeature(self.mLayer.fields())
+            feature.setAttributes([pk])
+            features.append(feature)
+        self.mLayer.dataProvider().addFeatures(features)
+
+        self.mModel = FeaturesModel(
+            list(self.mLayer.getFeatures()), FeaturesModel.FeatureState.Unlinked, self.mLayer, False
+        )
+        self.mFeatureIds = [item.feature_id() for item in self.mModel.featureItems()]
+
+        self.mFilter = FeaturesModelFilter(self.mLayer, None)
+        self.mFilter.setSourceModel(self.mModel)
+
+    def tearDown(self):
+        QgsProject.instance().removeMapLayer(self.mLayer)
+
+    def _displayStrings(self):
+        return [
+            self.mFilter.data(self.mFilter.index(row, 0, QModelIndex()), Qt.ItemDataRole.DisplayRole)
+            for row in range(self.mFilter.rowCount())
+        ]
+
+    def _setFilterExpression(self, expression: str):
+        context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(self.mLayer))
+        self.mFilter.set_feature_filter_expression(QgsExpression(expression), context)
+        self.mFilter.set_feature_filter(FeaturesModelFilter.FeatureFilter.ShowFilteredList)
+
+    def _waitForFilterTask(self):
+        timeout = time.time() + 10
+        while self.mFilter.feature_filter_task_running() and time.time() < timeout:
+            QCoreApplication.processEvents()
+
+        self.assertFalse(self.mFilter.feature_filter_task_running())
+
+    def test_showFilteredList(self):
+        self._setFilterExpression("pk > 3")
+        self._waitForFilterTask()
+        self.assertEqual(self._displayStrings(), ["Feature-4", "Feature-5"])
+
+        # The memory provider does not compile expressions
+        self.assertEqual(self.mFilter.feature_filter_evaluation(), FeatureFilterTask.Evaluation.ProviderUncompiled)
+
+        # The latest filter wins
+        self._setFilterExpression("pk = 0")
+        self._setFilterExpression("pk IN (1, 2)")
+        self._waitForFilterTask()
+        self.assertEqual(self._displayStrings(), ["Feature-1", "Feature-2"])
+
+        # Expressions using the geometry are evaluated locally
+        self._setFilterExpression("pk < 2 AND $geometry IS NULL")
+        self._waitForFilterTask()
+        self.assertEqual(self._displayStrings(), ["Feature-0", "Feature-1"])
+        self.assertEqual(self.mFilter.feature_filter_evaluation(), FeatureFilterTask.Evaluation.Local)
+
+        # A canceled filter does not change the list anymore, the last complete result is shown again
+        self._setFilterExpression("pk = 5")
+        self.mFilter.cancel_feature_filter_task()
+        self.assertFalse(self.mFilter.feature_filter_task_running())
+        self.assertEqual(self._displayStrings(), ["Feature-0", "Feature-1"])
+
+        self.mFilter.set_feature_filter(FeaturesModelFilter.FeatureFilter.ShowAll)
+        self.assertEqual(self.mFilter.rowCount(), 6)
+
+    def test_filterTaskErrors(self):
+        context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(self.mLayer))
+
+        # Failures of the provider evaluation are not reported as "no matches"
+        task = FeatureFilterTask(self.mLayer, QgsExpression('"missing_field" = 1'), context)
+        self.assertNotEqual(task.evaluation, FeatureFilterTask.Evaluation.Local)
+        self.assertFalse(task.run())
+        self.assertTrue(task.error)
+
+        task = FeatureFilterTask(self.mLayer, QgsExpression("pk >"), context)
+        self.assertFalse(task.run())
+        self.assertTrue(task.error)
+
+        task = FeatureFilterTask(self.mLayer, QgsExpression("pk > 3"), context)
+        self.assertTrue(task.run())
+        self.assertFalse(task.error)
+
+    def test_filterTaskCompileStatus(self):
+        # GeoPackage layers compile expressions to SQL
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = "GPKG"
+        path = os.path.join(directory.name, "filter.gpkg")
+        error = QgsVectorFileWriter.writeAsVectorFormatV3(self.mLayer, path, QgsCoordinateTransformContext(), options)
+        self.assertEqual(error[0], QgsVectorFileWriter.WriterError.NoError)
+
+        layer = QgsVectorLayer(path, "gpkg", "ogr")
+        self.assertTrue(layer.isValid())
+        context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(layer))
+
+        def runTask(expression: str):
+            task = FeatureFilterTask(layer, QgsExpression(expression), context)
+            featureIds = []
+            task.featureIdsFound.connect(featureIds.extend)
+            self.assertTrue(task.run())
+            pks = {feature.attribute("pk") for feature in layer.getFeatures(featureIds)}
+            return task.evaluation, pks
+
+        self.assertEqual(runTask("pk > 3"), (FeatureFilterTask.Evaluation.ProviderCompiled, {4, 5}))
+
+        # Functions without SQL translation are evaluated by QGIS, not reported as compiled
+        self.assertEqual(
+            runTask("regexp_match(to_string(pk), '^[45]$')"),
+            (FeatureFilterTask.Evaluation.ProviderUncompiled, {4, 5}),
+        )
+        self.assertEqual(
+            runTask("pk > 3 AND regexp_match(to_string(pk), '^[15]$')"),
+            (FeatureFilterTask.Evaluation.ProviderUncompiled, {5}),
+        )
+
+    def test_showSelected(self):
+        self.mLayer.selectByIds([self.mFeatureIds[1], self.mFeatureIds[3]])
+
+        self.mFilter.set_feature_filter(FeaturesModelFilter.FeatureFilter.ShowSelected)
+        self.assertEqual(self._displayStrings(), ["Feature-1", "Feature-3"])
+
+        # The selection snapshot follows the layer selection
+        self.mLayer.selectByIds([self.mFeatureIds[4]])
+        self.assertEqual(self._displayStrings(), ["Feature-4"])
+
+        self.mFilter.set_feature_filter(FeaturesModelFilter.FeatureFilter.ShowAll)
+        self.assertEqual(self.mFilter.rowCount(), 6)
+
+    def test_mapFilter(self):
+        self.mFilter.set_map_filter([self.mFeatureIds[0], self.mFeatureIds[5], self.mFeatureIds[5]])
+        self.assertTrue(self.mFilter.map_filter_active())
+        self.assertEqual(self._displayStrings(), ["Feature-0", "Feature-5"])
+
+        self.mFilter.set_quick_filter("Feature-5")
+        self.assertEqual(self._displayStrings(), ["Feature-5"])
+
+        self.mFilter.clear_quick_filter()
+        self.mFilter.clear_map_filter()
+        self.assertFalse(self.mFilter.map_filter_active())
+        self.assertEqual(self.mFilter.rowCount(), 6)
+
+    def test_filterMatchesOnLaterPages(self):
+        layer = QgsVectorLayer("None?field=pk:int", "paged", "memory")
+        layer.setDisplayExpression("'Paged-' || pk")
+
+        lastPk = FeaturesModel.FETCH_PAGE_SIZE * 2
+        features = []
+        for pk in range(lastPk + 1):
+            feature = QgsFeature(layer.fields())
+            feature.setAttributes([pk])
+            features.append(feature)
+        layer.dataProvider().addFeatures(features)
+        lastFeatureId = max(feature.id() for feature in layer.getFeatures())
+
+        def lazyFilter():
+            model = FeaturesModel([], FeaturesModel.FeatureState.Unlinked, layer, False)
+            model.set_feature_request(QgsFeatureRequest(), FeaturesModel.FeatureState.Unlinked)
+            self.assertEqual(model.rowCount(), FeaturesModel.FETCH_PAGE_SIZE)
+
+            featuresModelFilter = FeaturesModelFilter(layer, None, model)
+            featuresModelFilter.setSourceModel(model)
+            return model, featuresModelFilter
+
+        # The only match of the quick filter is on the last page
+        model, featuresModelFilter = lazyFilter()
+        featuresModelFilter.set_quick_filter("Paged-{0}".format(lastPk))
+        self.assertEqual(featuresModelFilter.rowCount(), 1)
+        self.assertEqual(
+            featuresModelFilter.data(featuresModelFilter.index(0, 0), FeaturesModel.UserRole.FeatureId),
+            lastFeatureId,
+        )
+
+        # Same for the map filter
+        model, featuresModelFilter = lazyFilter()
+        featuresModelFilter.set_map_filter([lastFeatureId])
+        self.assertEqual(featuresModelFilter.rowCount(), 1)
+
+        # Without filter the views still fetch one page at a time
+        model, featuresModelFilter = lazyFilter()
+        featuresModelFilter.fetchMore(QModelIndex())
+        self.assertEqual(model.rowCount(), FeaturesModel.FETCH_PAGE_SIZE * 2)
+        self.assertEqual(featuresModelFilter.rowCount(), FeaturesModel.FETCH_PAGE_SIZE * 2)
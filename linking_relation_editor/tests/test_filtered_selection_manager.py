@@ -0,0 +1,63 @@
+from qgis.core import QgsFeature, QgsFeatureRequest, QgsProject, QgsVectorLayer
+from qgis.PyQt.QtWidgets import QWidget
+from qgis.testing import start_app, unittest
+
+from linking_relation_editor.gui.filtered_selection_manager import (
+    FilteredSelectionManager,
+)
+
+start_app()
+
+
+class TestFilteredSelectionManager(unittest.TestCase):
+    def setUp(self):
+        self.mLayer = QgsVectorLayer("None?field=pk:int&field=fk:int", "children", "memory")
+        QgsProject.instance().addMapLayer(self.mLayer, False)
+
+        features = []
+        for pk in range(1000):
+            feature = QgsFeature(self.mLayer.fields())
+            feature.setAttributes([pk, pk % 2])
+            features.append(feature)
+        self.mLayer.dataProvider().addFeatures(features)
+
+        self.mFeatureIdsByFk = {0: set(), 1: set()}
+        for feature in self.mLayer.getFeatures():
+            self.mFeatureIdsByFk[feature.attribute("fk")].add(feature.id())
+
+        self.mParent = QWidget()
+
+    def tearDown(self):
+        QgsProject.instance().removeMapLayer(self.mLayer)
+
+    def test_expressionRequest(self):
+        self.mLayer.selectByIds(list(self.mFeatureIdsByFk[0])[:10] + list(self.mFeatureIdsByFk[1])[:10])
+
+        request = QgsFeatureRequest().setFilterExpression('"fk" = 1')
+        selectionManager = FilteredSelectionManager(self.mLayer, request, self.mParent)
+        self.assertEqual(selectionManager.selectedFeatureIds(), set(list(self.mFeatureIdsByFk[1])[:10]))
+
+        emitted = []
+        selectionManager.selectionChanged.connect(lambda selected, deselected, clear: emitted.append(selected))
+
+        # Only the accepted features are added and reported
+        self.mLayer.selectByIds(list(self.mFeatureIdsByFk[0]) + list(self.mFeatureIdsByFk[1]))
+        self.assertEqual(selectionManager.selectedFeatureIds(), self.mFeatureIdsByFk[1])
+        self.assertEqual(selectionManager.selectedFeatureCount(), 500)
+        self.assertEqual(set(emitted[-1]), self.mFeatureIdsByFk[1])
+
+        # Deselecting features which are not accepted is fine
+        deselected = list(self.mFeatureIdsByFk[0])[:5] + list(self.mFeatureIdsByFk[1])[:5]
+        self.mLayer.deselect(deselected)
+        self.assertEqual(selectionManager.selectedFeatureIds(), self.mFeatureIdsByFk[1] - set(deselected))
+
+        self.mLayer.removeSelection()
+        self.assertEqual(selectionManager.selectedFeatureCount(), 0)
+
+    def test_featureIdsRequest(self):
+        acceptedFeatureIds = set(list(self.mFeatureIdsByFk[0])[:20])
+        request = QgsFeatureRequest().setFilterFids(list(acceptedFeatureIds))
+        selectionManager = FilteredSelectionManager(self.mLayer, request, self.mParent)
+
+        self.mLayer.selectAll()
+        self.assertEqual(selectionManager.selectedFeatureIds(), acceptedFeatureIds)
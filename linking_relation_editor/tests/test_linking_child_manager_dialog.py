@@ -1,9 +1,20 @@
-from qgis.core import QgsFeature, QgsProject, QgsRelation, QgsVectorLayer
+import time
+
+from qgis.core import (
+    QgsApplication,
+    QgsFeature,
+    QgsProject,
+    QgsRelation,
+    QgsVectorLayer,
+)
 from qgis.gui import QgsAttributeEditorContext
-from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtCore import QCoreApplication, QEvent, Qt
 from qgis.testing import start_app, unittest
 
+from linking_relation_editor.core.model.features_model import FeaturesModel
+from linking_relation_editor.core.relation_key_index import RelationKeyIndex
 from linking_relation_editor.gui.linking_child_manager_dialog import (
+    CONFIG_SHOW_AND_EDIT_JOIN_TABLE_ATTRIBUTES,
     LinkingChildManagerDialog,
 )
 
@@ -394,4 +405,245 @@ class TestLinkingChildManagerDialog(unittest.TestCase):
             dialog._featuresModelFilterLeft.data(dialog._featuresModelFilterLeft.index(0, 0), Qt.ItemDataRole.DisplayRole),
             "Layer1-1: Martina formerly known as Prisca",
         )
-    
\ No newline at end of file
+
+    def test_lazyLoading(self):
+        # get a parent with no childs
+        parentFeature = QgsFeature()
+        for feature in self.mLayer2.getFeatures():
+            if feature.attribute("pk") == 12:
+                parentFeature = feature
+                break
+
+        self.assertTrue(parentFeature.isValid())
+
+        pageSize = FeaturesModel.FETCH_PAGE_SIZE
+        FeaturesModel.FETCH_PAGE_SIZE = 1
+        try:
+            dialog = LinkingChildManagerDialog(
+                self.mLayer1,
+                self.mLayer2,
+                parentFeature,
+                self.mRelation,
+                QgsRelation(),
+                QgsAttributeEditorContext(),
+                False,
+                None,
+                {},
+                None,
+            )
+        finally:
+            FeaturesModel.FETCH_PAGE_SIZE = pageSize
+
+        featuresModelLeft = dialog._featuresModelLeft
+
+        # Only the first page is loaded
+        self.assertEqual(featuresModelLeft.rowCount(), 1)
+        self.assertTrue(featuresModelLeft.canFetchMore())
+
+        featuresModelLeft.fetch_all()
+        self.assertEqual(featuresModelLeft.rowCount(), 2)
+        self.assertFalse(featuresModelLeft.canFetchMore())
+
+        # Full features are loaded on demand
+        featureItem = featuresModelLeft.featureItems()[0]
+        self.assertTrue(featureItem.feature().isValid())
+        self.assertEqual(featureItem.feature().id(), featureItem.feature_id())
+
+    def test_unlinkedFeaturesStrategy(self):
+        parentFeature = QgsFeature()
+        for feature in self.mLayer2.getFeatures():
+            if feature.attribute("pk") == 10:
+                parentFeature = feature
+                break
+
+        self.assertTrue(parentFeature.isValid())
+
+        dialog = LinkingChildManagerDialog(
+            self.mLayer1,
+            self.mLayer2,
+            parentFeature,
+            self.mRelation,
+            QgsRelation(),
+            QgsAttributeEditorContext(),
+            False,
+            None,
+            {},
+            None,
+        )
+
+        # Memory layers do not compile expressions, linked features are filtered locally
+        self.assertEqual(
+            dialog._unlinkedFeaturesStrategy, LinkingChildManagerDialog.UnlinkedFeaturesStrategy.LocalFiltering
+        )
+
+        self.assertEqual(dialog._featuresModelRight.rowCount(), 1)
+        self.assertEqual(dialog._featuresModelLeft.rowCount(), 1)
+        self.assertEqual(
+            dialog._featuresModelLeft.data(dialog._featuresModelLeft.index(0, 0), Qt.ItemDataRole.DisplayRole),
+            "Layer1-1: Martina formerly known as Prisca",
+        )
+
+    def test_backgroundLoading(self):
+        parentFeature = QgsFeature()
+        for feature in self.mLayer1.getFeatures():
+            if feature.attribute("pk") == 0:
+                parentFeature = feature
+                break
+
+        self.assertTrue(parentFeature.isValid())
+
+        threshold = LinkingChildManagerDialog.BACKGROUND_LOADING_THRESHOLD
+        LinkingChildManagerDialog.BACKGROUND_LOADING_THRESHOLD = 0
+        try:
+            dialog = LinkingChildManagerDialog(
+                self.mLayer2,
+                self.mLayer1,
+                parentFeature,
+                self.mRelation1N,
+                self.mRelationNM,
+                QgsAttributeEditorContext(),
+                False,
+                None,
+                {},
+                None,
+            )
+        finally:
+            LinkingChildManagerDialog.BACKGROUND_LOADING_THRESHOLD = threshold
+
+        # The dialog opens with placeholders while loading
+        self.assertIsNotNone(dialog._featuresLoaderTask)
+        self.assertFalse(dialog._actionLinkAll.isEnabled())
+        self.assertIsNot(dialog.mFeaturesTreeViewRight.model(), dialog._featuresModelRight)
+
+        # The key indexes were not built in the main thread, the linked features are requested by the worker
+        self.assertFalse(dialog._featuresLoaderTask._linkedByIds)
+        self.assertFalse(
+            any(index.isBuilt() for index in RelationKeyIndex.relationIndexes(self.mRelation1N, self.mRelationNM))
+        )
+
+        timeout = time.time() + 10
+        while dialog._featuresLoaderTask is not None and time.time() < timeout:
+            QCoreApplication.processEvents()
+
+        self.assertIsNone(dialog._featuresLoaderTask)
+        self.assertTrue(dialog._actionLinkAll.isEnabled())
+        self.assertIs(dialog.mFeaturesTreeViewRight.model(), dialog._featuresModelRight)
+
+        # Parent pk 0 is linked to pk 10 and 11 through the join layer
+        self.assertEqual(dialog._featuresModelRight.rowCount(), 2)
+        self.assertEqual(dialog._featuresModelLeft.rowCount(), 1)
+        self.assertEqual(
+            dialog._featuresModelLeft.data(dialog._featuresModelLeft.index(0, 0), Qt.ItemDataRole.DisplayRole),
+            "Layer2-12",
+        )
+
+    def test_closingDuringBackgroundLoading(self):
+        parentFeature = QgsFeature()
+        for feature in self.mLayer1.getFeatures():
+            if feature.attribute("pk") == 0:
+                parentFeature = feature
+                break
+
+        threshold = LinkingChildManagerDialog.BACKGROUND_LOADING_THRESHOLD
+        LinkingChildManagerDialog.BACKGROUND_LOADING_THRESHOLD = 0
+        try:
+            dialog = LinkingChildManagerDialog(
+                self.mLayer2,
+                self.mLayer1,
+                parentFeature,
+                self.mRelation1N,
+                self.mRelationNM,
+                QgsAttributeEditorContext(),
+                False,
+                None,
+                {},
+                None,
+            )
+        finally:
+            LinkingChildManagerDialog.BACKGROUND_LOADING_THRESHOLD = threshold
+
+        self.assertIsNotNone(dialog._featuresLoaderTask)
+
+        # The rejected dialog is deleted before the canceled task finishes
+        dialog.reject()
+        self.assertIsNone(dialog._featuresLoaderTask)
+        dialog.deleteLater()
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+
+        timeout = time.time() + 10
+        while QgsApplication.taskManager().countActiveTasks() > 0 and time.time() < timeout:
+            QCoreApplication.processEvents()
+        QCoreApplication.processEvents()
+
+        self.assertEqual(QgsApplication.taskManager().countActiveTasks(), 0)
+
+    def test_linkedJoinFeatures(self):
+        parentFeature = QgsFeature()
+        for feature in self.mLayer1.getFeatures():
+            if feature.attribute("pk") == 0:
+                parentFeature = feature
+                break
+
+        self.assertTrue(parentFeature.isValid())
+
+        dialog = LinkingChildManagerDialog(
+            self.mLayer2,
+            self.mLayer1,
+            parentFeature,
+            self.mRelation1N,
+            self.mRelationNM,
+            QgsAttributeEditorContext(),
+            False,
+            None,
+            {CONFIG_SHOW_AND_EDIT_JOIN_TABLE_ATTRIBUTES: True},
+            None,
+        )
+
+        # Each linked feature gets the join feature linking it to this parent
+        joinFeatures = {}
+        for featureItem in dialog._featuresModelRight.featureItems():
+            joinFeature = featureItem.childItem().feature()
+            self.assertTrue(joinFeature.isValid())
+            joinFeatures[featureItem.feature().attribute("pk")] = joinFeature
+
+        self.assertEqual(sorted(joinFeatures.keys()), [10, 11])
+        for pk, joinFeature in joinFeatures.items():
+            self.assertEqual(joinFeature.attribute("fk_layer1"), 0)
+            self.assertEqual(joinFeature.attribute("fk_layer2"), pk)
+
+    def test_deferredJoinFeatures(self):
+        parentFeature = QgsFeature()
+        for feature in self.mLayer1.getFeatures():
+            if feature.attribute("pk") == 1:
+                parentFeature = feature
+                break
+
+        self.assertTrue(parentFeature.isValid())
+
+        dialog = LinkingChildManagerDialog(
+            self.mLayer2,
+            self.mLayer1,
+            parentFeature,
+            self.mRelation1N,
+            self.mRelationNM,
+            QgsAttributeEditorContext(),
+            False,
+            None,
+            {CONFIG_SHOW_AND_EDIT_JOIN_TABLE_ATTRIBUTES: True},
+            None,
+        )
+
+        # No join feature template is created for the unlinked features
+        dialog._featuresModelLeft.fetch_all()
+        self.assertEqual(dialog._featuresModelLeft.rowCount(), 2)
+        for featureItem in dialog._featuresModelLeft.featureItems():
+            self.assertIsNone(featureItem.childItem())
+
+        dialog._linkAll()
+
+        # Templates are created when the features are to be linked
+        self.assertEqual(dialog._featuresModelRight.rowCount(), 3)
+        for featureItem in dialog._featuresModelRight.featureItems():
+            joinFeature = featureItem.childItem().feature()
+            self.assertEqual(joinFeature.attribute("fk_layer1"), 1)
+            self.assertEqual(joinFeature.attribute("fk_layer2"), featureItem.feature().attribute("pk"))
@@ -1,7 +1,13 @@
+import time
+
 from qgis.core import QgsFeature, QgsProject, QgsRelation, QgsVectorLayer
+from qgis.gui import QgsDualView
+from qgis.PyQt.QtCore import QCoreApplication
 from qgis.PyQt.QtWidgets import QWidget
 from qgis.testing import start_app, unittest
 
+from linking_relation_editor.core.relation_key_index import RelationKeyIndex
+from linking_relation_editor.core.signal_connections import SignalConnections
 from linking_relation_editor.gui.linking_relation_editor_widget_factory import (
     LinkingRelationEditorWidget,
 )
@@ -174,3 +180,184 @@ class TestLinkingRelationEditorWidgetFactory(unittest.TestCase):
         relationEditorWidget.updateUi()
 
         relationEditorWidget._linkFeatures([feature.id()])
+
+    def test_signalConnectionsDoNotAccumulate(self):
+        parentWidget = QWidget()
+        relationEditorWidget = LinkingRelationEditorWidget({}, parentWidget)
+        relationEditorWidget.setRelations(self.mRelation, QgsRelation())
+
+        parentFeatures = list(self.mLayer2.getFeatures())
+
+        def browse(count):
+            for index in range(count):
+                relationEditorWidget.setFeature(parentFeatures[index % len(parentFeatures)])
+                relationEditorWidget.updateUiSingleEdit()
+
+        browse(1)
+        connectionCount = SignalConnections.liveConnectionCount(self.mLayer1)
+        self.assertGreater(connectionCount, 0)
+
+        # Browsing parents reuses the dual view and its selection manager
+        browse(100)
+        self.assertEqual(SignalConnections.liveConnectionCount(self.mLayer1), connectionCount)
+
+        # Setting the relations again replaces the layer connections
+        for _ in range(10):
+            relationEditorWidget.setRelations(self.mRelation, QgsRelation())
+        browse(1)
+        self.assertEqual(SignalConnections.liveConnectionCount(self.mLayer1), connectionCount)
+
+    def test_dualViewReusedAcrossParents(self):
+        parentWidget = QWidget()
+        relationEditorWidget = LinkingRelationEditorWidget({}, parentWidget)
+        relationEditorWidget.setRelations(self.mRelation, QgsRelation())
+
+        childFeatureIdsByParentKey = dict()
+        for childFeature in self.mLayer1.getFeatures():
+            childFeatureIdsByParentKey.setdefault(childFeature.attribute("fk"), set()).add(childFeature.id())
+
+        masterModel = None
+        selectionManager = None
+        for parentFeature in self.mLayer2.getFeatures():
+            relationEditorWidget.setFeature(parentFeature)
+            relationEditorWidget.updateUiSingleEdit()
+
+            if masterModel is None:
+                masterModel = relationEditorWidget.mDualView.masterModel()
+                selectionManager = relationEditorWidget.mFeatureSelectionMgr
+
+            # Only the request of the dual view changes
+            self.assertIs(relationEditorWidget.mDualView.masterModel(), masterModel)
+            self.assertIs(relationEditorWidget.mFeatureSelectionMgr, selectionManager)
+            self.assertEqual(
+                set(relationEditorWidget.mDualView.filteredFeatures()),
+                childFeatureIdsByParentKey.get(parentFeature.attribute("pk"), set()),
+            )
+
+    def test_updateUiDeferredWhileHidden(self):
+        parentWidget = QWidget()
+        relationEditorWidget = LinkingRelationEditorWidget({}, parentWidget)
+        relationEditorWidget.setRelations(self.mRelation, QgsRelation())
+
+        for feature in self.mLayer2.getFeatures():
+            relationEditorWidget.setFeature(feature)
+            break
+
+        # Hidden widgets only record that they are stale
+        relationEditorWidget.updateUi()
+        self.assertFalse(relationEditorWidget._updateUiTimer.isActive())
+        self.assertTrue(relationEditorWidget._updateUiPending)
+        self.assertFalse(relationEditorWidget.mDualViewInitialized)
+
+        # The refresh runs once the widget is shown
+        parentWidget.show()
+        self.assertFalse(relationEditorWidget._updateUiPending)
+        self.assertTrue(relationEditorWidget.mDualViewInitialized)
+
+        # Shown widgets are not refreshed again when nothing changed
+        parentWidget.hide()
+        parentWidget.show()
+        self.assertFalse(relationEditorWidget._updateUiTimer.isActive())
+        self.assertFalse(relationEditorWidget._updateUiPending)
+
+    def test_dualViewFormClearedForParentWithoutChildren(self):
+        parentWidget = QWidget()
+        relationEditorWidget = LinkingRelationEditorWidget({}, parentWidget)
+        relationEditorWidget.setRelations(self.mRelation, QgsRelation())
+
+        parentFeatures = {feature.attribute("pk"): feature for feature in self.mLayer2.getFeatures()}
+
+        def showParent(pk):
+            relationEditorWidget.setFeature(parentFeatures[pk])
+            relationEditorWidget.updateUiSingleEdit()
+            return relationEditorWidget._dualViewAttributeForms()
+
+        attributeForms = showParent(10)
+        relationEditorWidget.setViewMode(QgsDualView.ViewMode.AttributeEditor)
+        self.assertEqual(len(attributeForms), 1)
+        self.assertTrue(attributeForms[0].isEnabled())
+
+        # The form of the reused dual view does not keep the child of the previous parent
+        attributeForms = showParent(12)
+        self.assertEqual(set(relationEditorWidget.mDualView.filteredFeatures()), set())
+        self.assertFalse(attributeForms[0].isEnabled())
+        self.assertFalse(attributeForms[0].feature().isValid())
+
+        # The first feature is shown again for a parent with children
+        attributeForms = showParent(11)
+        self.assertTrue(attributeForms[0].isEnabled())
+        childFeatureIds = {feature.id() for feature in self.mLayer1.getFeatures() if feature.attribute("fk") == 11}
+        self.assertEqual(set(relationEditorWidget.mDualView.filteredFeatures()), childFeatureIds)
+        self.assertIn(attributeForms[0].feature().id(), childFeatureIds)
+
+    def test_dualViewFollowsAddedChildren(self):
+        parentWidget = QWidget()
+        relationEditorWidget = LinkingRelationEditorWidget({}, parentWidget)
+        relationEditorWidget.setRelations(self.mRelation, QgsRelation())
+
+        parentFeatures = {feature.attribute("pk"): feature for feature in self.mLayer2.getFeatures()}
+        relationEditorWidget.setFeature(parentFeatures[12])
+        relationEditorWidget.updateUiSingleEdit()
+        self.assertEqual(set(relationEditorWidget.mDualView.filteredFeatures()), set())
+
+        # Children added while editing are accepted by the request of the dual view
+        child = QgsFeature(self.mLayer1.fields())
+        child.setAttribute("pk", 2)
+        child.setAttribute("fk", 12)
+        self.mLayer1.startEditing()
+        self.assertTrue(self.mLayer1.addFeature(child))
+        self.assertEqual(set(relationEditorWidget.mDualView.filteredFeatures()), {child.id()})
+        self.mLayer1.rollBack()
+
+    def test_nmDualViewRefreshedWhenKeysChange(self):
+        parentWidget = QWidget()
+        relationEditorWidget = LinkingRelationEditorWidget({}, parentWidget)
+        relationEditorWidget.setRelations(self.mRelation1N, self.mRelationNM)
+
+        parentFeatures = {feature.attribute("pk"): feature for feature in self.mLayer1.getFeatures()}
+        childFeatureIds = {feature.attribute("pk"): feature.id() for feature in self.mLayer2.getFeatures()}
+
+        relationEditorWidget.setFeature(parentFeatures[0])
+        parentWidget.show()
+
+        # The first parent is shown with requests while the key indexes are built in the background
+        relationEditorWidget.updateUiTimeout()
+        self.assertFalse(RelationKeyIndex.relationIndexesBuilt(self.mRelation1N, self.mRelationNM))
+        self.assertEqual(
+            set(relationEditorWidget.mDualView.filteredFeatures()), {childFeatureIds[10], childFeatureIds[11]}
+        )
+
+        timeout = time.time() + 10
+        while not RelationKeyIndex.relationIndexesBuilt(self.mRelation1N, self.mRelationNM) and time.time() < timeout:
+            QCoreApplication.processEvents()
+        QCoreApplication.processEvents()
+
+        relationEditorWidget.updateUiTimeout()
+        relationEditorWidget._updateUiTimer.stop()
+        self.assertEqual(
+            set(relationEditorWidget.mDualView.filteredFeatures()), {childFeatureIds[10], childFeatureIds[11]}
+        )
+
+        # Linking a child through the join layer schedules a refresh of the requested ids
+        joinFeature = QgsFeature(self.mLayerJoin.fields())
+        joinFeature.setAttribute("pk", 103)
+        joinFeature.setAttribute("fk_layer1", 0)
+        joinFeature.setAttribute("fk_layer2", 12)
+        self.mLayerJoin.startEditing()
+        self.assertTrue(self.mLayerJoin.addFeature(joinFeature))
+        QCoreApplication.processEvents()
+        self.assertTrue(relationEditorWidget._updateUiTimer.isActive())
+
+        relationEditorWidget.updateUiTimeout()
+        self.assertEqual(
+            set(relationEditorWidget.mDualView.filteredFeatures()),
+            {childFeatureIds[10], childFeatureIds[11], childFeatureIds[12]},
+        )
+
+        # The ids are requested again after commit, from the index which is kept
+        relationEditorWidget._updateUiTimer.stop()
+        self.assertTrue(self.mLayerJoin.commitChanges())
+        QCoreApplication.processEvents()
+        self.assertTrue(relationEditorWidget._updateUiTimer.isActive())
+        self.assertTrue(RelationKeyIndex.relationIndexesBuilt(self.mRelation1N, self.mRelationNM))
+        relationEditorWidget._updateUiTimer.stop()
@@ -0,0 +1,132 @@
+import time
+
+from qgis.core import QgsFeature, QgsProject, QgsRelation, QgsVectorLayer
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.testing import start_app, unittest
+
+from linking_relation_editor.core.model.multi_edit_model import MultiEditModel
+from linking_relation_editor.core.relation_key_index import RelationKeyIndex
+
+start_app()
+
+
+class TestMultiEditModel(unittest.TestCase):
+    PARENT_COUNT = 300
+
+    def setUp(self):
+        self.mLayerParents = QgsVectorLayer("None?field=pk:int", "parents", "memory")
+        self.mLayerChildren = QgsVectorLayer("None?field=pk:int&field=fk:int", "children", "memory")
+        self.mLayerJoin = QgsVectorLayer("None?field=fk_parent:int&field=fk_child:int", "join_layer", "memory")
+        QgsProject.instance().addMapLayers([self.mLayerParents, self.mLayerChildren, self.mLayerJoin], False)
+
+        self._addFeatures(self.mLayerParents, [[pk] for pk in range(self.PARENT_COUNT)])
+
+        self.mRelation = self._relation(self.mLayerChildren, self.mLayerParents, "fk")
+        self.mRelation1N = self._relation(self.mLayerJoin, self.mLayerParents, "fk_parent")
+        self.mRelationNM = self._relation(self.mLayerJoin, self.mLayerChildren, "fk_child")
+
+    def tearDown(self):
+        QgsProject.instance().removeMapLayers([self.mLayerParents.id(), self.mLayerChildren.id(), self.mLayerJoin.id()])
+
+    def _addFeatures(self, layer: QgsVectorLayer, attributesList):
+        features = []
+        for attributes in attributesList:
+            feature = QgsFeature(layer.fields())
+            feature.setAttributes(attributes)
+            features.append(feature)
+        self.assertTrue(layer.dataProvider().addFeatures(features))
+
+    def _relation(self, referencingLayer: QgsVectorLayer, referencedLayer: QgsVectorLayer, field: str):
+        relation = QgsRelation()
+        relation.setId("{0}.{1}".format(referencingLayer.name(), referencedLayer.name()))
+        relation.setName(relation.id())
+        relation.setReferencingLayer(referencingLayer.id())
+        relation.setReferencedLayer(referencedLayer.id())
+        relation.addFieldPair(field, "pk")
+        self.assertTrue(relation.isValid())
+        return relation
+
+    def _childFeatureIds(self, layer: QgsVectorLayer, pks) -> set:
+        return {feature.id() for feature in layer.getFeatures() if feature.attribute("pk") in pks}
+
+    def test_mixedValueFeatureIds(self):
+        self.assertEqual(MultiEditModel.mixedValueFeatureIds({}), set())
+        self.assertEqual(MultiEditModel.mixedValueFeatureIds({1: [], 2: []}), set())
+        self.assertEqual(MultiEditModel.mixedValueFeatureIds({1: [10, 11], 2: [11, 10]}), set())
+        self.assertEqual(MultiEditModel.mixedValueFeatureIds({1: [10, 11], 2: [11]}), {10})
+
+        # A child linked twice to the same parent is still counted once
+        self.assertEqual(MultiEditModel.mixedValueFeatureIds({1: [10, 10], 2: [11]}), {10, 11})
+
+    def test_mixedValues1N(self):
+        # Two children per parent
+        self._addFeatures(self.mLayerChildren, [[pk, pk // 2] for pk in range(self.PARENT_COUNT * 2)])
+
+        model = MultiEditModel()
+        model.setFeatures(self.mRelation, QgsRelation(), list(self.mLayerParents.getFeatures()))
+
+        childFeatureIdsByParent = model.childFeatureIdsByParent()
+        self.assertEqual(len(childFeatureIdsByParent), self.PARENT_COUNT)
+        self.assertTrue(all(len(childFeatureIds) == 2 for childFeatureIds in childFeatureIdsByParent.values()))
+
+        # In 1:n relations a child is linked to a single parent
+        self.assertEqual(
+            MultiEditModel.mixedValueFeatureIds(childFeatureIdsByParent),
+            {feature.id() for feature in self.mLayerChildren.getFeatures()},
+        )
+
+        # With a single parent nothing is mixed
+        model.setFeatures(self.mRelation, QgsRelation(), [next(self.mLayerParents.getFeatures())])
+        self.assertEqual(MultiEditModel.mixedValueFeatureIds(model.childFeatureIdsByParent()), set())
+
+    def test_mixedValuesNM(self):
+        self._addFeatures(self.mLayerChildren, [[pk, None] for pk in range(1000, 1003)])
+
+        # Child 1000 is linked to all the parents, 1001 to the even ones and 1002 to the first one only
+        joinAttributes = []
+        for parentPk in range(self.PARENT_COUNT):
+            joinAttributes.append([parentPk, 1000])
+            if parentPk % 2 == 0:
+                joinAttributes.append([parentPk, 1001])
+        joinAttributes.append([0, 1002])
+        self._addFeatures(self.mLayerJoin, joinAttributes)
+
+        model = MultiEditModel()
+        model.setFeatures(self.mRelation1N, self.mRelationNM, list(self.mLayerParents.getFeatures()))
+
+        self.assertEqual(
+            MultiEditModel.mixedValueFeatureIds(model.childFeatureIdsByParent()),
+            self._childFeatureIds(self.mLayerChildren, {1001, 1002}),
+        )
+
+        # All the parents linked to the same children
+        evenParents = [feature for feature in self.mLayerParents.getFeatures() if feature.attribute("pk") % 2 == 0]
+        evenParents = [feature for feature in evenParents if feature.attribute("pk") != 0]
+        self.assertEqual(len(evenParents), self.PARENT_COUNT // 2 - 1)
+
+        model.setFeatures(self.mRelation1N, self.mRelationNM, evenParents)
+        self.assertEqual(MultiEditModel.mixedValueFeatureIds(model.childFeatureIdsByParent()), set())
+        self.assertEqual(
+            set(model.childFeatureIdsByParent()[evenParents[0].id()]),
+            self._childFeatureIds(self.mLayerChildren, {1000, 1001}),
+        )
+
+    def test_childFeatureIdsFromIndex(self):
+        self._addFeatures(self.mLayerChildren, [[pk, None] for pk in range(1000, 1010)])
+        self._addFeatures(self.mLayerJoin, [[parentPk, 1000 + parentPk % 10] for parentPk in range(self.PARENT_COUNT)])
+
+        # Bulk requests while the key indexes are built in the background
+        self.assertFalse(RelationKeyIndex.relationIndexesBuilt(self.mRelation1N, self.mRelationNM))
+
+        model = MultiEditModel()
+        model.setFeatures(self.mRelation1N, self.mRelationNM, list(self.mLayerParents.getFeatures()))
+        requestedChildFeatureIds = model.childFeatureIdsByParent()
+
+        timeout = time.time() + 10
+        while not RelationKeyIndex.relationIndexesBuilt(self.mRelation1N, self.mRelationNM) and time.time() < timeout:
+            QCoreApplication.processEvents()
+
+        # The key indexes give the same children
+        model.setFeatures(self.mRelation1N, self.mRelationNM, list(self.mLayerParents.getFeatures()))
+        self.assertEqual(model.childFeatureIdsByParent(), requestedChildFeatureIds)
+        self.assertTrue(all(len(childFeatureIds) == 1 for childFeatureIds in requestedChildFeatureIds.values()))
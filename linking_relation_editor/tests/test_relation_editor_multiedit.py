@@ -6,9 +6,11 @@ from qgis.core import (
     QgsVectorLayer,
 )
 from qgis.gui import QgsGui
+from qgis.PyQt.QtCore import Qt
 from qgis.PyQt.QtWidgets import QWidget
 from qgis.testing import start_app, unittest
 
+from linking_relation_editor.core.model.multi_edit_model import MultiEditModel
 from linking_relation_editor.gui.linking_relation_editor_widget_factory import (
     LinkingRelationEditorWidget,
 )
@@ -167,26 +169,28 @@ class TestRelationEditorMultiedit(unittest.TestCase):
 
         setParentItemsText = set()
         setChildrenItemsText = set()
-        for parentIndex in range(relationEditorWidget.mMultiEditTreeWidget.topLevelItemCount()):
-            parentItem = relationEditorWidget.mMultiEditTreeWidget.topLevelItem(parentIndex)
-            setParentItemsText.add(parentItem.text(0))
+        model = relationEditorWidget.mMultiEditModel
+        model.fetchAll()
+        for parentRow in range(model.rowCount()):
+            parentIndex = model.index(parentRow, 0)
+            setParentItemsText.add(parentIndex.data())
             self.assertEqual(
-                parentItem.data(0, (LinkingRelationEditorWidget.MultiEditTreeWidgetRole.FeatureType)),
+                parentIndex.data(LinkingRelationEditorWidget.MultiEditTreeWidgetRole.FeatureType),
                 (LinkingRelationEditorWidget.MultiEditFeatureType.Parent),
             )
-            for childIndex in range(parentItem.childCount()):
-                childItem = parentItem.child(childIndex)
-                setChildrenItemsText.add(childItem.text(0))
+            for childRow in range(model.rowCount(parentIndex)):
+                childIndex = model.index(childRow, 0, parentIndex)
+                setChildrenItemsText.add(childIndex.data())
                 self.assertEqual(
-                    childItem.data(0, (LinkingRelationEditorWidget.MultiEditTreeWidgetRole.FeatureType)),
+                    childIndex.data(LinkingRelationEditorWidget.MultiEditTreeWidgetRole.FeatureType),
                     (LinkingRelationEditorWidget.MultiEditFeatureType.Child),
                 )
 
-                if childItem.text(0) == "Layer1-0":
-                    self.assertEqual(parentItem.text(0), "Layer2-10")
+                if childIndex.data() == "Layer1-0":
+                    self.assertEqual(parentIndex.data(), "Layer2-10")
 
-                if childItem.text(0) == "Layer1-1":
-                    self.assertEqual(parentItem.text(0), "Layer2-11")
+                if childIndex.data() == "Layer1-1":
+                    self.assertEqual(parentIndex.data(), "Layer2-11")
 
         self.assertEqual(setParentItemsText, {"Layer2-10", "Layer2-11", "Layer2-12"})
         self.assertEqual(setChildrenItemsText, {"Layer1-0", "Layer1-1"})
@@ -211,32 +215,68 @@ class TestRelationEditorMultiedit(unittest.TestCase):
 
         setParentItemsText = set()
         listChildrenItemsText = list()
-        for parentIndex in range(relationEditorWidget.mMultiEditTreeWidget.topLevelItemCount()):
-            parentItem = relationEditorWidget.mMultiEditTreeWidget.topLevelItem(parentIndex)
-            setParentItemsText.add(parentItem.text(0))
+        model = relationEditorWidget.mMultiEditModel
+        model.fetchAll()
+        for parentRow in range(model.rowCount()):
+            parentIndex = model.index(parentRow, 0)
+            setParentItemsText.add(parentIndex.data())
             self.assertEqual(
-                parentItem.data(0, (LinkingRelationEditorWidget.MultiEditTreeWidgetRole.FeatureType)),
+                parentIndex.data(LinkingRelationEditorWidget.MultiEditTreeWidgetRole.FeatureType),
                 (LinkingRelationEditorWidget.MultiEditFeatureType.Parent),
             )
 
-            for childIndex in range(parentItem.childCount()):
-                childItem = parentItem.child(childIndex)
-                listChildrenItemsText.append(childItem.text(0))
+            for childRow in range(model.rowCount(parentIndex)):
+                childIndex = model.index(childRow, 0, parentIndex)
+                listChildrenItemsText.append(childIndex.data())
                 self.assertEqual(
-                    childItem.data(0, (LinkingRelationEditorWidget.MultiEditTreeWidgetRole.FeatureType)),
+                    childIndex.data(LinkingRelationEditorWidget.MultiEditTreeWidgetRole.FeatureType),
                     (LinkingRelationEditorWidget.MultiEditFeatureType.Child),
                 )
 
-                if childItem.text(0) == "Layer2-10":
-                    self.assertEqual(parentItem.text(0), "Layer1-0")
+                if childIndex.data() == "Layer2-10":
+                    self.assertEqual(parentIndex.data(), "Layer1-0")
 
-                if childItem.text(0) == "Layer2-11":
+                if childIndex.data() == "Layer2-11":
                     possibleParents = list()
                     possibleParents.append("Layer1-0")
                     possibleParents.append("Layer1-1")
-                    self.assertTrue(parentItem.text(0), possibleParents)
+                    self.assertTrue(parentIndex.data(), possibleParents)
 
         self.assertEqual(setParentItemsText, {"Layer1-0", "Layer1-1"})
 
         listChildrenItemsText.sort()
         self.assertEqual(listChildrenItemsText, ["Layer2-10", "Layer2-11", "Layer2-11"])
+
+    def testMultiEditLazyChildren(self):
+        model = MultiEditModel()
+        model.setFeatures(self.mRelation1N, self.mRelationNM, list(self.mLayer1.getFeatures()))
+
+        self.assertEqual(model.rowCount(), 2)
+
+        # Children are only fetched when a parent is expanded
+        for parentRow in range(model.rowCount()):
+            parentIndex = model.index(parentRow, 0)
+            self.assertTrue(model.hasChildren(parentIndex))
+            self.assertTrue(model.canFetchMore(parentIndex))
+            self.assertEqual(model.rowCount(parentIndex), 0)
+
+        parentIndex = model.index(0, 0)
+        model.fetchMore(parentIndex)
+        self.assertFalse(model.canFetchMore(parentIndex))
+        self.assertEqual(
+            sorted(model.index(row, 0, parentIndex).data() for row in range(model.rowCount(parentIndex))),
+            ["Layer2-10", "Layer2-11"] if parentIndex.data() == "Layer1-0" else ["Layer2-11"],
+        )
+        self.assertEqual(model.rowCount(model.index(1, 0)), 0)
+
+        # Child items are selectable, parent items are not
+        childIndex = model.index(0, 0, parentIndex)
+        self.assertTrue(model.flags(childIndex) & Qt.ItemFlag.ItemIsSelectable)
+        self.assertFalse(model.flags(parentIndex) & Qt.ItemFlag.ItemIsSelectable)
+
+        # Mixed values are shown in italic
+        model.fetchAll()
+        featureId = childIndex.data(MultiEditModel.Role.FeatureId)
+        model.setMixedValueFeatureIds([featureId])
+        for index in model.childIndexes([featureId]):
+            self.assertTrue(index.data(Qt.ItemDataRole.FontRole).italic())
@@ -0,0 +1,212 @@
+import time
+from unittest import mock
+
+from qgis.core import QgsFeature, QgsProject, QgsRelation, QgsVectorLayer
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.testing import start_app, unittest
+
+from linking_relation_editor.core.relation_key_index import RelationKeyIndex
+
+start_app()
+
+
+class TestRelationKeyIndex(unittest.TestCase):
+    def setUp(self):
+        self.mLayerParents = QgsVectorLayer("None?field=pk:int", "parents", "memory")
+        self.mLayerDocuments = QgsVectorLayer("None?field=pk:int&field=name:string", "docs", "memory")
+        self.mLayerJoin = QgsVectorLayer("None?field=pk:int&field=fk_parent:int&field=fk_doc:int", "join", "memory")
+        QgsProject.instance().addMapLayers([self.mLayerParents, self.mLayerDocuments, self.mLayerJoin], False)
+
+        parents = []
+        for pk in range(3):
+            feature = QgsFeature(self.mLayerParents.fields())
+            feature.setAttributes([pk])
+            parents.append(feature)
+        self.mLayerParents.dataProvider().addFeatures(parents)
+
+        documents = []
+        for pk in range(10):
+            feature = QgsFeature(self.mLayerDocuments.fields())
+            feature.setAttributes([pk, "Document {}".format(pk)])
+            documents.append(feature)
+        self.mLayerDocuments.dataProvider().addFeatures(documents)
+
+        joinFeatures = []
+        for pk, (fkParent, fkDoc) in enumerate([(0, 1), (0, 3), (1, 3), (1, 5), (None, 7)]):
+            feature = QgsFeature(self.mLayerJoin.fields())
+            feature.setAttributes([pk, fkParent, fkDoc])
+            joinFeatures.append(feature)
+        self.mLayerJoin.dataProvider().addFeatures(joinFeatures)
+
+        self.mRelation = QgsRelation()
+        self.mRelation.setId("join.parents")
+        self.mRelation.setName("join.parents")
+        self.mRelation.setReferencingLayer(self.mLayerJoin.id())
+        self.mRelation.setReferencedLayer(self.mLayerParents.id())
+        self.mRelation.addFieldPair("fk_parent", "pk")
+        self.assertTrue(self.mRelation.isValid())
+
+        self.mNmRelation = QgsRelation()
+        self.mNmRelation.setId("join.docs")
+        self.mNmRelation.setName("join.docs")
+        self.mNmRelation.setReferencingLayer(self.mLayerJoin.id())
+        self.mNmRelation.setReferencedLayer(self.mLayerDocuments.id())
+        self.mNmRelation.addFieldPair("fk_doc", "pk")
+        self.assertTrue(self.mNmRelation.isValid())
+
+        self.mParentFeatures = {feature.attribute("pk"): feature for feature in self.mLayerParents.getFeatures()}
+        self.mDocumentIds = {feature.attribute("pk"): feature.id() for feature in self.mLayerDocuments.getFeatures()}
+
+    def tearDown(self):
+        QgsProject.instance().removeMapLayer(self.mLayerParents)
+        QgsProject.instance().removeMapLayer(self.mLayerDocuments)
+        QgsProject.instance().removeMapLayer(self.mLayerJoin)
+
+    def _relatedJoinPks(self, parentPk):
+        featureIds = RelationKeyIndex.relatedFeatureIds(self.mRelation, self.mParentFeatures[parentPk])
+        return {self.mLayerJoin.getFeature(featureId).attribute("pk") for featureId in featureIds}
+
+    def _relatedDocumentIds(self, parentPk):
+        return RelationKeyIndex.nmRelatedFeatureIds(self.mRelation, self.mNmRelation, self.mParentFeatures[parentPk])
+
+    def test_instance(self):
+        index = RelationKeyIndex.instance(self.mLayerJoin, ["fk_parent"])
+        self.assertIs(RelationKeyIndex.instance(self.mLayerJoin, ("fk_parent",)), index)
+        self.assertIsNot(RelationKeyIndex.instance(self.mLayerJoin, ["fk_doc"]), index)
+
+    def test_relatedFeatureIds(self):
+        self.assertEqual(self._relatedJoinPks(0), {0, 1})
+        self.assertEqual(self._relatedJoinPks(1), {2, 3})
+        self.assertEqual(self._relatedJoinPks(2), set())
+
+        # Keys are converted to the type of the referencing field
+        index = RelationKeyIndex.instance(self.mLayerJoin, ["fk_parent"])
+        self.assertEqual(index.featureIds(["1"]), index.featureIds([1]))
+        self.assertEqual(index.featureIds([None]), set())
+
+    def test_nmRelatedFeatureIds(self):
+        self.assertEqual(self._relatedDocumentIds(0), {self.mDocumentIds[1], self.mDocumentIds[3]})
+        self.assertEqual(self._relatedDocumentIds(1), {self.mDocumentIds[3], self.mDocumentIds[5]})
+        self.assertEqual(self._relatedDocumentIds(2), set())
+
+    def test_incrementalUpdates(self):
+        self.assertEqual(self._relatedJoinPks(2), set())
+        self.assertEqual(self._relatedDocumentIds(2), set())
+
+        indexes = RelationKeyIndex.relationIndexes(self.mRelation, self.mNmRelation)
+        self.assertTrue(all(index.isBuilt() for index in indexes))
+
+        # Count the builds of the indexes, edits must update the built indexes in place
+        builds = []
+        build = RelationKeyIndex._build
+
+        def countedBuild(index):
+            if not index.isBuilt():
+                builds.append(index)
+            build(index)
+
+        keysChanges = []
+        indexes[0].keysChanged.connect(lambda: keysChanges.append(True))
+
+        with mock.patch.object(RelationKeyIndex, "_build", countedBuild):
+            self.mLayerJoin.startEditing()
+
+            # Added features
+            feature = QgsFeature(self.mLayerJoin.fields())
+            feature.setAttributes([10, 2, 9])
+            self.assertTrue(self.mLayerJoin.addFeature(feature))
+            self.assertEqual(self._relatedJoinPks(2), {10})
+            self.assertEqual(self._relatedDocumentIds(2), {self.mDocumentIds[9]})
+
+            # Changed keys
+            joinFeatureIds = {feature.attribute("pk"): feature.id() for feature in self.mLayerJoin.getFeatures()}
+            fkParentIndex = self.mLayerJoin.fields().indexOf("fk_parent")
+            self.assertTrue(self.mLayerJoin.changeAttributeValue(joinFeatureIds[0], fkParentIndex, 2))
+            self.assertEqual(self._relatedJoinPks(0), {1})
+            self.assertEqual(self._relatedJoinPks(2), {0, 10})
+
+            # Deleted features
+            self.assertTrue(self.mLayerJoin.deleteFeature(joinFeatureIds[1]))
+            self.assertEqual(self._relatedJoinPks(0), set())
+
+            self.assertEqual(builds, [])
+
+            # Listeners are notified once for the batch of edits
+            QCoreApplication.processEvents()
+            self.assertEqual(len(keysChanges), 1)
+
+            # Rolled back edits, the feature ids may have changed and the index is built again
+            self.mLayerJoin.rollBack()
+            self.assertEqual(self._relatedJoinPks(0), {0, 1})
+            self.assertEqual(self._relatedJoinPks(2), set())
+
+            self.assertEqual(builds, [indexes[0]])
+
+    def test_addedFeaturesBatch(self):
+        self.assertEqual(self._relatedJoinPks(2), set())
+        index = RelationKeyIndex.relationIndexes(self.mRelation)[0]
+
+        keysChanges = []
+        index.keysChanged.connect(lambda: keysChanges.append(True))
+
+        joinFeatures = []
+        for pk in range(100, 200):
+            feature = QgsFeature(self.mLayerJoin.fields())
+            feature.setAttributes([pk, 2, pk % 10])
+            joinFeatures.append(feature)
+
+        # The keys of the added features are read from the edit buffer, not requested one by one
+        with mock.patch.object(RelationKeyIndex, "_fetchKey") as fetchKey:
+            self.mLayerJoin.startEditing()
+            self.assertTrue(self.mLayerJoin.addFeatures(joinFeatures))
+            self.assertEqual(self._relatedJoinPks(2), set(range(100, 200)))
+            fetchKey.assert_not_called()
+
+        QCoreApplication.processEvents()
+        self.assertEqual(len(keysChanges), 1)
+
+        self.mLayerJoin.rollBack()
+
+    def test_commitKeepsIndex(self):
+        self.assertEqual(self._relatedJoinPks(2), set())
+        index = RelationKeyIndex.relationIndexes(self.mRelation)[0]
+
+        self.mLayerJoin.startEditing()
+        feature = QgsFeature(self.mLayerJoin.fields())
+        feature.setAttributes([10, 2, 9])
+        self.assertTrue(self.mLayerJoin.addFeature(feature))
+        temporaryFeatureId = feature.id()
+        self.assertEqual(self._relatedJoinPks(2), {10})
+
+        # The added features get their committed ids, the index is not built again
+        self.assertTrue(self.mLayerJoin.commitChanges())
+        self.assertTrue(index.isBuilt())
+
+        committedFeatureIds = {
+            joinFeature.id() for joinFeature in self.mLayerJoin.getFeatures() if joinFeature.attribute("pk") == 10
+        }
+        self.assertNotIn(temporaryFeatureId, committedFeatureIds)
+        self.assertEqual(
+            RelationKeyIndex.relatedFeatureIds(self.mRelation, self.mParentFeatures[2]), committedFeatureIds
+        )
+        self.assertIsNone(index.key(temporaryFeatureId))
+
+    def test_buildInBackground(self):
+        index = RelationKeyIndex.relationIndexes(self.mRelation)[0]
+        self.assertFalse(RelationKeyIndex.relationIndexesBuilt(self.mRelation))
+
+        # Edits made while the layer is read are applied on the result
+        self.mLayerJoin.startEditing()
+        feature = QgsFeature(self.mLayerJoin.fields())
+        feature.setAttributes([10, 2, 9])
+        self.assertTrue(self.mLayerJoin.addFeature(feature))
+
+        timeout = time.time() + 10
+        while not index.isBuilt() and time.time() < timeout:
+            QCoreApplication.processEvents()
+
+        self.assertTrue(index.isBuilt())
+        self.assertEqual(self._relatedJoinPks(0), {0, 1})
+        self.assertEqual(self._relatedJoinPks(2), {10})
+
+        self.mLayerJoin.rollBack()
@@ -0,0 +1,138 @@
+from qgis.core import QgsFeature, QgsProject, QgsRelation, QgsVectorLayer
+from qgis.testing import start_app, unittest
+
+from linking_relation_editor.core.relation_linker import RelationLinker
+from linking_relation_editor.core.relation_utils import RelationUtils
+
+start_app()
+
+
+class TestRelationLinker(unittest.TestCase):
+    CHILD_COUNT = 500
+
+    def setUp(self):
+        self.mLayerParents = QgsVectorLayer("None?field=pk:int", "parents", "memory")
+        self.mLayerChildren = QgsVectorLayer("None?field=pk:int&field=fk:int", "children", "memory")
+        self.mLayerJoin = QgsVectorLayer("None?field=fk_parent:int&field=fk_child:int", "join_layer", "memory")
+        QgsProject.instance().addMapLayers([self.mLayerParents, self.mLayerChildren, self.mLayerJoin], False)
+
+        self._addFeatures(self.mLayerParents, [[pk] for pk in range(3)])
+        self._addFeatures(self.mLayerChildren, [[pk, None] for pk in range(self.CHILD_COUNT)])
+
+        self.mRelation = self._relation(self.mLayerChildren, self.mLayerParents, "fk")
+        self.mRelation1N = self._relation(self.mLayerJoin, self.mLayerParents, "fk_parent")
+        self.mRelationNM = self._relation(self.mLayerJoin, self.mLayerChildren, "fk_child")
+
+        self.mParentFeatures = list(self.mLayerParents.getFeatures())
+        self.mChildFeatureIds = [feature.id() for feature in self.mLayerChildren.getFeatures()]
+
+    def tearDown(self):
+        QgsProject.instance().removeMapLayers([self.mLayerParents.id(), self.mLayerChildren.id(), self.mLayerJoin.id()])
+
+    def _addFeatures(self, layer: QgsVectorLayer, attributesList):
+        features = []
+        for attributes in attributesList:
+            feature = QgsFeature(layer.fields())
+            feature.setAttributes(attributes)
+            features.append(feature)
+        self.assertTrue(layer.dataProvider().addFeatures(features))
+
+    def _relation(self, referencingLayer: QgsVectorLayer, referencedLayer: QgsVectorLayer, field: str):
+        relation = QgsRelation()
+        relation.setId("{0}.{1}".format(referencingLayer.name(), referencedLayer.name()))
+        relation.setName(relation.id())
+        relation.setReferencingLayer(referencingLayer.id())
+        relation.setReferencedLayer(referencedLayer.id())
+        relation.addFieldPair(field, "pk")
+        self.assertTrue(relation.isValid())
+        return relation
+
+    def _childParentKeys(self):
+        return [feature.attribute("fk") for feature in self.mLayerChildren.getFeatures()]
+
+    def test_linkUnlink1N(self):
+        self.assertTrue(self.mLayerChildren.startEditing())
+        undoStack = self.mLayerChildren.undoStack()
+
+        parentFeature = self.mParentFeatures[1]
+        self.assertTrue(RelationLinker.linkFeatures(self.mRelation, parentFeature, self.mChildFeatureIds))
+        self.assertEqual(self._childParentKeys(), [parentFeature.attribute("pk")] * self.CHILD_COUNT)
+
+        # One undo step for all the features
+        self.assertEqual(undoStack.count(), 1)
+
+        self.assertTrue(RelationLinker.unlinkFeatures(self.mRelation, self.mChildFeatureIds[:100]))
+        self.assertEqual(undoStack.count(), 2)
+        self.assertTrue(all(RelationUtils.isNull(key) for key in self._childParentKeys()[:100]))
+        self.assertEqual(self._childParentKeys()[100:], [parentFeature.attribute("pk")] * (self.CHILD_COUNT - 100))
+
+        undoStack.undo()
+        self.assertEqual(self._childParentKeys(), [parentFeature.attribute("pk")] * self.CHILD_COUNT)
+
+        undoStack.undo()
+        self.assertTrue(all(RelationUtils.isNull(key) for key in self._childParentKeys()))
+
+        self.mLayerChildren.rollBack()
+
+    def test_linkUnlinkNM(self):
+        self.assertTrue(self.mLayerJoin.startEditing())
+        undoStack = self.mLayerJoin.undoStack()
+
+        joinFeatureIds = RelationLinker.linkFeaturesNM(
+            self.mRelation1N, self.mRelationNM, self.mParentFeatures[:2], self.mChildFeatureIds
+        )
+        self.assertEqual(len(joinFeatureIds), 2 * self.CHILD_COUNT)
+        self.assertEqual(set(joinFeatureIds), {feature.id() for feature in self.mLayerJoin.getFeatures()})
+        self.assertEqual(undoStack.count(), 1)
+
+        # Links of the other parent are kept
+        self.assertTrue(
+            RelationLinker.unlinkFeaturesNM(
+                self.mRelation1N, self.mRelationNM, self.mParentFeatures[:1], self.mChildFeatureIds[:100]
+            )
+        )
+        self.assertEqual(undoStack.count(), 2)
+
+        links = [
+            (feature.attribute("fk_parent"), feature.attribute("fk_child")) for feature in self.mLayerJoin.getFeatures()
+        ]
+        self.assertEqual(len(links), 2 * self.CHILD_COUNT - 100)
+        self.assertEqual(len([link for link in links if link[0] == self.mParentFeatures[0].attribute("pk")]), 400)
+
+        undoStack.undo()
+        self.assertEqual(self.mLayerJoin.featureCount(), 2 * self.CHILD_COUNT)
+
+        undoStack.undo()
+        self.assertEqual(self.mLayerJoin.featureCount(), 0)
+
+        self.mLayerJoin.rollBack()
+
+    def test_linkNMChunks(self):
+        self.assertTrue(self.mLayerJoin.startEditing())
+
+        chunkSize = RelationLinker.LINK_CHUNK_SIZE
+        RelationLinker.LINK_CHUNK_SIZE = 7
+        try:
+            joinFeatureIds = RelationLinker.linkFeaturesNM(
+                self.mRelation1N, self.mRelationNM, self.mParentFeatures, self.mChildFeatureIds
+            )
+        finally:
+            RelationLinker.LINK_CHUNK_SIZE = chunkSize
+
+        self.assertEqual(len(joinFeatureIds), 3 * self.CHILD_COUNT)
+        self.assertEqual(self.mLayerJoin.undoStack().count(), 1)
+
+        # Each join feature links its own parent and child pair
+        links = {
+            (feature.attribute("fk_parent"), feature.attribute("fk_child")) for feature in self.mLayerJoin.getFeatures()
+        }
+        self.assertEqual(
+            links,
+            {
+                (parentFeature.attribute("pk"), childFeature.attribute("pk"))
+                for parentFeature in self.mParentFeatures
+                for childFeature in self.mLayerChildren.getFeatures()
+            },
+        )
+
+        self.mLayerJoin.rollBack()
@@ -0,0 +1,115 @@
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsProject,
+    QgsRelation,
+    QgsVectorLayer,
+)
+from qgis.testing import start_app, unittest
+
+from linking_relation_editor.core.relation_utils import RelationUtils
+
+start_app()
+
+
+class TestRelationUtils(unittest.TestCase):
+    def setUp(self):
+        self.mLayerDocuments = QgsVectorLayer("None?field=pk:int&field=code:string&field=name:string", "docs", "memory")
+        QgsProject.instance().addMapLayer(self.mLayerDocuments, False)
+
+        self.mLayerJoin = QgsVectorLayer(
+            "None?field=pk:int&field=fk_doc:int&field=fk_code:string", "join_layer", "memory"
+        )
+        QgsProject.instance().addMapLayer(self.mLayerJoin, False)
+
+        documents = []
+        for pk in range(10):
+            feature = QgsFeature(self.mLayerDocuments.fields())
+            feature.setAttributes([pk, "code{}".format(pk), "Document {}".format(pk)])
+            documents.append(feature)
+        self.mLayerDocuments.dataProvider().addFeatures(documents)
+
+        joinFeatures = []
+        for pk, fkDoc in enumerate([1, 3, 3, 5, None]):
+            feature = QgsFeature(self.mLayerJoin.fields())
+            feature.setAttributes([pk, fkDoc, "code{}".format(fkDoc)])
+            joinFeatures.append(feature)
+        self.mLayerJoin.dataProvider().addFeatures(joinFeatures)
+
+        self.mRelation = QgsRelation()
+        self.mRelation.setId("join_layer.docs")
+        self.mRelation.setName("join_layer.docs")
+        self.mRelation.setReferencingLayer(self.mLayerJoin.id())
+        self.mRelation.setReferencedLayer(self.mLayerDocuments.id())
+        self.mRelation.addFieldPair("fk_doc", "pk")
+        self.assertTrue(self.mRelation.isValid())
+
+    def tearDown(self):
+        QgsProject.instance().removeMapLayer(self.mLayerDocuments)
+        QgsProject.instance().removeMapLayer(self.mLayerJoin)
+
+    def test_referencingKeys(self):
+        keys = RelationUtils.referencingKeys(self.mRelation, self.mLayerJoin.getFeatures())
+        self.assertEqual(keys, {(1,), (3,), (5,)})
+
+    def test_keysFilterExpression(self):
+        self.assertEqual(RelationUtils.keysFilterExpression(self.mRelation, [(1,), (3,)]), '"pk" IN (1, 3)')
+        self.assertFalse(RelationUtils.keysAreFeatureIds(self.mRelation))
+
+    def test_referencedFeatures(self):
+        names = {
+            feature.attribute("name")
+            for feature in RelationUtils.referencedFeatures(self.mRelation, self.mLayerJoin.getFeatures())
+        }
+        self.assertEqual(names, {"Document 1", "Document 3", "Document 5"})
+
+    def test_referencedFeaturesChunks(self):
+        chunkSize = RelationUtils.KEY_LOOKUP_CHUNK_SIZE
+        RelationUtils.KEY_LOOKUP_CHUNK_SIZE = 2
+        try:
+            keys = RelationUtils.referencingKeys(self.mRelation, self.mLayerJoin.getFeatures())
+            self.assertEqual(len(RelationUtils.referencedFeaturesRequests(self.mRelation, keys)), 2)
+
+            featureIds = RelationUtils.referencedFeatureIds(self.mRelation, self.mLayerJoin.getFeatures())
+        finally:
+            RelationUtils.KEY_LOOKUP_CHUNK_SIZE = chunkSize
+
+        names = {feature.attribute("name") for feature in self.mLayerDocuments.getFeatures(list(featureIds))}
+        self.assertEqual(names, {"Document 1", "Document 3", "Document 5"})
+
+    def test_referencedFeaturesMultipleFields(self):
+        self.mRelation.addFieldPair("fk_code", "code")
+        self.assertTrue(self.mRelation.isValid())
+
+        names = {
+            feature.attribute("name")
+            for feature in RelationUtils.referencedFeatures(self.mRelation, self.mLayerJoin.getFeatures())
+        }
+        self.assertEqual(names, {"Document 1", "Document 3", "Document 5"})
+
+    def test_notFieldValuesFilterExpression(self):
+        expression = RelationUtils.notFieldValuesFilterExpression(["pk"], [(1,), (3,)])
+        self.assertEqual(expression, '"pk" IS NULL OR NOT ("pk" IN (1, 3))')
+
+        request = QgsFeatureRequest().setFilterExpression(expression)
+        self.assertEqual(
+            {feature.attribute("pk") for feature in self.mLayerDocuments.getFeatures(request)}, {0, 2, 4, 5, 6, 7, 8, 9}
+        )
+
+        # Memory layers do not compile expressions
+        self.assertFalse(RelationUtils.providerCompilesExpressions(self.mLayerDocuments))
+
+    def test_referencingFeaturesRequests(self):
+        chunkSize = RelationUtils.KEY_LOOKUP_CHUNK_SIZE
+        RelationUtils.KEY_LOOKUP_CHUNK_SIZE = 2
+        try:
+            requests = RelationUtils.referencingFeaturesRequests(self.mRelation, [(1,), (3,), (4,)])
+        finally:
+            RelationUtils.KEY_LOOKUP_CHUNK_SIZE = chunkSize
+
+        self.assertEqual(len(requests), 2)
+
+        joinPks = set()
+        for request in requests:
+            joinPks |= {feature.attribute("pk") for feature in self.mLayerJoin.getFeatures(request)}
+        self.assertEqual(joinPks, {0, 1, 2})